@@ -1,4 +1,47 @@
-from . import helpc, logging
-from .bot import AutoShardedBot, Bot, EEmbed, Embed
-from .cog import Cog, GroupCog
-from .tree import CommandTree
+"""
+Utilities for Portal bots written in discord.py.
+
+Submodules are imported on first attribute access, so `import PortalUtils` doesn't pull in
+discord.py, jishaku, aiohttp or aiosqlite until they're needed.
+"""
+
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from . import helpc, logging
+    from .bot import AutoShardedBot, Bot, EEmbed, Embed
+    from .cluster import ClusterLauncher
+    from .cog import Cog, GroupCog
+    from .embeds import EmbedTemplate
+    from .tree import CommandTree
+
+_EXPORTS = {
+    "AutoShardedBot": "bot",
+    "Bot": "bot",
+    "EEmbed": "bot",
+    "Embed": "bot",
+    "EmbedTemplate": "embeds",
+    "Cog": "cog",
+    "GroupCog": "cog",
+    "ClusterLauncher": "cluster",
+    "CommandTree": "tree",
+}
+_SUBMODULES = {"helpc", "logging"}
+
+__all__ = [*_EXPORTS, *_SUBMODULES]
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, Union
+
+from discord import Interaction, app_commands
+from discord.ext import commands
+from discord.utils import utcnow
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS portal_audit ("
+    "id INTEGER PRIMARY KEY, at REAL NOT NULL, kind TEXT NOT NULL, command TEXT NOT NULL, "
+    "user_id INTEGER NOT NULL, guild_id INTEGER, channel_id INTEGER, duration REAL, latency REAL, "
+    "outcome TEXT NOT NULL, error TEXT, params TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS portal_audit_guild_command ON portal_audit (guild_id, command, at)",
+    "CREATE INDEX IF NOT EXISTS portal_audit_guild_user ON portal_audit (guild_id, user_id, at)",
+    "CREATE INDEX IF NOT EXISTS portal_audit_user ON portal_audit (user_id, at)",
+    "CREATE INDEX IF NOT EXISTS portal_audit_at ON portal_audit (at)",
+)
+
+INSERT = (
+    "INSERT INTO portal_audit (at, kind, command, user_id, guild_id, channel_id, duration, latency, outcome, error, params) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+_STARTED = "portal_audit_started"
+
+
+class AuditRecord(NamedTuple):
+    """
+    One command invocation, in the column order of the `portal_audit` table.
+
+    Attributes
+    ----------
+    at: float
+        When the message or interaction was created, as a Unix timestamp.
+    kind: str
+        `prefix` or `app`.
+    command: str
+        The command's qualified name.
+    user_id: int
+        The invoking user.
+    guild_id: Optional[int]
+        The guild, or None in DMs.
+    channel_id: Optional[int]
+        The channel.
+    duration: Optional[float]
+        Seconds from dispatch to the command finishing, if the dispatch was seen.
+    latency: float
+        Seconds from the message or interaction being created to the command finishing.
+    outcome: str
+        `ok`, `check_failed` or `error`.
+    error: Optional[str]
+        The exception's class name, for failed commands.
+    params: str
+        The resolved parameters as a JSON object. Discord models are recorded by ID.
+    """
+
+    at: float
+    kind: str
+    command: str
+    user_id: int
+    guild_id: Optional[int]
+    channel_id: Optional[int]
+    duration: Optional[float]
+    latency: float
+    outcome: str
+    error: Optional[str]
+    params: str
+
+
+def _param_value(value: Any) -> Any:
+    # Discord models are recorded by ID, anything else that isn't JSON is recorded as its string.
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_param_value(v) for v in value]
+    if isinstance(getattr(value, "id", None), int):
+        return value.id
+    return str(value)
+
+
+def _params(params: dict[str, Any]) -> str:
+    return json.dumps({k: _param_value(v) for k, v in params.items()}, ensure_ascii=False, separators=(",", ":"))
+
+
+def _outcome(error: Optional[BaseException]) -> tuple[str, Optional[str]]:
+    if error is None:
+        return "ok", None
+    if isinstance(error, (commands.CheckFailure, app_commands.CheckFailure)):
+        return "check_failed", type(error).__name__
+    error = getattr(error, "original", error)
+    return "error", type(error).__name__
+
+
+class AuditLog:
+    """
+    Records every prefix and app command invocation in the `portal_audit` table of `bot.db`,
+    with its resolved parameters, timings and outcome.
+
+    Records are written through the bot's write-behind queue, so they're committed in batches.
+    If the queue is full, records are dropped rather than holding up commands.
+    The table is indexed by guild, user and time, for the query methods and `jsk portal audit`.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot whose commands are audited.
+    retention: float
+        The number of seconds records are kept. `0` keeps them forever.
+    prune_interval: float
+        The number of seconds between deletions of expired records.
+
+    Attributes
+    ----------
+    enabled: bool
+        Whether records are being written, once `start` has found a database.
+    recorded: int
+        Records queued for writing.
+    dropped: int
+        Records lost because the write queue was full or closed.
+    """
+
+    def __init__(self, bot: Bot, *, retention: float = 90 * 86400.0, prune_interval: float = 3600.0):
+        self.bot = bot
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.enabled = False
+        self.recorded = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        Creates the audit table and its indexes, and starts pruning expired records.
+        Does nothing if the bot has no database.
+        """
+        if not hasattr(self.bot, "db"):
+            return
+        async with self.bot.db.transaction() as conn:
+            for statement in SCHEMA:
+                await conn.execute(statement)
+        self.enabled = True
+        if self.retention and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(), name="PortalUtils-audit-prune")
+
+    def close(self):
+        """
+        Stops recording and pruning. Records already queued are still written by the write queue.
+        """
+        self.enabled = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.bot.queue_write("DELETE FROM portal_audit WHERE at < ?", (time.time() - self.retention,))
+            except RuntimeError:
+                return  # The write queue is closed
+            await asyncio.sleep(self.prune_interval)
+
+    @staticmethod
+    def begin(invocation: Union[commands.Context, Interaction]):
+        """
+        Marks when a command was dispatched, so its record has a duration.
+
+        Parameters
+        ----------
+        invocation: Union[commands.Context, Interaction]
+            The command context or interaction.
+        """
+        if isinstance(invocation, Interaction):
+            invocation.extras[_STARTED] = time.perf_counter()
+        else:
+            setattr(invocation, _STARTED, time.perf_counter())
+
+    def record(self, record: AuditRecord):
+        """
+        Queues a record for writing.
+
+        Parameters
+        ----------
+        record: AuditRecord
+            The record to write.
+        """
+        if not self.enabled:
+            return
+        try:
+            self.bot.write_queue.put_nowait(INSERT, record)
+        except (asyncio.QueueFull, RuntimeError):
+            self.dropped += 1
+        else:
+            self.recorded += 1
+
+    def record_command(self, ctx: commands.Context, error: Optional[BaseException] = None):
+        """
+        Records a finished prefix command.
+
+        Parameters
+        ----------
+        ctx: commands.Context
+            The command context, after its arguments were parsed.
+        error: BaseException
+            The error the command raised, if any.
+        """
+        if not self.enabled or ctx.command is None:
+            return
+        command = ctx.command
+        # ctx.args starts with the cog, if any, and the context.
+        args = ctx.args[2:] if command.cog is not None else ctx.args[1:]
+        params = {**dict(zip(command.clean_params, args)), **ctx.kwargs}
+        started = getattr(ctx, _STARTED, None)
+        self._record(
+            "prefix", command.qualified_name, ctx.message, ctx.author.id, ctx.guild, ctx.channel, params, started, error
+        )
+
+    def record_interaction(
+        self,
+        interaction: Interaction,
+        command: Union[app_commands.Command, app_commands.ContextMenu, None] = None,
+        error: Optional[BaseException] = None,
+    ):
+        """
+        Records a finished app command.
+
+        Parameters
+        ----------
+        interaction: Interaction
+            The interaction that triggered the command.
+        command: Union[app_commands.Command, app_commands.ContextMenu]
+            The command. Defaults to `interaction.command`.
+        error: BaseException
+            The error the command raised, if any.
+        """
+        command = command or interaction.command
+        if not self.enabled or command is None:
+            return
+        started = interaction.extras.get(_STARTED)
+        params = dict(vars(interaction.namespace))
+        self._record(
+            "app",
+            command.qualified_name,
+            interaction,
+            interaction.user.id,
+            interaction.guild,
+            interaction.channel,
+            params,
+            started,
+            error,
+        )
+
+    def _record(self, kind, name, source, user_id, guild, channel, params, started, error):
+        finished = time.perf_counter()
+        outcome, error_name = _outcome(error)
+        self.record(
+            AuditRecord(
+                source.created_at.timestamp(),
+                kind,
+                name,
+                user_id,
+                guild.id if guild is not None else None,
+                channel.id if channel is not None else None,
+                finished - started if started is not None else None,
+                (utcnow() - source.created_at).total_seconds(),
+                outcome,
+                error_name,
+                _params(params),
+            )
+        )
+
+    @staticmethod
+    def _where(guild_id: Optional[int], since: Optional[float], **filters) -> tuple[str, tuple]:
+        clauses, params = [], []
+        if guild_id is not None:
+            clauses.append("guild_id = ?")
+            params.append(guild_id)
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("at >= ?")
+            params.append(time.time() - since)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), tuple(params)
+
+    async def top_commands(
+        self, guild_id: Optional[int] = None, *, since: Optional[float] = None, limit: int = 10
+    ) -> list[tuple[str, int]]:
+        """
+        Returns the most used commands and their invocation counts.
+
+        Parameters
+        ----------
+        guild_id: int
+            Only count invocations in this guild.
+        since: float
+            Only count invocations in the last `since` seconds.
+        limit: int
+            The number of commands to return.
+        """
+        where, params = self._where(guild_id, since)
+        return await self.bot.db.fetchall(
+            f"SELECT command, COUNT(*) FROM portal_audit{where} GROUP BY command ORDER BY 2 DESC LIMIT ?",
+            (*params, limit),
+        )
+
+    async def top_users(
+        self,
+        guild_id: Optional[int] = None,
+        *,
+        command: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 10,
+    ) -> list[tuple[int, int]]:
+        """
+        Returns the users who ran the most commands, and their invocation counts.
+
+        Parameters
+        ----------
+        guild_id: int
+            Only count invocations in this guild.
+        command: str
+            Only count invocations of this command.
+        since: float
+            Only count invocations in the last `since` seconds.
+        limit: int
+            The number of users to return.
+        """
+        where, params = self._where(guild_id, since, command=command)
+        return await self.bot.db.fetchall(
+            f"SELECT user_id, COUNT(*) FROM portal_audit{where} GROUP BY user_id ORDER BY 2 DESC LIMIT ?",
+            (*params, limit),
+        )
+
+    async def recent(
+        self,
+        guild_id: Optional[int] = None,
+        *,
+        user_id: Optional[int] = None,
+        command: Optional[str] = None,
+        outcome: Optional[str] = None,
+        limit: int = 50,
+    ) -> list[AuditRecord]:
+        """
+        Returns the latest records, newest first.
+
+        Parameters
+        ----------
+        guild_id: int
+            Only return invocations in this guild.
+        user_id: int
+            Only return invocations by this user.
+        command: str
+            Only return invocations of this command.
+        outcome: str
+            Only return invocations with this outcome, such as `error`.
+        limit: int
+            The number of records to return.
+        """
+        where, params = self._where(guild_id, None, user_id=user_id, command=command, outcome=outcome)
+        rows = await self.bot.db.fetchall(
+            f"SELECT {', '.join(AuditRecord._fields)} FROM portal_audit{where} ORDER BY at DESC LIMIT ?",
+            (*params, limit),
+        )
+        return [AuditRecord(*row) for row in rows]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the audit log's counters.
+        """
+        return {"recorded": self.recorded, "dropped": self.dropped}
+
+    async def report(self, guild_id: Optional[int] = None, *, since: float = 86400.0) -> str:
+        """
+        Formats the top commands and users over a period.
+
+        Parameters
+        ----------
+        guild_id: int
+            Only count invocations in this guild.
+        since: float
+            The period to count, in seconds.
+        """
+        lines = [f"Last {since / 3600:g} hours" + (f" in {guild_id}" if guild_id else ""), "", "Commands:"]
+        lines += [f"{count:>8}  {name}" for name, count in await self.top_commands(guild_id, since=since)]
+        lines += ["", "Users:"]
+        lines += [f"{count:>8}  {user_id}" for user_id, count in await self.top_users(guild_id, since=since)]
+        lines += ["", "  ".join(f"{k}: {v}" for k, v in self.stats().items())]
+        return "\n".join(lines)
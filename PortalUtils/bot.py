@@ -1,31 +1,129 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
 import os
-from typing import Union
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Union
 
 import aiohttp
-import aiosqlite
 import jishaku
 from discord import Color, Embed
 from discord.ext import commands
-from DPyUtils import load_extensions
 
+from .audit import AuditLog
+from .cache import CacheManager
+from .db import Database, WriteBehindQueue
+from .dispatcher import LogDispatcher
+from .embeds import fits, split_embed, truncate_embed
+from .errors import ErrorReporter
+from .http import HostLatency, HTTPCache, create_session
+from .maintenance import MaintenanceScheduler
+from .members import MemberCache, MemberCachePolicy
+from .metrics import MetricsRegistry
+from .paginators import PaginatorRegistry
 from .tree import CommandTree
 
+if TYPE_CHECKING:
+    from .monitor import LoopMonitor
+    from .runtime import RuntimeProfile
+
+log = getLogger(__name__)
+
+# Extensions loaded on start, in stages. Extensions in the same stage are loaded concurrently.
+DEFAULT_EXTENSIONS = (
+    ("jishaku", "PortalUtils.logging", "PortalUtils.helpc", "DPyUtils.ContextEditor2"),
+    ("PortalUtils.diagnostics",),  # Adds subcommands to jishaku
+)
+
 for f in ["NO_UNDERSCORE", "HIDE", "FORCE_PAGINATOR"]:
     setattr(jishaku.Flags, f, True)
 
+IMPORT_TIME = time.perf_counter() - _import_started
+
 
 class Embed(Embed):
     """
     A subclass of discord.Embed with an optional default color.
     Adds a default footer with the Portal Development copyright.
+
+    Keeps a running count of its field characters, so `size` and `fits` are cheap to check before sending.
+    Use `split` or `truncate` for embeds that may go over Discord's limits,
+    and `EmbedTemplate` for embeds that are built often.
     """
 
-    _default_color: Union[Color, int]
+    _default_color: Union[Color, int] = None
+    # Shared by every instance, set_footer replaces the dict instead of changing it.
+    _default_footer = {"text": "\u00a9 2024 Portal Development. All rights reserved - /info"}
+    # None when unknown, such as after from_dict.
+    _fields_len: Optional[int] = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._footer = {"text": "\u00a9 2024 Portal Development. All rights reserved - /info"}
-        self.color = self.color or self._default_color  # pylint: disable=no-member
+        self._footer = self._default_footer
+        self._fields_len = 0
+        if self._colour is None and (default := self._default_color) is not None:  # pylint: disable=no-member
+            self._colour = default if isinstance(default, Color) else Color(default)
+
+    @property
+    def size(self) -> int:
+        """
+        The number of characters that count towards the 6000 character limit.
+        """
+        if self._fields_len is None:
+            self._fields_len = sum(len(f["name"]) + len(f["value"]) for f in getattr(self, "_fields", ()))
+        size = len(self.title or "") + len(self.description or "") + self._fields_len
+        if footer := getattr(self, "_footer", None):
+            size += len(footer.get("text", ""))
+        if author := getattr(self, "_author", None):
+            size += len(author.get("name", ""))
+        return size
+
+    def add_field(self, *, name: Any, value: Any, inline: bool = True):
+        super().add_field(name=name, value=value, inline=inline)
+        if self._fields_len is not None:
+            field = self._fields[-1]
+            self._fields_len += len(field["name"]) + len(field["value"])
+        return self
+
+    def insert_field_at(self, index: int, *, name: Any, value: Any, inline: bool = True):
+        super().insert_field_at(index, name=name, value=value, inline=inline)
+        self._fields_len = None
+        return self
+
+    def set_field_at(self, index: int, *, name: Any, value: Any, inline: bool = True):
+        super().set_field_at(index, name=name, value=value, inline=inline)
+        self._fields_len = None
+        return self
+
+    def remove_field(self, index: int):
+        super().remove_field(index)
+        self._fields_len = None
+        return self
+
+    def clear_fields(self):
+        super().clear_fields()
+        self._fields_len = 0
+        return self
+
+    def fits(self) -> bool:
+        """
+        Whether the embed is within all of Discord's limits.
+        """
+        return fits(self)
+
+    def split(self) -> list["Embed"]:
+        """
+        Splits the embed into several that fit within Discord's limits, see `split_embed`.
+        """
+        return split_embed(self)
+
+    def truncate(self) -> "Embed":
+        """
+        Truncates the embed in place to fit within Discord's limits, see `truncate_embed`.
+        """
+        return truncate_embed(self)
 
 
 class EEmbed(Embed):
@@ -33,9 +131,7 @@ class EEmbed(Embed):
     A subclass of Embed with a default color of red.
     """
 
-    def __init__(self, **kwargs):
-        self._default_color = Color.red()
-        super().__init__(**kwargs)
+    _default_color = Color.red()
 
 
 class PortalBotMixin:
@@ -52,6 +148,71 @@ class PortalBotMixin:
         The channel ID for guild logs.
     command_logs: int
         The channel ID for command logs.
+    log_queue_size: int
+        The maximum number of log entries waiting to be sent.
+    log_flush_interval: float
+        The maximum number of seconds a log entry is buffered before being sent.
+    error_window: float
+        The number of seconds during which repeats of an app command error are only counted, not reported in full.
+    db_path: str
+        The path to the database file. The database is only opened if the file exists.
+    db_readers: int
+        The number of read-only connections in the database pool.
+    db_pragmas: dict[str, Any]
+        PRAGMA values for the database connections, see `Database`.
+    db_instrument: bool
+        Whether to record statement latencies and log slow queries, see `InstrumentedDatabase`.
+        The report is available with `jsk portal queries`.
+    db_slow_query: float
+        The number of seconds after which an instrumented statement is logged as slow.
+    write_queue_size: int
+        The maximum number of writes waiting in the write-behind queue.
+    write_flush_interval: float
+        The maximum number of seconds a queued write is buffered before being committed.
+    locales: str
+        The directory of JSON locale bundles for the built-in `Translator`.
+        If given, the bot gets a `t` method for `Cog.t`.
+    default_locale: str
+        The locale used when a translation is missing.
+    locale_reload: float
+        If set, the number of seconds between checks for changed locale bundles.
+    metrics_path: str
+        If set, the file to write Prometheus metrics to.
+    metrics_port: int
+        If set, the port of a local HTTP listener serving Prometheus metrics at `/metrics`.
+    metrics_host: str
+        The address the metrics listener binds to.
+    http_options: dict[str, Any]
+        Connection pool settings for `session`, see `create_session`.
+    http_cache: bool
+        Whether to create `http_cache` for cached GET requests through `session`.
+    http_cache_ttl: float
+        The number of seconds to cache responses that have no caching headers.
+    monitor: bool
+        Whether to watch the event loop for blocking code and time every listener and app command, see `LoopMonitor`.
+        The report is available with `jsk portal loop`.
+    monitor_options: dict[str, Any]
+        Settings for the monitor, such as `threshold` and `path`, see `LoopMonitor`.
+    audit_retention: float
+        The number of seconds command audit records are kept, see `AuditLog`. `0` keeps them forever.
+    paginator_budget: int
+        The memory budget for all live paginators, in bytes, see `PaginatorRegistry`.
+    paginator_idle: float
+        The number of seconds after which an unused paginator is evicted from memory.
+    maintenance: bool
+        Whether to checkpoint, optimize and vacuum the database in the background, see `MaintenanceScheduler`.
+        Disabled by default. The report is available with `jsk portal maintenance`.
+    maintenance_options: dict[str, Any]
+        Settings for the maintenance scheduler, such as `backup_dir` to enable backups.
+    member_cache: Union[str, MemberCachePolicy]
+        The member cache policy, `full`, `count`, `active` or a `MemberCachePolicy`, see `MemberCache`.
+        If given, guilds are chunked on first need instead of at startup, and `member_cache_flags` defaults to
+        the policy's flags. The report is available with `jsk portal memory`.
+    runtime_profile: Union[bool, RuntimeProfile]
+        Tunes the event loop and garbage collector, see `RuntimeProfile`. `True` uses the default profile.
+        The report is available with `jsk portal runtime`.
+    disabled_extensions: Iterable[str]
+        Default extensions not to load, such as `DPyUtils.ContextEditor2`.
     **kwargs
         See `discord.ext.commands.Bot` or `discord.ext.commands.AutoShardedBot`.
 
@@ -65,10 +226,43 @@ class PortalBotMixin:
         The channel ID for guild logs.
     command_logs: int
         The channel ID for command logs.
-    db: aiosqlite.Connection
-        The database connection.
+    log_dispatcher: LogDispatcher
+        The batching queue used to send messages to the log channels.
+    error_reporter: ErrorReporter
+        Deduplicates app command error reports. Recent reports are available with `jsk portal errors`.
+    db: Database
+        The database connection pool.
+    write_queue: WriteBehindQueue
+        The write-behind queue for `db`.
+    translator: Translator
+        The translation provider, if `locales` was given.
+    metrics: MetricsRegistry
+        Per-command invocation, error and latency metrics.
+    startup_timings: dict[str, float]
+        How long each startup phase took, in seconds. See `startup_report`.
     session: aiohttp.ClientSession
         The aiohttp session.
+    http_cache: HTTPCache
+        The response cache for `session`, if `http_cache` was enabled.
+    http_latency: HostLatency
+        Request latency per host for `session`. The report is available with `jsk portal http`.
+    commands_version: int
+        Incremented whenever a command or cog is added or removed, used to invalidate cached help.
+    monitor: Optional[LoopMonitor]
+        The event loop monitor, if `monitor` was enabled.
+    audit: AuditLog
+        Records every command invocation in `db`, if the bot has one. The report is available with `jsk portal audit`.
+    paginators: PaginatorRegistry
+        The live paginators, and the store for persistent ones. The report is available with `jsk portal paginators`.
+    member_cache: MemberCache
+        Applies the member cache policy and chunks guilds on first need, with `member_cache.ensure_chunked`.
+    caches: CacheManager
+        Two-tier TTL caches for cog data, in memory and in `db`. Create one with `caches.create`.
+        The report is available with `jsk portal caches`.
+    maintenance: Optional[MaintenanceScheduler]
+        The database maintenance scheduler, if `maintenance` is enabled.
+    runtime_profile: Optional[RuntimeProfile]
+        The runtime profile, if `runtime_profile` was given.
     Embed: Embed
         The Embed class.
     EEmbed: Embed
@@ -76,11 +270,22 @@ class PortalBotMixin:
 
     Methods
     -------
+    run(*args, **kwargs)
+        Installs the runtime profile's event loop, then runs the bot.
     start(*args, **kwargs)
         Loads extensions and starts the bot.
+    close()
+        Flushes pending logs and writes, then closes the bot.
+    queue_write(sql, parameters)
+        Queues a write to be committed in the next batch.
+    startup_report()
+        Returns a breakdown of the startup time.
     db_schema(*tables)
         Returns the schema for the given tables."""
 
+    # A class default, since `commands.Bot.__init__` adds the default help command before ours runs.
+    commands_version = 0
+
     def __init__(
         self,
         *args,
@@ -88,42 +293,282 @@ class PortalBotMixin:
         error_logs: int = 0,
         guild_logs: int = 0,
         command_logs: int = 0,
+        log_queue_size: int = 1000,
+        log_flush_interval: float = 2.0,
+        error_window: float = 300.0,
+        db_path: str = "data.db",
+        db_readers: int = 4,
+        db_pragmas: dict[str, Any] = None,
+        db_instrument: bool = False,
+        db_slow_query: float = 0.1,
+        write_queue_size: int = 10000,
+        write_flush_interval: float = 1.0,
+        locales: str = None,
+        default_locale: str = "en-US",
+        locale_reload: float = 0,
+        metrics_path: str = None,
+        metrics_port: int = None,
+        metrics_host: str = "127.0.0.1",
+        http_options: dict[str, Any] = None,
+        http_cache: bool = False,
+        http_cache_ttl: float = 60.0,
+        monitor: bool = False,
+        monitor_options: dict[str, Any] = None,
+        audit_retention: float = 90 * 86400.0,
+        paginator_budget: int = 64 * 2**20,
+        paginator_idle: float = 900.0,
+        maintenance: bool = False,
+        maintenance_options: dict[str, Any] = None,
+        member_cache: Union[str, MemberCachePolicy] = None,
+        runtime_profile: Union[bool, "RuntimeProfile"] = None,
+        disabled_extensions: Iterable[str] = (),
         **kwargs,
     ):
         kwargs.setdefault("tree_cls", CommandTree)
+        if member_cache is None:
+            policy = MemberCachePolicy.full()
+        else:
+            policy = MemberCachePolicy.named(member_cache) if isinstance(member_cache, str) else member_cache
+            if (intents := kwargs.get("intents")) is not None:
+                kwargs.setdefault("member_cache_flags", policy.flags(intents))
+            kwargs.setdefault("chunk_guilds_at_startup", False)
         super().__init__(*args, **kwargs)
         self.color: Union[Color, int] = color
         self.error_logs = error_logs
         self.guild_logs = guild_logs
         self.command_logs = command_logs
+        self.log_dispatcher = LogDispatcher(self, max_size=log_queue_size, flush_interval=log_flush_interval)
+        self.error_reporter = ErrorReporter(self, window=error_window)
+
+        self.db_path = db_path
+        self.db_readers = db_readers
+        self.db_pragmas = db_pragmas
+        self.db_instrument = db_instrument
+        self.db_slow_query = db_slow_query
+        self.write_queue_size = write_queue_size
+        self.write_flush_interval = write_flush_interval
 
-        self.db: aiosqlite.Connection
+        self.locale_reload = locale_reload
+        if locales is not None:
+            from .i18n import Translator
+
+            self.translator = Translator(locales, default_locale=default_locale)
+            self.t = self.translator.t
+        self._locale_watcher: asyncio.Task = None
+        self._ready_timer: Optional[asyncio.Task] = None
+        self.metrics = MetricsRegistry()
+        self.metrics.gauge("guilds", "Guilds the bot is in.", lambda: len(self.guilds))
+        self.metrics.gauge("log_queue_pending", "Log entries waiting to be sent.", lambda: self.log_dispatcher.pending)
+        self.metrics.counter("log_entries_dropped_total", "Log entries dropped.", lambda: self.log_dispatcher.dropped)
+        self._metrics_options = {"path": metrics_path, "port": metrics_port, "host": metrics_host}
+        self.http_options = http_options or {}
+        self.http_cache_enabled = http_cache
+        self.http_cache_ttl = http_cache_ttl
+        self.http_latency = HostLatency()
+        self.monitor: Optional[LoopMonitor] = None
+        if monitor:
+            from .monitor import LoopMonitor
+
+            self.monitor = LoopMonitor(**(monitor_options or {}))
+            self.metrics.gauge(
+                "event_loop_lag_p95_seconds", "95th percentile event loop lag.", lambda: self.monitor.lag.quantile(0.95)
+            )
+        self.audit = AuditLog(self, retention=audit_retention)
+        self.metrics.counter("audit_records_dropped_total", "Audit records dropped.", lambda: self.audit.dropped)
+        self.paginators = PaginatorRegistry(self, budget=paginator_budget, idle_timeout=paginator_idle)
+        self.metrics.gauge("paginators_live", "Paginators held in memory.", lambda: len(self.paginators))
+        self.caches = CacheManager(self)
+        self.metrics.gauge(
+            "cache_entries", "Values held in memory by the caches.", lambda: sum(map(len, self.caches.caches.values()))
+        )
+        self.maintenance: Optional[MaintenanceScheduler] = None
+        if maintenance:
+            self.maintenance = MaintenanceScheduler(self, **(maintenance_options or {}))
+        self.member_cache = MemberCache(self, policy)
+        self.metrics.gauge(
+            "members_cached", "Members in the member cache.", lambda: sum(len(g._members) for g in self.guilds)
+        )
+        self.runtime_profile: Optional[RuntimeProfile] = None
+        if runtime_profile:
+            from .runtime import RuntimeProfile
+
+            self.runtime_profile = RuntimeProfile() if runtime_profile is True else runtime_profile
+        self.disabled_extensions = set(disabled_extensions)
+        self.startup_timings: dict[str, float] = {"import": IMPORT_TIME}
+
+        self.db: Database
+        self.write_queue: WriteBehindQueue
         self.session: aiohttp.ClientSession
+        self.http_cache: HTTPCache = None
         self.Embed: Embed = Embed
-        self.Embed._default_color = self.color
+        self.Embed._default_color = Color(color) if isinstance(color, int) else color
         self.EEmbed = EEmbed
 
+    def add_command(self, command: commands.Command, /):
+        super().add_command(command)
+        self.commands_version += 1
+
+    def remove_command(self, name: str, /) -> Optional[commands.Command]:
+        command = super().remove_command(name)
+        self.commands_version += 1
+        return command
+
+    async def add_cog(self, cog: commands.Cog, /, **kwargs):
+        await super().add_cog(cog, **kwargs)
+        self.commands_version += 1
+
+    async def remove_cog(self, name: str, /, **kwargs) -> Optional[commands.Cog]:
+        cog = await super().remove_cog(name, **kwargs)
+        self.commands_version += 1
+        return cog
+
+    async def _run_event(self, coro, event_name: str, *args, **kwargs):
+        if self.monitor is None:
+            return await super()._run_event(coro, event_name, *args, **kwargs)
+        name = f"{event_name} {getattr(coro, '__qualname__', coro)}"
+
+        async def timed(*args, **kwargs):
+            await self.monitor.run(coro(*args, **kwargs), name)
+
+        await super()._run_event(timed, event_name, *args, **kwargs)
+
+    async def load_default_extensions(self):
+        """
+        Loads the default extensions that aren't disabled, concurrently within each stage.
+        If any extension fails to load, the rest of its stage finishes loading, then the first error is raised.
+        """
+
+        async def load(name: str):
+            started = time.perf_counter()
+            try:
+                await self.load_extension(name)
+            finally:
+                self.startup_timings[f"extension:{name}"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for stage in DEFAULT_EXTENSIONS:
+            names = [name for name in stage if name not in self.disabled_extensions]
+            results = await asyncio.gather(*map(load, names), return_exceptions=True)
+            errors = [(name, e) for name, e in zip(names, results) if isinstance(e, BaseException)]
+            for name, error in errors[1:]:
+                log.error("Failed to load extension %s", name, exc_info=error)
+            if errors:
+                raise errors[0][1]
+        self.startup_timings["extensions"] = time.perf_counter() - started
+
+    def run(self, *args, **kwargs):
+        if self.runtime_profile is not None:
+            self.runtime_profile.install_event_loop()
+        super().run(*args, **kwargs)
+
     async def start(self, *args, **kwargs):
-        await load_extensions(
-            self,
-            directories=[],
-            extra_cogs=[
-                "jishaku",
-                "PortalUtils.logging",
-                "PortalUtils.helpc",
-                "DPyUtils.ContextEditor2",
-            ],
-        )
-        if "data.db" in os.listdir() and not hasattr(self, "db"):
-            async with aiosqlite.connect("data.db") as db, aiohttp.ClientSession() as session:
+        if self.runtime_profile is not None:
+            self.runtime_profile.start(self)
+        await self.load_default_extensions()
+        self.log_dispatcher.start()
+        self.error_reporter.start()
+        if self.monitor is not None:
+            self.monitor.start()
+        self.member_cache.start()
+        await self.metrics.start(**self._metrics_options)
+        if hasattr(self, "translator") and self.locale_reload:
+            self._locale_watcher = asyncio.create_task(self.translator.watch(self.locale_reload))
+        if os.path.isfile(self.db_path) and not hasattr(self, "db"):
+            db_kwargs = {"readers": self.db_readers, "pragmas": self.db_pragmas}
+            if self.db_instrument:
+                from .querystats import InstrumentedDatabase
+
+                db_cls, db_kwargs["slow_threshold"] = InstrumentedDatabase, self.db_slow_query
+            else:
+                db_cls = Database
+            async with db_cls(self.db_path, **db_kwargs) as db, self._create_session() as session:
                 self.db = db
+                self.write_queue = WriteBehindQueue(
+                    db, max_size=self.write_queue_size, flush_interval=self.write_flush_interval
+                )
+                self.write_queue.start()
+                await self.audit.start()
+                await self.paginators.start()
+                await self.caches.start()
+                if self.maintenance is not None:
+                    self.maintenance.start()
                 self.session = session
-                await super().start(*args, **kwargs)
+                try:
+                    await super().start(*args, **kwargs)
+                finally:
+                    await self.write_queue.close()
         else:
-            async with aiohttp.ClientSession() as session:
+            async with self._create_session() as session:
                 self.session = session
+                await self.paginators.start()
+                await self.caches.start()
                 await super().start(*args, **kwargs)
 
+    def _create_session(self) -> aiohttp.ClientSession:
+        session = create_session(latency=self.http_latency, **self.http_options)
+        if self.http_cache_enabled:
+            self.http_cache = HTTPCache(session, default_ttl=self.http_cache_ttl)
+        return session
+
+    async def login(self, token: str):
+        started = time.perf_counter()
+        await super().login(token)
+        self.startup_timings["login"] = time.perf_counter() - started
+        if self._ready_timer is None or self._ready_timer.done():
+            self._ready_timer = asyncio.create_task(self._time_ready(time.perf_counter()))
+
+    async def _time_ready(self, started: float):
+        await self.wait_until_ready()
+        self.startup_timings["connect"] = time.perf_counter() - started
+
+    def startup_report(self) -> str:
+        """
+        Returns a breakdown of how long each startup phase took.
+        """
+        lines = []
+        for phase, seconds in self.startup_timings.items():
+            indent = "  " if phase.startswith("extension:") else ""
+            lines.append(f"{indent}{phase.removeprefix('extension:'):<32} {seconds * 1000:>9.1f} ms")
+        return "\n".join(lines)
+
+    async def close(self):
+        if self._locale_watcher is not None:
+            self._locale_watcher.cancel()
+        if self._ready_timer is not None:
+            self._ready_timer.cancel()
+        await self.metrics.close()
+        self.error_reporter.close()
+        self.paginators.close()
+        self.audit.close()
+        self.caches.close()
+        if self.maintenance is not None:
+            self.maintenance.close()
+        self.member_cache.close()
+        if self.runtime_profile is not None:
+            self.runtime_profile.close()
+        if self.monitor is not None:
+            self.monitor.close()
+        await self.log_dispatcher.close()
+        if hasattr(self, "write_queue"):
+            await self.write_queue.close()
+        await super().close()
+
+    async def queue_write(self, sql: str, parameters: Iterable[Any] = ()):
+        """
+        Queues a write to be committed with others in a single transaction.
+        Waits if the write queue is full.
+
+        Parameters
+        ----------
+        sql: str
+            The statement to run.
+        parameters: Iterable[Any]
+            The statement parameters.
+        """
+        if not hasattr(self, "write_queue"):
+            raise RuntimeError("Bot has no active DB connection")
+        await self.write_queue.put(sql, parameters)
+
     async def db_schema(self, *tables):
         """
         Shows the SQLite schema for the given tables.
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+log = getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS portal_cache ("
+    "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL, expires REAL NOT NULL, "
+    "PRIMARY KEY (namespace, key)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS portal_cache_expires ON portal_cache (expires)",
+)
+
+UPSERT = "INSERT OR REPLACE INTO portal_cache (namespace, key, value, stored_at, expires) VALUES (?, ?, ?, ?, ?)"
+
+_MISSING = object()
+
+Loader = Callable[[Any], Awaitable[Any]]
+
+
+def _key(key: Any) -> str:
+    # Keys are stored as JSON, so 1, "1" and (1, 2) stay distinct.
+    return json.dumps(key, separators=(",", ":"))
+
+
+class TTLCache:
+    """
+    A two-tier cache: an in-memory LRU in front of the `portal_cache` table of `bot.db`.
+
+    Lookups are served from memory, then from the database, then by the loader. Values found in the database
+    are put back in memory, so a restarted bot warms up from disk instead of from upstream services.
+    Concurrent lookups of a key that isn't in memory share a single load.
+
+    Values reach the database through the bot's write-behind queue, as JSON. Only values that come back from JSON
+    unchanged are persisted: values with tuples, sets, dict keys that aren't strings, or anything else JSON can't
+    represent exactly are only cached in memory, so a value read from the database is always equal to the one set.
+    Set `persist` to False for caches of such values, or of values that are cheap to load.
+    Create caches with `CacheManager.create`.
+
+    Parameters
+    ----------
+    manager: CacheManager
+        The manager whose database is used.
+    namespace: str
+        The name of the cache, which keeps its keys apart from other caches in the table.
+    loader: Callable[[Any], Awaitable[Any]]
+        Loads the value of a key that isn't cached. Can be overridden per lookup.
+    ttl: float
+        The number of seconds values are cached for.
+    max_entries: int
+        The maximum number of values in memory. The least recently used are evicted first, but stay in the database.
+    persist: bool
+        Whether values are also stored in the database.
+
+    Attributes
+    ----------
+    hits: int
+        Lookups served from memory.
+    disk_hits: int
+        Lookups served from the database.
+    misses: int
+        Lookups that called the loader, or found nothing without one.
+    collapsed: int
+        Lookups that shared a load already in progress.
+    evicted: int
+        Values evicted from memory to stay within `max_entries`.
+    """
+
+    def __init__(
+        self,
+        manager: CacheManager,
+        namespace: str,
+        *,
+        loader: Optional[Loader] = None,
+        ttl: float = 300.0,
+        max_entries: int = 1024,
+        persist: bool = True,
+    ):
+        self.manager = manager
+        self.namespace = namespace
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.evicted = 0
+        # Values and their expiry times, as Unix timestamps.
+        self._entries: OrderedDict[Any, tuple[Any, float]] = OrderedDict()
+        self._in_flight: dict[Any, asyncio.Task] = {}
+        # When each key, or the whole cache, was last invalidated. Older rows in the database are ignored,
+        # since the deletion is queued behind any writes that were already pending.
+        self._invalidated: dict[Any, float] = {}
+        self._cleared = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.time()
+
+    @property
+    def _persisting(self) -> bool:
+        return self.persist and self.manager.can_persist
+
+    async def get(self, key: Any, loader: Optional[Loader] = None, *, default: Any = None) -> Any:
+        """
+        Returns a cached value, loading it if it isn't cached.
+
+        Parameters
+        ----------
+        key: Any
+            The key to look up. Must be hashable, and JSON serializable if the cache persists.
+        loader: Callable[[Any], Awaitable[Any]]
+            Overrides the cache's loader for this lookup.
+        default: Any
+            Returned if the key isn't cached and there's no loader.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if (task := self._in_flight.get(key)) is not None:
+            self.collapsed += 1
+        else:
+            # The load runs in its own task, so it carries on for the other lookups if this one is cancelled.
+            task = self._in_flight[key] = asyncio.ensure_future(self._load(key, loader or self.loader))
+            task.add_done_callback(lambda t: self._loaded(key, t))
+        value = await asyncio.shield(task)
+        return default if value is _MISSING else value
+
+    def _loaded(self, key: Any, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every lookup was cancelled meanwhile.
+            task.exception()
+
+    async def _load(self, key: Any, loader: Optional[Loader]) -> Any:
+        started = time.time()
+        if self._persisting:
+            row = await self.manager.bot.db.fetchone(
+                "SELECT value, stored_at, expires FROM portal_cache WHERE namespace = ? AND key = ? AND expires > ?",
+                (self.namespace, _key(key), started),
+            )
+            if row is not None and row[1] > max(self._cleared, self._invalidated.get(key, 0.0)):
+                self.disk_hits += 1
+                value = json.loads(row[0])
+                self._store(key, value, row[2])
+                return value
+        self.misses += 1
+        if loader is None:
+            return _MISSING
+        value = await loader(key)
+        if started > max(self._cleared, self._invalidated.get(key, 0.0)):
+            # Not invalidated while loading.
+            self.set(key, value)
+        return value
+
+    def _store(self, key: Any, value: Any, expires: float):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def set(self, key: Any, value: Any, *, ttl: Optional[float] = None):
+        """
+        Caches a value, replacing any cached value of the key.
+
+        Parameters
+        ----------
+        key: Any
+            The key to set.
+        value: Any
+            The value. Values that don't survive a JSON round trip are only cached in memory.
+        ttl: float
+            Overrides the number of seconds the value is cached for.
+        """
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        self._store(key, value, expires)
+        if not self._persisting:
+            return
+        try:
+            data = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            log.debug("Not persisting %r in cache %s: %s", key, self.namespace, e)
+            return
+        if json.loads(data) != value:
+            # Such as int dict keys becoming strings, or tuples becoming lists.
+            log.debug("Not persisting %r in cache %s: changed by the JSON round trip", key, self.namespace)
+            return
+        self.manager.write(UPSERT, (self.namespace, _key(key), data, now, expires))
+
+    def invalidate(self, key: Any = _MISSING):
+        """
+        Removes a cached value from memory and the database, or every value if no key is given.
+        Loads already in progress won't cache their results.
+
+        Parameters
+        ----------
+        key: Any
+            The key to remove.
+        """
+        now = time.time()
+        if key is _MISSING:
+            self._entries.clear()
+            self._in_flight.clear()
+            self._invalidated.clear()
+            self._cleared = now
+            if self._persisting:
+                self.manager.write("DELETE FROM portal_cache WHERE namespace = ?", (self.namespace,))
+            return
+        self._entries.pop(key, None)
+        self._in_flight.pop(key, None)
+        self._invalidated[key] = now
+        if self._persisting:
+            self.manager.write("DELETE FROM portal_cache WHERE namespace = ? AND key = ?", (self.namespace, _key(key)))
+
+    async def warm(self, limit: Optional[int] = None) -> int:
+        """
+        Loads the most recently stored values from the database into memory.
+
+        Parameters
+        ----------
+        limit: int
+            The maximum number of values to load. Defaults to `max_entries`.
+
+        Returns
+        -------
+        int
+            The number of values loaded.
+        """
+        if not self._persisting:
+            return 0
+        rows = await self.manager.bot.db.fetchall(
+            "SELECT key, value, stored_at, expires FROM portal_cache WHERE namespace = ? AND expires > ? AND stored_at > ? "
+            "ORDER BY stored_at DESC LIMIT ?",
+            (self.namespace, time.time(), self._cleared, limit or self.max_entries),
+        )
+        loaded = 0
+        for key, value, stored_at, expires in reversed(rows):
+            key = json.loads(key)
+            # JSON has no tuples, and lists aren't hashable.
+            key = tuple(key) if isinstance(key, list) else key
+            if key not in self._entries and stored_at > self._invalidated.get(key, 0.0):
+                self._store(key, json.loads(value), expires)
+                loaded += 1
+        return loaded
+
+    def sweep(self) -> int:
+        """
+        Removes expired values from memory, and invalidation records the write queue has caught up with.
+
+        Returns
+        -------
+        int
+            The number of values removed.
+        """
+        now = time.time()
+        expired = [key for key, (_, expires) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        horizon = now - self.manager.invalidation_window
+        self._invalidated = {key: at for key, at in self._invalidated.items() if at > horizon}
+        return len(expired)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the cache's counters.
+        """
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+            "evicted": self.evicted,
+        }
+
+
+class CacheManager:
+    """
+    Creates `TTLCache`s, owns their database table, and expires their values.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot whose database stores the caches.
+    sweep_interval: float
+        The number of seconds between removals of expired values from memory and the database.
+
+    Attributes
+    ----------
+    caches: dict[str, TTLCache]
+        The caches by namespace.
+    can_persist: bool
+        Whether the bot has a database to store values in, once `start` has run.
+    dropped: int
+        Database writes lost because the write queue was full or closed. The values stay in memory.
+    """
+
+    def __init__(self, bot: Bot, *, sweep_interval: float = 60.0):
+        self.bot = bot
+        self.sweep_interval = sweep_interval
+        self.caches: dict[str, TTLCache] = {}
+        self.can_persist = False
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __getitem__(self, namespace: str) -> TTLCache:
+        return self.caches[namespace]
+
+    @property
+    def invalidation_window(self) -> float:
+        """
+        How long an invalidation is remembered, long enough for the write queue to apply the deletion.
+        """
+        return max(60.0, getattr(self.bot, "write_flush_interval", 1.0) * 10)
+
+    def create(self, namespace: str, **options) -> TTLCache:
+        """
+        Creates a cache, replacing any with the same namespace, such as when a cog is reloaded.
+        Values in the database are kept.
+
+        Parameters
+        ----------
+        namespace: str
+            The name of the cache.
+        **options
+            See `TTLCache`.
+        """
+        cache = self.caches[namespace] = TTLCache(self, namespace, **options)
+        return cache
+
+    async def start(self):
+        """
+        Creates the cache table if the bot has a database, and starts the background sweep.
+        """
+        if hasattr(self.bot, "db"):
+            async with self.bot.db.transaction() as conn:
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+            self.can_persist = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="PortalUtils-cache-sweep")
+
+    def close(self):
+        """
+        Stops the background sweep and writing to the database.
+        """
+        self.can_persist = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def write(self, sql: str, parameters: tuple):
+        """
+        Queues a write to the cache table, counting it as dropped if the write queue is full or closed.
+
+        Parameters
+        ----------
+        sql: str
+            The statement to run.
+        parameters: tuple
+            The statement parameters.
+        """
+        try:
+            self.bot.write_queue.put_nowait(sql, parameters)
+        except (asyncio.QueueFull, RuntimeError):
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            for cache in self.caches.values():
+                cache.sweep()
+            if self.can_persist:
+                self.write("DELETE FROM portal_cache WHERE expires <= ?", (time.time(),))
+
+    def report(self) -> str:
+        """
+        Formats each cache's counters and hit rate.
+        """
+        lines = [
+            f"{'entries':>8} {'hits':>9} {'disk':>8} {'misses':>8} {'collapsed':>9} {'evicted':>8} {'hit %':>6}  cache"
+        ]
+        for namespace, cache in sorted(self.caches.items()):
+            s = cache.stats()
+            lookups = s["hits"] + s["disk_hits"] + s["misses"]
+            rate = (s["hits"] + s["disk_hits"]) / lookups * 100 if lookups else 0.0
+            lines.append(
+                f"{s['entries']:>8} {s['hits']:>9} {s['disk_hits']:>8} {s['misses']:>8} {s['collapsed']:>9} "
+                f"{s['evicted']:>8} {rate:>6.1f}  {namespace}"
+            )
+        lines += ["", f"persist: {self.can_persist}  dropped writes: {self.dropped}"]
+        return "\n".join(lines)
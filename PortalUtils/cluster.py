@@ -0,0 +1,619 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
+
+from .metrics import MetricsRegistry
+
+if TYPE_CHECKING:
+    from .bot import PortalBotMixin
+
+log = getLogger(__name__)
+
+# Heartbeats carry the rendered metrics, so lines can be much longer than the default stream limit.
+LINE_LIMIT = 2**24
+
+Factory = Union[str, Callable[..., "PortalBotMixin"]]
+
+
+def shard_ranges(shard_count: int, clusters: int) -> list[list[int]]:
+    """
+    Splits the shard IDs into contiguous, evenly sized ranges.
+
+    Parameters
+    ----------
+    shard_count: int
+        The total number of shards.
+    clusters: int
+        The number of ranges.
+    """
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (i < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def _resolve(factory: Factory) -> Callable[..., PortalBotMixin]:
+    if isinstance(factory, str):
+        module, _, attr = factory.partition(":")
+        return getattr(importlib.import_module(module), attr)
+    return factory
+
+
+def _add_label(line: str, label: str) -> str:
+    name, sep, rest = line.partition("{")
+    if sep:
+        return f"{name}{{{label},{rest}"
+    name, _, value = line.partition(" ")
+    return f"{name}{{{label}}} {value}"
+
+
+def merge_metrics(texts: dict[int, str]) -> str:
+    """
+    Merges the Prometheus metrics of several clusters, adding a `cluster` label to every sample.
+
+    Parameters
+    ----------
+    texts: dict[int, str]
+        The rendered metrics of each cluster.
+    """
+    families: dict[str, tuple[list[str], list[str]]] = {}
+    for cluster, text in texts.items():
+        label = f'cluster="{cluster}"'
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                _, kind, name, *_ = line.split(" ", 3)
+                family = families.setdefault(name, ([], []))
+                if len(family[0]) < 2 and kind in ("HELP", "TYPE"):
+                    family[0].append(line)
+            elif line and family is not None:
+                family[1].append(_add_label(line, label))
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def format_status(clusters: list[dict[str, Any]]) -> str:
+    """
+    Formats cluster statuses, as returned by `ClusterLauncher.status`, as a table.
+
+    Parameters
+    ----------
+    clusters: list[dict[str, Any]]
+        The statuses to format.
+    """
+    lines = [f"{'cluster':>7} {'shards':<9} {'pid':>7} {'state':<8} {'latency ms':>10} {'guilds':>7} {'restarts':>8}"]
+    for c in clusters:
+        shards = f"{c['shards'][0]}-{c['shards'][-1]}" if c["shards"] else "-"
+        latency = f"{c['latency'] * 1000:.1f}" if c["latency"] is not None else "-"
+        lines.append(
+            f"{c['id']:>7} {shards:<9} {c['pid'] or '-':>7} {c['state']:<8} {latency:>10} {c['guilds']:>7} "
+            f"{c['restarts']:>8}"
+        )
+    return "\n".join(lines)
+
+
+class ClusterStatus:
+    """
+    The launcher's view of one cluster.
+
+    Attributes
+    ----------
+    id: int
+        The cluster ID.
+    shard_ids: list[int]
+        The shards the cluster runs.
+    process: multiprocessing.Process
+        The cluster's current process.
+    ready: bool
+        Whether the cluster's bot reported being ready.
+    latency: Optional[float]
+        The cluster's average gateway latency, in seconds.
+    guilds: int
+        The number of guilds on the cluster's shards.
+    last_heartbeat: Optional[float]
+        When the last heartbeat was received, on the `time.monotonic` clock.
+    started: Optional[float]
+        When the current process was started, on the `time.monotonic` clock.
+    restarts: int
+        How many times the cluster was restarted.
+    metrics: str
+        The cluster's rendered metrics, from its last heartbeat.
+    """
+
+    __slots__ = (
+        "id",
+        "shard_ids",
+        "process",
+        "ready",
+        "latency",
+        "guilds",
+        "last_heartbeat",
+        "started",
+        "restarts",
+        "metrics",
+    )
+
+    def __init__(self, id: int, shard_ids: list[int]):
+        self.id = id
+        self.shard_ids = shard_ids
+        self.process: Optional[multiprocessing.Process] = None
+        self.ready = False
+        self.latency: Optional[float] = None
+        self.guilds = 0
+        self.last_heartbeat: Optional[float] = None
+        self.started: Optional[float] = None
+        self.restarts = 0
+        self.metrics = ""
+
+    def state(self, timeout: float) -> str:
+        """
+        Returns `down`, `stale`, `starting` or `ready`.
+
+        Parameters
+        ----------
+        timeout: float
+            The number of seconds without a heartbeat after which the cluster is stale.
+        """
+        if self.process is None or not self.process.is_alive():
+            return "down"
+        if self.last_heartbeat is not None and time.monotonic() - self.last_heartbeat > timeout:
+            return "stale"
+        return "ready" if self.ready else "starting"
+
+
+class ClusterMetrics(MetricsRegistry):
+    """
+    The metrics of every cluster, merged with the launcher's own gauges.
+    """
+
+    def __init__(self, launcher: ClusterLauncher, namespace: str = "portal"):
+        super().__init__(namespace)
+        self.launcher = launcher
+
+    def render(self) -> str:
+        texts = {c.id: c.metrics for c in self.launcher.clusters if c.metrics}
+        # The launcher runs no commands, only keep its gauges.
+        own = "\n".join(line for line in super().render().splitlines() if "_command_" not in line)
+        return merge_metrics(texts) + own + "\n"
+
+
+class ClusterLauncher:
+    """
+    Splits a bot's shards across worker processes and supervises them.
+
+    The launcher and the clusters talk over a Unix socket, one JSON object per line.
+    Clusters send heartbeats with their health, latency and rendered metrics.
+    Clusters other than cluster 0 forward their log channel entries to cluster 0, which sends them with its
+    `log_dispatcher`, so the log channels still receive a single batched stream.
+    The launcher serves the metrics of every cluster with a `cluster` label, and restarts clusters that exit
+    or stop sending heartbeats.
+
+    Parameters
+    ----------
+    factory: Union[str, Callable[..., PortalBotMixin]]
+        Creates the bot in each worker, called with the `shard_ids` and `shard_count` keyword arguments.
+        Either an importable `"module:function"` string or a picklable callable.
+        Any client-like object works, such as a bot pointed at a local stand-in gateway.
+    token: str
+        The bot token.
+    shard_count: int
+        The total number of shards.
+    clusters: int
+        The number of worker processes. Defaults to the number of CPUs.
+    socket_path: str
+        The Unix socket the launcher listens on. Defaults to a file in the temporary directory.
+    heartbeat_interval: float
+        The number of seconds between cluster heartbeats and supervision checks.
+    heartbeat_timeout: float
+        The number of seconds without a heartbeat after which a cluster is killed and restarted.
+    startup_timeout: float
+        The number of seconds a new cluster has to send its first heartbeat before it's killed and restarted.
+        Defaults to `heartbeat_timeout`.
+    restart: bool
+        Whether to restart clusters that exit.
+    metrics_path: str
+        If set, the file to write the merged metrics to.
+    metrics_port: int
+        If set, the port of a local HTTP listener serving the merged metrics at `/metrics`.
+    metrics_host: str
+        The address the metrics listener binds to.
+
+    Attributes
+    ----------
+    clusters: list[ClusterStatus]
+        The status of each cluster.
+    metrics: ClusterMetrics
+        The merged metrics of every cluster.
+    """
+
+    def __init__(
+        self,
+        factory: Factory,
+        token: str,
+        *,
+        shard_count: int,
+        clusters: Optional[int] = None,
+        socket_path: Optional[str] = None,
+        heartbeat_interval: float = 5.0,
+        heartbeat_timeout: float = 30.0,
+        startup_timeout: Optional[float] = None,
+        restart: bool = True,
+        metrics_path: Optional[str] = None,
+        metrics_port: Optional[int] = None,
+        metrics_host: str = "127.0.0.1",
+    ):
+        self.factory = factory
+        self.token = token
+        self.shard_count = shard_count
+        self.socket_path = socket_path or os.path.join(tempfile.gettempdir(), f"portal-cluster-{os.getpid()}.sock")
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = heartbeat_timeout if startup_timeout is None else startup_timeout
+        self.restart = restart
+        self.clusters = [
+            ClusterStatus(i, shards) for i, shards in enumerate(shard_ranges(shard_count, clusters or os.cpu_count()))
+        ]
+        self.metrics = ClusterMetrics(self)
+        self.metrics.gauge("clusters", "Clusters configured.", lambda: len(self.clusters))
+        self.metrics.gauge(
+            "clusters_ready", "Clusters reporting ready.", lambda: sum(c.ready for c in self.clusters if c.process)
+        )
+        self._metrics_options = {"path": metrics_path, "port": metrics_port, "host": metrics_host}
+        self._writers: dict[int, asyncio.StreamWriter] = {}
+        # Log entries waiting for cluster 0 to (re)connect.
+        self._pending_logs: deque[bytes] = deque(maxlen=1000)
+        self._context = multiprocessing.get_context("spawn")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._closed = asyncio.Event()
+
+    def _spawn(self, cluster: ClusterStatus):
+        cluster.ready, cluster.latency, cluster.last_heartbeat = False, None, None
+        cluster.process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self.factory,
+                self.token,
+                cluster.id,
+                cluster.shard_ids,
+                self.shard_count,
+                self.socket_path,
+                self.heartbeat_interval,
+            ),
+            name=f"PortalUtils-cluster-{cluster.id}",
+            daemon=False,
+        )
+        cluster.process.start()
+        cluster.started = time.monotonic()
+        log.info("Started cluster %s (shards %s) as PID %s", cluster.id, cluster.shard_ids, cluster.process.pid)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cluster = None
+        try:
+            hello = json.loads(await reader.readline())
+            cluster = self.clusters[hello["cluster"]]
+            self._writers[cluster.id] = writer
+            if cluster.id == 0:
+                while self._pending_logs:
+                    writer.write(self._pending_logs.popleft())
+            async for line in reader:
+                message = json.loads(line)
+                op = message["op"]
+                if op == "heartbeat":
+                    cluster.last_heartbeat = time.monotonic()
+                    cluster.ready = message["ready"]
+                    cluster.latency = message["latency"]
+                    cluster.guilds = message["guilds"]
+                    cluster.metrics = message.get("metrics", "")
+                elif op == "log":
+                    if (main := self._writers.get(0)) is not None:
+                        main.write(line)
+                    else:
+                        self._pending_logs.append(line)
+                elif op == "status":
+                    writer.write(_encode({"op": "status", "nonce": message["nonce"], "clusters": self.status()}))
+        except (ConnectionError, json.JSONDecodeError, KeyError, IndexError):
+            log.exception("Cluster connection failed")
+        finally:
+            if cluster is not None and self._writers.get(cluster.id) is writer:
+                del self._writers[cluster.id]
+            writer.close()
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for cluster in self.clusters:
+                process = cluster.process
+                if not process.is_alive():
+                    log.warning("Cluster %s exited with code %s", cluster.id, process.exitcode)
+                    if self.restart:
+                        cluster.restarts += 1
+                        self._spawn(cluster)
+                elif cluster.last_heartbeat is not None and now - cluster.last_heartbeat > self.heartbeat_timeout:
+                    log.warning("Cluster %s stopped sending heartbeats, killing it", cluster.id)
+                    process.kill()
+                elif cluster.last_heartbeat is None and now - cluster.started > self.startup_timeout:
+                    # Hung before connecting, such as while importing or creating the bot.
+                    log.warning("Cluster %s sent no heartbeat since starting, killing it", cluster.id)
+                    process.kill()
+
+    def status(self) -> list[dict[str, Any]]:
+        """
+        Returns the status of each cluster.
+        """
+        return [
+            {
+                "id": c.id,
+                "shards": c.shard_ids,
+                "pid": c.process.pid if c.process is not None else None,
+                "state": c.state(self.heartbeat_timeout),
+                "latency": c.latency,
+                "guilds": c.guilds,
+                "restarts": c.restarts,
+            }
+            for c in self.clusters
+        ]
+
+    def report(self) -> str:
+        """
+        Formats the status of each cluster as a table.
+        """
+        return format_status(self.status())
+
+    async def start(self):
+        """
+        Starts the IPC server, the metrics export and every cluster.
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path, limit=LINE_LIMIT)
+        await self.metrics.start(**self._metrics_options)
+        for cluster in self.clusters:
+            self._spawn(cluster)
+        self._monitor = asyncio.create_task(self._supervise(), name="PortalUtils-cluster-supervisor")
+
+    async def wait(self):
+        """
+        Waits until the launcher is closed.
+        """
+        await self._closed.wait()
+
+    async def close(self, timeout: float = 30.0):
+        """
+        Asks every cluster to close its bot, then stops the launcher.
+        Clusters still running after `timeout` seconds are killed.
+
+        Parameters
+        ----------
+        timeout: float
+            The number of seconds to wait for the clusters to exit.
+        """
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for writer in list(self._writers.values()):
+            writer.write(_encode({"op": "shutdown"}))
+        processes = [c.process for c in self.clusters if c.process is not None]
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                log.warning("Killing cluster process %s", process.pid)
+                process.kill()
+        await self.metrics.close()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._closed.set()
+
+    def run(self):
+        """
+        Starts the clusters and blocks until interrupted.
+        Workers are spawned, so this must be called under `if __name__ == "__main__":`.
+        """
+
+        async def runner():
+            await self.start()
+            try:
+                await self.wait()
+            finally:
+                await self.close()
+
+        try:
+            asyncio.run(runner())
+        except KeyboardInterrupt:
+            pass
+
+
+def _encode(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class ForwardingLogDispatcher:
+    """
+    Stands in for `LogDispatcher` on clusters other than cluster 0, forwarding entries to cluster 0.
+    """
+
+    def __init__(self, client: ClusterClient):
+        self.client = client
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+    def submit(self, channel_id: int, embed, *, priority) -> bool:
+        if not self.client.send(
+            {"op": "log", "channel_id": channel_id, "embed": embed.to_dict(), "priority": priority}
+        ):
+            self.dropped += 1
+            return False
+        return True
+
+    def start(self):
+        pass
+
+    async def close(self, timeout: float = 10.0):
+        pass
+
+    def stats(self) -> dict[str, int]:
+        return {"dropped": self.dropped}
+
+
+class ClusterClient:
+    """
+    The worker side of the launcher's IPC, available as `bot.cluster`.
+
+    Parameters
+    ----------
+    bot: PortalBotMixin
+        The cluster's bot.
+    cluster_id: int
+        The cluster ID.
+    socket_path: str
+        The launcher's Unix socket.
+    heartbeat_interval: float
+        The number of seconds between heartbeats.
+    """
+
+    def __init__(self, bot: PortalBotMixin, cluster_id: int, socket_path: str, heartbeat_interval: float = 5.0):
+        self.bot = bot
+        self.id = cluster_id
+        self.socket_path = socket_path
+        self.heartbeat_interval = heartbeat_interval
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tasks: list[asyncio.Task] = []
+        self._requests: dict[int, asyncio.Future] = {}
+        self._nonce = 0
+
+    def send(self, message: dict[str, Any]) -> bool:
+        """
+        Sends a message to the launcher. Returns False if not connected.
+
+        Parameters
+        ----------
+        message: dict[str, Any]
+            The message to send.
+        """
+        if self._writer is None or self._writer.is_closing():
+            return False
+        self._writer.write(_encode(message))
+        return True
+
+    async def connect(self):
+        """
+        Connects to the launcher and starts sending heartbeats.
+        Clusters other than cluster 0 start forwarding their log entries.
+        """
+        reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=LINE_LIMIT)
+        self.send({"op": "hello", "cluster": self.id, "pid": os.getpid()})
+        if self.id != 0 and hasattr(self.bot, "log_dispatcher"):
+            self.bot.log_dispatcher = ForwardingLogDispatcher(self)
+        self._tasks.append(asyncio.create_task(self._read(reader), name="PortalUtils-cluster-reader"))
+        self._tasks.append(asyncio.create_task(self._heartbeat(), name="PortalUtils-cluster-heartbeat"))
+
+    async def _read(self, reader: asyncio.StreamReader):
+        async for line in reader:
+            message = json.loads(line)
+            op = message["op"]
+            if op == "log":
+                from discord import Embed
+
+                self.bot.log_dispatcher.submit(
+                    message["channel_id"], Embed.from_dict(message["embed"]), priority=message["priority"]
+                )
+            elif op == "status":
+                if (future := self._requests.pop(message["nonce"], None)) is not None and not future.done():
+                    future.set_result(message["clusters"])
+            elif op == "shutdown":
+                asyncio.create_task(self.bot.close())
+        log.warning("Lost connection to the cluster launcher")
+
+    async def _heartbeat(self):
+        while True:
+            latency = self.bot.latency
+            metrics = getattr(self.bot, "metrics", None)
+            self.send(
+                {
+                    "op": "heartbeat",
+                    "ready": self.bot.is_ready(),
+                    "latency": latency if math.isfinite(latency) else None,
+                    "guilds": len(self.bot.guilds),
+                    "metrics": metrics.render() if metrics is not None else "",
+                }
+            )
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def status(self, timeout: float = 5.0) -> list[dict[str, Any]]:
+        """
+        Asks the launcher for the status of every cluster.
+
+        Parameters
+        ----------
+        timeout: float
+            The number of seconds to wait for the answer.
+        """
+        self._nonce += 1
+        future = self._requests[self._nonce] = asyncio.get_running_loop().create_future()
+        if not self.send({"op": "status", "nonce": self._nonce}):
+            del self._requests[self._nonce]
+            raise ConnectionError("Not connected to the cluster launcher")
+        return await asyncio.wait_for(future, timeout)
+
+    async def close(self):
+        """
+        Stops the heartbeats and disconnects from the launcher.
+        """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+async def _run_worker(
+    factory: Factory,
+    token: str,
+    cluster_id: int,
+    shard_ids: list[int],
+    shard_count: int,
+    socket_path: str,
+    heartbeat_interval: float,
+):
+    bot = _resolve(factory)(shard_ids=shard_ids, shard_count=shard_count)
+    bot.cluster = ClusterClient(bot, cluster_id, socket_path, heartbeat_interval)
+    await bot.cluster.connect()
+    try:
+        await bot.start(token)
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        await bot.cluster.close()
+
+
+def _worker_main(*args):
+    try:
+        asyncio.run(_run_worker(*args))
+    except KeyboardInterrupt:
+        pass
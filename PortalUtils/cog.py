@@ -1,6 +1,7 @@
 from typing import List
 
 from discord import Interaction
+from discord.app_commands import Command
 from discord.ext.commands import Cog as _Cog
 
 from .bot import Bot
@@ -19,16 +20,32 @@ class Cog(_Cog):
     -------
     t(key: str, interaction: Interaction, /, **kwargs) -> str
         Translates the given key using the interaction's locale.
-        REQUIRES the bot to have a `t` method.
+        REQUIRES the bot to have a `t` method, such as the built-in `Translator` set up by passing `locales` to the bot.
     """
 
     def __init__(self, bot: Bot):
         self.bot = bot
 
+    async def _inject(self, bot: Bot, *args, **kwargs):
+        # Groups have no callback, only their leaf commands are translated.
+        self._i18n_prefixes = {
+            command: self._i18n_prefix(command) for command in self.walk_app_commands() if isinstance(command, Command)
+        }
+        return await super()._inject(bot, *args, **kwargs)
+
+    @staticmethod
+    def _i18n_prefix(command: Command) -> str:
+        module = command.callback.__module__.split(".")[-1]  # __module__ is cogs.*
+        cmd = command.callback.__name__
+        if (cmd_key := command.extras.get("i18n_key", None)) is not None:
+            cmd = cmd_key
+        return ".".join((module, *cmd.split("_"), ""))
+
     def t(self, key: str, interaction: Interaction, /, **kwargs) -> str:
         """
         Translates the given key using the interaction's locale.
-        Loads the full key from the command's callback function and location, then passes it to the bot's `t` method.
+        Prefixes the key with the command's location and callback name (or `i18n_key` extra), then passes it to the bot's `t` method.
+        The prefix for each app command is computed once, when the cog is added.
 
         Parameters
         ----------
@@ -39,16 +56,16 @@ class Cog(_Cog):
         **kwargs
             The keyword arguments to pass to the translation function.
         """
-        if not hasattr(self.bot, "t"):
+        if (t := getattr(self.bot, "t", None)) is None:
             raise AttributeError(
-                "Bot has no method 't'. Configure a translation provider like `python-i18n` and add a `t` method to the bot, then try again."
+                "Bot has no method 't'. Pass `locales` to the bot or add a `t` method to the bot, then try again."
             )
-        module = interaction.command.callback.__module__.split(".")[-1]  # __module__ is cogs.*
-        cmd = interaction.command.callback.__name__
-        if (cmd_key := interaction.command.extras.get("i18n_key", None)) is not None:
-            cmd = cmd_key
-        full_key = ".".join((module, *cmd.split("_"), key))
-        return self.bot.t(full_key, locale=interaction.locale, **kwargs)
+        command = interaction.command
+        try:
+            prefix = self._i18n_prefixes[command]
+        except (AttributeError, KeyError):
+            prefix = self._i18n_prefix(command)
+        return t(prefix + key, locale=interaction.locale, **kwargs)
 
 
 class GroupCog(Cog):
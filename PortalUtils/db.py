@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import Any, AsyncIterator, Iterable, Optional
+
+import aiosqlite
+from aiosqlite import Cursor
+from aiosqlite.context import contextmanager
+
+log = getLogger(__name__)
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+}
+
+
+class Database:
+    """
+    A pool of SQLite connections in WAL mode: one writer and several read-only readers.
+
+    Reads made through `fetchall`, `fetchone`, `fetchval` or `read` use a reader, so they don't queue behind writes.
+    `execute`, `executemany` and `executescript` run on the writer after any open `transaction`, and commit at once.
+    Anything else not defined here, such as `commit`, is forwarded to the writer connection,
+    so code written against a single `aiosqlite.Connection` keeps working.
+
+    Parameters
+    ----------
+    path: str
+        The path to the database file.
+    readers: int
+        The number of reader connections.
+    pragmas: dict[str, Any]
+        PRAGMA values applied to every connection, merged over the defaults
+        (`journal_mode=wal`, `synchronous=normal`, `cache_size=-16000`, `mmap_size=268435456`, `busy_timeout=5000`).
+    statement_cache_size: int
+        The number of prepared statements each connection keeps cached.
+
+    Attributes
+    ----------
+    writer: aiosqlite.Connection
+        The connection used for writes.
+    readers: list[aiosqlite.Connection]
+        The read-only connections.
+    """
+
+    def __init__(
+        self,
+        path: str = "data.db",
+        *,
+        readers: int = 4,
+        pragmas: Optional[dict[str, Any]] = None,
+        statement_cache_size: int = 256,
+    ):
+        self.path = path
+        self.num_readers = readers
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.statement_cache_size = statement_cache_size
+        self.writer: aiosqlite.Connection
+        self.readers: list[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._write_lock = asyncio.Lock()
+        # The task inside `transaction`, whose writes already hold the lock.
+        self._owner: Optional[asyncio.Task] = None
+
+    async def _open(self, *, query_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=self.statement_cache_size)
+        for name, value in self.pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        if query_only:
+            await conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    async def connect(self) -> Database:
+        """
+        Opens the writer and reader connections.
+        """
+        self.writer = await self._open()
+        for _ in range(self.num_readers):
+            conn = await self._open(query_only=True)
+            self.readers.append(conn)
+            self._idle.put_nowait(conn)
+        return self
+
+    async def close(self):
+        """
+        Commits pending writes and closes every connection.
+        """
+        for conn in self.readers:
+            await conn.close()
+        self.readers.clear()
+        self._idle = asyncio.Queue()
+        if hasattr(self, "writer"):
+            await self.writer.commit()
+            await self.writer.close()
+
+    async def __aenter__(self) -> Database:
+        return await self.connect()
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __getattr__(self, name: str):
+        # Only reached for attributes not defined here, so the pool acts like its writer connection.
+        if name == "writer":
+            raise AttributeError(name)
+        return getattr(self.writer, name)
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Checks out a reader connection for several reads.
+        Falls back to the writer if the pool has no readers.
+        """
+        if not self.readers:
+            yield self.writer
+            return
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Runs the enclosed writes in a single transaction, committing on success and rolling back on error.
+        Other transactions wait until this one finishes.
+        """
+        async with self._write_lock:
+            self._owner = asyncio.current_task()
+            try:
+                await self.writer.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self.writer
+                except BaseException:
+                    await self.writer.rollback()
+                    raise
+                else:
+                    await self.writer.commit()
+            finally:
+                self._owner = None
+
+    async def _write(self, method: str, *args) -> Cursor:
+        if self._owner is not None and self._owner is asyncio.current_task():
+            return await getattr(self.writer, method)(*args)
+        async with self._write_lock:
+            try:
+                return await getattr(self.writer, method)(*args)
+            finally:
+                # Never leave an implicit transaction open, or the next `transaction` would include its writes.
+                if self.writer.in_transaction:
+                    await self.writer.commit()
+
+    @contextmanager
+    async def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> Cursor:
+        """
+        Runs a statement on the writer, waiting for any open transaction, and commits it.
+        Inside `transaction`, the statement is part of the transaction instead.
+
+        Parameters
+        ----------
+        sql: str
+            The statement to run.
+        parameters: Iterable[Any]
+            The statement parameters.
+        """
+        return await self._write("execute", sql, parameters)
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> Cursor:
+        """
+        Runs a statement once per set of parameters on the writer, like `execute`.
+
+        Parameters
+        ----------
+        sql: str
+            The statement to run.
+        parameters: Iterable[Iterable[Any]]
+            The parameters of each run.
+        """
+        return await self._write("executemany", sql, parameters)
+
+    @contextmanager
+    async def executescript(self, sql_script: str) -> Cursor:
+        """
+        Runs several statements on the writer, like `execute`.
+
+        Parameters
+        ----------
+        sql_script: str
+            The statements to run.
+        """
+        return await self._write("executescript", sql_script)
+
+    async def fetchall(self, sql: str, parameters: Iterable[Any] = ()) -> list:
+        """
+        Runs a query on a reader and returns all rows.
+
+        Parameters
+        ----------
+        sql: str
+            The query to run.
+        parameters: Iterable[Any]
+            The query parameters.
+        """
+        async with self.read() as conn, conn.execute(sql, parameters) as cur:
+            return await cur.fetchall()
+
+    async def fetchone(self, sql: str, parameters: Iterable[Any] = ()) -> Optional[tuple]:
+        """
+        Runs a query on a reader and returns the first row.
+
+        Parameters
+        ----------
+        sql: str
+            The query to run.
+        parameters: Iterable[Any]
+            The query parameters.
+        """
+        async with self.read() as conn, conn.execute(sql, parameters) as cur:
+            return await cur.fetchone()
+
+    async def fetchval(self, sql: str, parameters: Iterable[Any] = ()) -> Any:
+        """
+        Runs a query on a reader and returns the first column of the first row.
+
+        Parameters
+        ----------
+        sql: str
+            The query to run.
+        parameters: Iterable[Any]
+            The query parameters.
+        """
+        row = await self.fetchone(sql, parameters)
+        return row[0] if row else None
+
+
+class WriteBehindQueue:
+    """
+    Buffers writes and applies them in batches, one transaction per flush.
+
+    Consecutive writes with the same SQL are grouped into a single `executemany`.
+    Writes are applied in the order they were queued. If a batch fails, it's split in halves and retried,
+    so only the writes that fail on their own are lost.
+
+    Parameters
+    ----------
+    db: Database
+        The database to write to.
+    max_size: int
+        The maximum number of queued writes. `put` waits while the queue is full.
+    flush_interval: float
+        The maximum number of seconds a write is buffered before being flushed.
+    batch_size: int
+        The maximum number of writes per transaction.
+
+    Attributes
+    ----------
+    written: int
+        The number of writes committed.
+    flushes: int
+        The number of transactions committed.
+    failed: int
+        The number of writes that failed and were dropped.
+    """
+
+    def __init__(self, db: Database, *, max_size: int = 10000, flush_interval: float = 1.0, batch_size: int = 1000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+        self._queue: asyncio.Queue[tuple[str, tuple]] = asyncio.Queue(max_size)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def put(self, sql: str, parameters: Iterable[Any] = ()):
+        """
+        Queues a write, waiting for room if the queue is full.
+
+        Parameters
+        ----------
+        sql: str
+            The statement to run.
+        parameters: Iterable[Any]
+            The statement parameters.
+        """
+        if self._closing:
+            raise RuntimeError("Write queue is closed")
+        await self._queue.put((sql, tuple(parameters)))
+
+    def put_nowait(self, sql: str, parameters: Iterable[Any] = ()):
+        """
+        Queues a write without waiting. Raises `asyncio.QueueFull` if the queue is full.
+
+        Parameters
+        ----------
+        sql: str
+            The statement to run.
+        parameters: Iterable[Any]
+            The statement parameters.
+        """
+        if self._closing:
+            raise RuntimeError("Write queue is closed")
+        self._queue.put_nowait((sql, tuple(parameters)))
+
+    def start(self):
+        """
+        Starts the background flush task.
+        """
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run(), name="PortalUtils-write-behind")
+
+    async def close(self):
+        """
+        Stops accepting writes and flushes everything already queued.
+        """
+        self._closing = True
+        if self._task is not None:
+            await self._task
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the queue's counters.
+        """
+        return {"pending": self._queue.qsize(), "written": self.written, "flushes": self.flushes, "failed": self.failed}
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            batch = [first]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size and not self._closing:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[str, tuple]]):
+        groups: list[tuple[str, list[tuple]]] = []
+        for sql, params in batch:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+        try:
+            async with self.db.transaction() as conn:
+                for sql, rows in groups:
+                    await conn.executemany(sql, rows)
+        except Exception:
+            if len(batch) == 1:
+                log.exception("Failed to apply queued write: %s %s", *batch[0])
+                self.failed += 1
+                return
+            # Retry each half in order, so only the failing writes are lost.
+            middle = len(batch) // 2
+            await self._flush(batch[:middle])
+            await self._flush(batch[middle:])
+        else:
+            self.written += len(batch)
+            self.flushes += 1
@@ -0,0 +1,174 @@
+from discord.ext import commands
+from jishaku.paginators import PaginatorInterface
+
+from .bot import Bot
+
+
+async def send_report(ctx: commands.Context, text: str):
+    """
+    Sends a plain text report in a paginated code block.
+
+    Parameters
+    ----------
+    ctx: commands.Context
+        The command context.
+    text: str
+        The report to send.
+    """
+    paginator = commands.Paginator(prefix="```", max_size=1985)
+    for line in text.splitlines() or ["(empty)"]:
+        paginator.add_line(line[:1980])
+    await PaginatorInterface(ctx.bot, paginator, owner=ctx.author).send_to(ctx)
+
+
+@commands.group(name="portal", invoke_without_command=True)
+@commands.is_owner()
+async def portal(ctx: commands.Context):
+    """
+    PortalUtils diagnostics.
+    """
+    await ctx.send_help(ctx.command)
+
+
+@portal.command(name="queries")
+async def queries(ctx: commands.Context, n: int = 10, key: str = "total"):
+    """
+    Shows the top database statements, sorted by `total`, `count`, `mean`, `max` or `rows`.
+    """
+    if (stats := getattr(getattr(ctx.bot, "db", None), "stats", None)) is None:
+        return await ctx.send("Query instrumentation is disabled. Start the bot with `db_instrument=True`.")
+    await send_report(ctx, stats.report(n, key=key))
+
+
+@portal.command(name="metrics")
+async def metrics(ctx: commands.Context, n: int = 20):
+    """
+    Shows the busiest commands with their error counts and latency percentiles.
+    """
+    await send_report(ctx, ctx.bot.metrics.summary(n))
+
+
+@portal.command(name="errors")
+async def errors(ctx: commands.Context, fingerprint: str = None):
+    """
+    Lists recent app command errors, or shows the full report for a fingerprint.
+    """
+    reporter = ctx.bot.error_reporter
+    if fingerprint is None:
+        return await send_report(ctx, reporter.recent())
+    if (report := reporter.get(fingerprint)) is None:
+        return await ctx.send(f"No recent error with fingerprint `{fingerprint}`.")
+    await send_report(ctx, f"{report.context}\n\n{report.traceback}")
+
+
+@portal.command(name="http")
+async def http(ctx: commands.Context):
+    """
+    Shows outbound request latency per host and the response cache's counters.
+    """
+    report = ctx.bot.http_latency.report()
+    if (cache := ctx.bot.http_cache) is not None:
+        report += "\n\n" + "  ".join(f"{k}: {v}" for k, v in cache.stats().items())
+    await send_report(ctx, report)
+
+
+@portal.command(name="clusters")
+async def clusters(ctx: commands.Context):
+    """
+    Shows the health and latency of every cluster, when running under a `ClusterLauncher`.
+    """
+    if (cluster := getattr(ctx.bot, "cluster", None)) is None:
+        return await ctx.send("The bot isn't running under a cluster launcher.")
+    from .cluster import format_status
+
+    await send_report(ctx, format_status(await cluster.status()))
+
+
+@portal.command(name="loop")
+async def loop(ctx: commands.Context, detail: str = None):
+    """
+    Shows event loop lag and the listeners and app commands that held the loop longest. Use `stalls` for stacks.
+    """
+    if (monitor := ctx.bot.monitor) is None:
+        return await ctx.send("The loop monitor is disabled. Start the bot with `monitor=True`.")
+    await send_report(ctx, monitor.stall_report() if detail == "stalls" else monitor.report())
+
+
+@portal.command(name="audit")
+async def audit(ctx: commands.Context, guild_id: int = None, hours: float = 24.0):
+    """
+    Shows the most used commands and the most active users, optionally in one guild.
+    """
+    if not ctx.bot.audit.enabled:
+        return await ctx.send("The audit log is disabled, the bot has no database.")
+    await send_report(ctx, await ctx.bot.audit.report(guild_id, since=hours * 3600))
+
+
+@portal.command(name="paginators")
+async def paginators(ctx: commands.Context):
+    """
+    Shows how many paginators are held in memory, their estimated size and how many were evicted or restored.
+    """
+    await send_report(ctx, "\n".join(f"{k:<12} {v}" for k, v in ctx.bot.paginators.stats().items()))
+
+
+@portal.command(name="caches")
+async def caches(ctx: commands.Context):
+    """
+    Shows each cache's size, hits from memory and from the database, misses and evictions.
+    """
+    await send_report(ctx, ctx.bot.caches.report())
+
+
+@portal.command(name="maintenance")
+async def maintenance(ctx: commands.Context, job: str = None):
+    """
+    Shows the database maintenance schedule and latest runs, or runs `backup`, `checkpoint`, `optimize` or `vacuum` now.
+    """
+    if (scheduler := ctx.bot.maintenance) is None or not hasattr(ctx.bot, "db"):
+        return await ctx.send("Database maintenance is disabled, or the bot has no database.")
+    if job is not None:
+        if job not in scheduler.jobs:
+            return await ctx.send(f"Unknown job `{job}`, expected one of {', '.join(scheduler.jobs)}.")
+        async with ctx.typing():
+            await scheduler.run(job)
+    await send_report(ctx, scheduler.report())
+
+
+@portal.command(name="memory")
+async def memory(ctx: commands.Context, n: int = 20):
+    """
+    Shows the member cache policy, how many members are cached and the guilds whose caches use the most memory.
+    """
+    await send_report(ctx, ctx.bot.member_cache.report(n))
+
+
+@portal.command(name="runtime")
+async def runtime(ctx: commands.Context):
+    """
+    Shows the event loop, task factory and GC settings, GC pauses before and after the heap was frozen, and memory use.
+    """
+    if (profile := ctx.bot.runtime_profile) is None:
+        return await ctx.send("No runtime profile is set. Start the bot with `runtime_profile=True`.")
+    await send_report(ctx, profile.report())
+
+
+@portal.command(name="startup")
+async def startup(ctx: commands.Context):
+    """
+    Shows how long each startup phase took.
+    """
+    await send_report(ctx, ctx.bot.startup_report())
+
+
+async def setup(bot: Bot):
+    if (jsk := bot.get_command("jishaku")) is not None:
+        jsk.add_command(portal)
+    else:
+        bot.add_command(portal)
+
+
+async def teardown(bot: Bot):
+    if (jsk := bot.get_command("jishaku")) is not None:
+        jsk.remove_command(portal.name)
+    bot.remove_command(portal.name)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from enum import IntEnum
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional
+
+from discord import Embed
+
+from .embeds import MAX_TOTAL, embed_size, fits, split_embed
+
+if TYPE_CHECKING:
+    from .bot import PortalBotMixin
+
+log = getLogger(__name__)
+
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = MAX_TOTAL
+
+
+class LogPriority(IntEnum):
+    """
+    The priority of a log entry. Lower values are sent first.
+    """
+
+    ERROR = 0
+    COMMAND = 1
+    GUILD = 2
+
+
+class LogDispatcher:
+    """
+    A bounded, batching queue for log channel messages.
+
+    Entries are queued without blocking the caller and sent by a single background task,
+    packing up to 10 embeds per message. A channel's batch is flushed once it is full
+    or once its oldest entry has waited `flush_interval` seconds.
+
+    Parameters
+    ----------
+    bot: PortalBotMixin
+        The bot instance.
+    max_size: int
+        The maximum number of queued entries. Entries submitted while the queue is full are dropped.
+    flush_interval: float
+        The maximum number of seconds an entry is buffered before its batch is sent.
+    late_after: float
+        The number of seconds after which a sent entry is counted as late.
+
+    Attributes
+    ----------
+    sent: int
+        The number of entries sent.
+    batches: int
+        The number of messages sent.
+    dropped: int
+        The number of entries dropped because the queue was full or sending failed.
+    late: int
+        The number of entries sent more than `late_after` seconds after being submitted.
+    """
+
+    def __init__(
+        self,
+        bot: PortalBotMixin,
+        *,
+        max_size: int = 1000,
+        flush_interval: float = 2.0,
+        late_after: float = 30.0,
+    ):
+        self.bot = bot
+        self.flush_interval = flush_interval
+        self.late_after = late_after
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.late = 0
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(max_size)
+        self._counter = itertools.count()
+        self._buffers: dict[int, list[tuple]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def submit(self, channel_id: int, embed: Embed, *, priority: LogPriority = LogPriority.COMMAND) -> bool:
+        """
+        Queues an embed to be sent to a channel. Never blocks.
+        Embeds over Discord's limits are split into several, rather than failing when they're sent.
+
+        Parameters
+        ----------
+        channel_id: int
+            The ID of the channel to send the embed to.
+        embed: Embed
+            The embed to send.
+        priority: LogPriority
+            The priority of the entry.
+
+        Returns
+        -------
+        bool
+            Whether the entry was queued.
+        """
+        parts = (embed,) if fits(embed) else split_embed(embed)
+        # All parts or none, a log entry is never sent cut short.
+        if self._closing or (self._queue.maxsize and self._queue.maxsize - self._queue.qsize() < len(parts)):
+            self.dropped += len(parts)
+            return False
+        now = time.monotonic()
+        for part in parts:
+            self._queue.put_nowait((priority, next(self._counter), now, channel_id, part))
+        return True
+
+    def start(self):
+        """
+        Starts the background sender task.
+        """
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run(), name="PortalUtils-log-dispatcher")
+            self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        if task.cancelled() or (error := task.exception()) is None:
+            return
+        lost = sum(map(len, self._buffers.values()))
+        self._buffers.clear()
+        self.dropped += lost
+        log.error("Log dispatcher failed, dropping %s buffered entries", lost, exc_info=error)
+        if not self._closing:
+            self.start()
+
+    async def close(self, timeout: float = 10.0):
+        """
+        Stops accepting entries, then flushes everything already queued.
+
+        Parameters
+        ----------
+        timeout: float
+            The maximum number of seconds to wait for the final flush.
+        """
+        self._closing = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            log.warning("Log dispatcher did not flush within %s seconds", timeout)
+        except Exception:
+            # Already logged by `_on_done`.
+            pass
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of entries queued or buffered but not yet sent.
+        """
+        return self._queue.qsize() + sum(map(len, self._buffers.values()))
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the dispatcher's counters.
+        """
+        return {
+            "pending": self.pending,
+            "sent": self.sent,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "late": self.late,
+        }
+
+    def _next_timeout(self) -> float:
+        if not self._buffers:
+            return self.flush_interval
+        oldest = min(entries[0][2] for entries in self._buffers.values())
+        return max(0.0, oldest + self.flush_interval - time.monotonic())
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), self._next_timeout())
+            except asyncio.TimeoutError:
+                await self._flush(expired_only=True)
+                continue
+            buffer = self._buffers.setdefault(entry[3], [])
+            if buffer and (
+                len(buffer) >= MAX_EMBEDS
+                or sum(embed_size(e[4]) for e in buffer) + embed_size(entry[4]) > MAX_EMBED_CHARS
+            ):
+                await self._send(entry[3], self._buffers.pop(entry[3]))
+                buffer = self._buffers.setdefault(entry[3], [])
+            buffer.append(entry)
+            if len(buffer) >= MAX_EMBEDS:
+                await self._send(entry[3], self._buffers.pop(entry[3]))
+            elif self._queue.empty():
+                await self._flush(expired_only=True)
+        await self._flush()
+
+    async def _flush(self, *, expired_only: bool = False):
+        now = time.monotonic()
+        # Lowest priority value (errors) first, then oldest.
+        for channel_id, entries in sorted(self._buffers.items(), key=lambda i: (min(e[0] for e in i[1]), i[1][0][2])):
+            if expired_only and now - entries[0][2] < self.flush_interval:
+                continue
+            await self._send(channel_id, self._buffers.pop(channel_id))
+
+    async def _send(self, channel_id: int, entries: list[tuple]):
+        # By ID, the channel may be on another cluster's shards, so it's missing from this cluster's cache.
+        channel = self.bot.get_partial_messageable(channel_id)
+        try:
+            await channel.send(embeds=[e[4] for e in entries])
+        except Exception:
+            # Log traffic never takes the dispatcher down, whatever the channel or embeds are.
+            log.exception("Failed to send %s log entries to %s", len(entries), channel_id)
+            self.dropped += len(entries)
+            return
+        now = time.monotonic()
+        self.sent += len(entries)
+        self.batches += 1
+        self.late += sum(now - e[2] > self.late_after for e in entries)
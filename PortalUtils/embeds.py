@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from typing import Any, TypeVar
+
+from discord import Embed
+
+E = TypeVar("E", bound=Embed)
+
+_MISSING = object()
+
+# Discord's embed limits, in characters.
+MAX_TITLE = 256
+MAX_DESCRIPTION = 4096
+MAX_FIELDS = 25
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+MAX_FOOTER = 2048
+MAX_AUTHOR = 256
+MAX_TOTAL = 6000
+
+
+def embed_size(embed: Embed) -> int:
+    """
+    Returns the number of characters that count towards an embed's 6000 character limit.
+    Uses the running count of `PortalUtils.Embed` when available.
+
+    Parameters
+    ----------
+    embed: Embed
+        The embed to measure.
+    """
+    return getattr(embed, "size", None) or len(embed)
+
+
+def fits(embed: Embed) -> bool:
+    """
+    Whether an embed is within all of Discord's limits.
+
+    Parameters
+    ----------
+    embed: Embed
+        The embed to check.
+    """
+    fields = getattr(embed, "_fields", ())
+    return (
+        embed_size(embed) <= MAX_TOTAL
+        and len(embed.title or "") <= MAX_TITLE
+        and len(embed.description or "") <= MAX_DESCRIPTION
+        and len(fields) <= MAX_FIELDS
+        and all(len(f["name"]) <= MAX_FIELD_NAME and len(f["value"]) <= MAX_FIELD_VALUE for f in fields)
+        and len(getattr(embed, "_footer", {}).get("text", "")) <= MAX_FOOTER
+        and len(getattr(embed, "_author", {}).get("name", "")) <= MAX_AUTHOR
+    )
+
+
+def copy_embed(embed: E) -> E:
+    """
+    Returns a shallow copy of an embed, much cheaper than `Embed.copy`, which round-trips through a dict.
+    The fields are copied, since `set_field_at` changes them in place.
+    Footer, author and media dicts are shared, the setters replace them instead of changing them.
+
+    Parameters
+    ----------
+    embed: Embed
+        The embed to copy.
+    """
+    return _stamp(embed.__class__, _state(embed))
+
+
+def _state(embed: Embed) -> tuple[tuple[tuple[str, Any], ...], dict[str, Any]]:
+    slots = tuple(
+        (slot, value) for slot in Embed.__slots__ if (value := getattr(embed, slot, _MISSING)) is not _MISSING
+    )
+    return slots, getattr(embed, "__dict__", {})
+
+
+def _stamp(cls: type[E], state: tuple[tuple[tuple[str, Any], ...], dict[str, Any]]) -> E:
+    slots, attrs = state
+    new = cls.__new__(cls)
+    for slot, value in slots:
+        setattr(new, slot, value)
+    if attrs:
+        new.__dict__.update(attrs)
+    if (fields := getattr(new, "_fields", None)) is not None:
+        new._fields = [field.copy() for field in fields]
+    return new
+
+
+def _shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def truncate_embed(embed: E) -> E:
+    """
+    Truncates an embed in place to fit within Discord's limits, and returns it.
+    Parts over their own limit are shortened, then the description and the last fields are cut
+    until the embed fits within 6000 characters.
+
+    Parameters
+    ----------
+    embed: Embed
+        The embed to truncate.
+    """
+    if embed.title is not None:
+        embed.title = _shorten(embed.title, MAX_TITLE)
+    if (footer := getattr(embed, "_footer", None)) and len(footer.get("text", "")) > MAX_FOOTER:
+        embed.set_footer(text=_shorten(footer["text"], MAX_FOOTER), icon_url=footer.get("icon_url"))
+    if (author := getattr(embed, "_author", None)) and len(author.get("name", "")) > MAX_AUTHOR:
+        embed._author = {**author, "name": _shorten(author["name"], MAX_AUTHOR)}
+    fields = getattr(embed, "_fields", [])
+    while len(fields) > MAX_FIELDS:
+        embed.remove_field(-1)
+    for i, field in enumerate(fields):
+        if len(field["name"]) > MAX_FIELD_NAME or len(field["value"]) > MAX_FIELD_VALUE:
+            embed.set_field_at(
+                i,
+                name=_shorten(field["name"], MAX_FIELD_NAME),
+                value=_shorten(field["value"], MAX_FIELD_VALUE),
+                inline=field["inline"],
+            )
+    if embed.description is not None:
+        embed.description = _shorten(embed.description, MAX_DESCRIPTION)
+    if (excess := embed_size(embed) - MAX_TOTAL) > 0 and embed.description:
+        embed.description = _shorten(embed.description, max(1, len(embed.description) - excess))
+    while embed_size(embed) > MAX_TOTAL and fields:
+        embed.remove_field(-1)
+    return embed
+
+
+def _cut(text: str, limit: int) -> tuple[str, str]:
+    # Splits at the last line break within the limit, or at the limit if there is none.
+    if len(text) <= limit:
+        return text, ""
+    if (cut := text.rfind("\n", 0, limit + 1)) > 0:
+        return text[:cut], text[cut + 1 :]
+    return text[:limit], text[limit:]
+
+
+def split_embed(embed: E) -> list[E]:
+    """
+    Splits an embed that's over Discord's limits into several that fit.
+
+    The first embed keeps the title, author and media. The following ones keep the color, footer and timestamp.
+    The description is split at line breaks and the fields are spread over as many embeds as needed.
+    Parts that can't be split, such as a field value over 1024 characters, are truncated.
+    Discord's 6000 character limit applies to all the embeds in a message, so they may need separate messages;
+    `LogDispatcher` takes care of this.
+
+    Parameters
+    ----------
+    embed: Embed
+        The embed to split. It isn't changed.
+    """
+    if fits(embed):
+        return [embed]
+    source = copy_embed(embed)
+    description, source.description = source.description or "", None
+    fields = list(getattr(source, "_fields", []))
+    source.clear_fields()
+    truncate_embed(source)
+    continuation = copy_embed(source)
+    continuation.title = continuation.url = None
+    for attr in ("_author", "_image", "_thumbnail", "_video", "_provider"):
+        if hasattr(continuation, attr):
+            delattr(continuation, attr)
+
+    current, embeds = source, [source]
+    while description:
+        if current.description:
+            current = copy_embed(continuation)
+            embeds.append(current)
+        current.description, description = _cut(description, min(MAX_DESCRIPTION, MAX_TOTAL - embed_size(current)))
+    for field in fields:
+        name, value = _shorten(field["name"], MAX_FIELD_NAME), _shorten(field["value"], MAX_FIELD_VALUE)
+        if (
+            len(getattr(current, "_fields", ())) >= MAX_FIELDS
+            or embed_size(current) + len(name) + len(value) > MAX_TOTAL
+        ):
+            current = copy_embed(continuation)
+            embeds.append(current)
+        current.add_field(name=name, value=value, inline=field["inline"])
+    return embeds
+
+
+class EmbedTemplate:
+    """
+    A prebuilt embed that's stamped out with a shallow copy, instead of being built from scratch every time.
+    The template keeps its own copy of the embed, so it can't be changed after it's created.
+
+    Parameters
+    ----------
+    embed: Embed
+        The embed to use as the template, with any footer, author and fields already set.
+
+    Examples
+    --------
+    ```py
+    COMMAND_RAN = EmbedTemplate(Embed(title="Command Ran", color=Color.dark_green()))
+    embed = COMMAND_RAN(description=f"User: `{user}`", timestamp=utcnow())
+    ```
+    """
+
+    __slots__ = ("_cls", "_state")
+
+    ATTRIBUTES = frozenset({"title", "description", "url", "color", "colour", "timestamp"})
+
+    def __init__(self, embed: Embed):
+        embed = copy_embed(embed)
+        self._cls = embed.__class__
+        # Only the attributes that are set are copied when stamping.
+        self._state = _state(embed)
+
+    def __call__(self, **kwargs: Any) -> Embed:
+        """
+        Returns a new embed from the template.
+
+        Parameters
+        ----------
+        **kwargs
+            Overrides for `title`, `description`, `url`, `color` and `timestamp`.
+        """
+        embed = _stamp(self._cls, self._state)
+        for name, value in kwargs.items():
+            if name not in self.ATTRIBUTES:
+                raise TypeError(f"EmbedTemplate got an unexpected keyword argument {name!r}")
+            setattr(embed, name, value)
+        return embed
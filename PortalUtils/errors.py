@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+import traceback
+from collections import deque
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional
+
+from .dispatcher import LogPriority
+
+if TYPE_CHECKING:
+    from .bot import PortalBotMixin
+
+log = getLogger(__name__)
+
+
+def fingerprint(error: BaseException) -> str:
+    """
+    Identifies an error by its type and the frames in its traceback, ignoring its message.
+
+    Parameters
+    ----------
+    error: BaseException
+        The error to fingerprint.
+    """
+    parts = [f"{type(error).__module__}.{type(error).__qualname__}"]
+    for frame, lineno in traceback.walk_tb(error.__traceback__):
+        parts.append(f"{frame.f_code.co_filename}:{frame.f_code.co_name}:{lineno}")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:10]
+
+
+class ErrorReport:
+    """
+    A detailed report of the first occurrence of an error in a window.
+
+    Attributes
+    ----------
+    fingerprint: str
+        The error's fingerprint.
+    timestamp: float
+        When the error occurred, as a UNIX timestamp.
+    summary: str
+        The error's type and message.
+    context: str
+        Where the error happened, such as the user and command.
+    traceback: str
+        The formatted traceback.
+    occurrences: int
+        The number of times the error occurred in this report's window, including the first.
+    """
+
+    __slots__ = ("fingerprint", "timestamp", "summary", "context", "traceback", "occurrences")
+
+    def __init__(self, fingerprint: str, summary: str, context: str, traceback: str):
+        self.fingerprint = fingerprint
+        self.timestamp = time.time()
+        self.summary = summary
+        self.context = context
+        self.traceback = traceback
+        self.occurrences = 1
+
+
+class ErrorReporter:
+    """
+    Deduplicates error reports by fingerprint before sending them to the `error_logs` channel.
+
+    The first occurrence of a fingerprint in each window is formatted in a worker thread and sent in full.
+    Later occurrences in the same window are only counted, and sent as periodic "×N more" summaries.
+
+    Parameters
+    ----------
+    bot: PortalBotMixin
+        The bot instance.
+    window: float
+        The number of seconds after a detailed report during which the same error is only counted.
+    summary_interval: float
+        The number of seconds between "×N more" summaries.
+    buffer_size: int
+        The number of detailed reports to keep.
+
+    Attributes
+    ----------
+    reports: deque[ErrorReport]
+        The most recent detailed reports.
+    """
+
+    def __init__(
+        self, bot: PortalBotMixin, *, window: float = 300.0, summary_interval: float = 60.0, buffer_size: int = 200
+    ):
+        self.bot = bot
+        self.window = window
+        self.summary_interval = summary_interval
+        self.reports: deque[ErrorReport] = deque(maxlen=buffer_size)
+        self._current: dict[str, tuple[float, ErrorReport]] = {}
+        self._unreported: dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def report(self, error: BaseException, context: str, *, short: bool = False):
+        """
+        Reports an error, unless it was already reported in the current window.
+
+        Parameters
+        ----------
+        error: BaseException
+            The error to report.
+        context: str
+            Where the error happened, such as the user and command.
+        short: bool
+            Whether to report only the error's type and message instead of the full traceback.
+        """
+        fp = fingerprint(error)
+        now = time.monotonic()
+        current = self._current.get(fp)
+        if current is not None and now - current[0] < self.window:
+            current[1].occurrences += 1
+            self._unreported[fp] = self._unreported.get(fp, 0) + 1
+            return
+        summary = f"{error.__class__.__name__}: {error}"
+        # Registered before formatting, so the same error raised meanwhile is counted rather than reported again.
+        report = ErrorReport(fp, summary, context, summary)
+        self._current[fp] = (now, report)
+        self.reports.append(report)
+        if not short:
+            report.traceback = "".join(
+                await asyncio.to_thread(traceback.format_exception, type(error), error, error.__traceback__)
+            )
+        tb = report.traceback
+        log.error("[%s] %s\n%s", fp, context, tb)
+        if cid := self.bot.error_logs:
+            # Keep the end of the traceback, the embed description caps at 4096 characters.
+            context = context[:1024]
+            room = max(0, 4096 - len(context) - 12)
+            tb = tb[-room:] if room else ""
+            self.bot.log_dispatcher.submit(
+                cid,
+                self.bot.EEmbed(title=f"Error `{fp}`", description=f"{context}```py\n{tb}```"),
+                priority=LogPriority.ERROR,
+            )
+
+    def get(self, fp: str) -> Optional[ErrorReport]:
+        """
+        Returns the most recent detailed report for a fingerprint.
+
+        Parameters
+        ----------
+        fp: str
+            The fingerprint, or a prefix of it.
+        """
+        return next((r for r in reversed(self.reports) if r.fingerprint.startswith(fp)), None)
+
+    def recent(self, n: int = 20) -> str:
+        """
+        Formats the most recent detailed reports as a table.
+
+        Parameters
+        ----------
+        n: int
+            The number of reports to include.
+        """
+        lines = [f"{'fingerprint':<11} {'count':>6}  {'when':<19}  error"]
+        for r in list(self.reports)[: -n - 1 : -1]:
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(r.timestamp))
+            lines.append(f"{r.fingerprint:<11} {r.occurrences:>6}  {when}  {r.summary[:150]}")
+        return "\n".join(lines)
+
+    def flush_summaries(self):
+        """
+        Sends a summary for every error that occurred again since its last report or summary,
+        and forgets windows that have expired.
+        """
+        now = time.monotonic()
+        for fp, count in self._unreported.items():
+            report = self._current[fp][1]
+            log.warning("[%s] ×%s more: %s", fp, count, report.summary)
+            if cid := self.bot.error_logs:
+                self.bot.log_dispatcher.submit(
+                    cid,
+                    self.bot.EEmbed(description=f"`{fp}` ×{count} more: {report.summary[:3900]}"),
+                    priority=LogPriority.ERROR,
+                )
+        self._unreported.clear()
+        self._current = {fp: c for fp, c in self._current.items() if now - c[0] < self.window}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            self.flush_summaries()
+
+    def start(self):
+        """
+        Starts the background summary task.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="PortalUtils-error-summaries")
+
+    def close(self):
+        """
+        Sends any pending summaries and stops the background task.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush_summaries()
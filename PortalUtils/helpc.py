@@ -1,18 +1,91 @@
+from collections import OrderedDict
+from typing import Optional
+
+from discord import Embed
 from discord.ext import commands
 
 from .bot import Bot
+from .embeds import split_embed
+from .paginators import Paginator, StaticPageSource
 
 
 class CustomMinimalHelp(commands.MinimalHelpCommand):
     """
-    A subclass of `discord.ext.commands.MinimalHelpCommand` that sends the help message as a single embed.
+    A subclass of `discord.ext.commands.MinimalHelpCommand` that sends the help message as an embed.
+    Help that doesn't fit in one embed is paginated.
+
+    The rendered embeds are cached per prefix and requested command or cog, and the cache is cleared
+    whenever a command or cog is added or removed. Help is only cached when `verify_checks` is False,
+    since the output depends on who asks otherwise.
+
+    Parameters
+    ----------
+    cache_size: int
+        The number of rendered help messages to keep.
+    **options
+        See `discord.ext.commands.MinimalHelpCommand`.
     """
 
+    def __init__(self, *, cache_size: int = 128, **options):
+        super().__init__(**options)
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, list[Embed]] = OrderedDict()
+        self._cache_key: Optional[tuple] = None
+
+    def copy(self):
+        # A copy is made for every invocation, share the cache with it.
+        obj = super().copy()
+        obj._cache = self._cache
+        return obj
+
+    def invalidate(self):
+        """
+        Clears the cached help messages, for changes the bot can't see, such as a command being hidden.
+        """
+        self._cache.clear()
+
+    async def command_callback(self, ctx: commands.Context, /, *, command: Optional[str] = None):
+        if self.verify_checks is not False:
+            return await super().command_callback(ctx, command=command)
+        version = getattr(ctx.bot, "commands_version", None)
+        if self._cache and next(reversed(self._cache))[0] != version:
+            # Commands or cogs changed since the help was rendered.
+            self._cache.clear()
+        key = (version, ctx.clean_prefix, self.invoked_with, " ".join(command.split()) if command else None)
+        if (embeds := self._cache.get(key)) is not None:
+            self._cache.move_to_end(key)
+            return await self.send_embeds(embeds)
+        self._cache_key = key
+        await super().command_callback(ctx, command=command)
+
+    def render_embeds(self) -> list[Embed]:
+        """
+        Renders the paginator's pages into embeds, splitting them at line breaks when they don't fit in one.
+        """
+        description = "\n".join(page.strip("\n") for page in self.paginator.pages)
+        return split_embed(self.context.bot.Embed(description=description))
+
+    async def send_embeds(self, embeds: list[Embed]):
+        """
+        Sends rendered help, paginated if there's more than one embed.
+
+        Parameters
+        ----------
+        embeds: list[Embed]
+            The rendered help.
+        """
+        destination = self.get_destination()
+        if len(embeds) == 1:
+            return await destination.send(embed=embeds[0])
+        await Paginator(1, source=StaticPageSource(embeds)).send_to(destination)
+
     async def send_pages(self):
-        desc = ""
-        for page in self.paginator.pages:
-            desc += page
-        await self.context.send(embed=self.context.bot.Embed(description=desc))
+        embeds = self.render_embeds()
+        if self._cache_key is not None:
+            self._cache[self._cache_key] = embeds
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        await self.send_embeds(embeds)
 
 
 async def setup(bot: Bot):
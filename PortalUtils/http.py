@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .metrics import Histogram
+
+
+class HostLatency:
+    """
+    Tracks request latency per host for every request made through a session.
+
+    Attributes
+    ----------
+    hosts: dict[str, Histogram]
+        The latency histogram for each host.
+    """
+
+    def __init__(self):
+        self.hosts: dict[str, Histogram] = {}
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Returns a trace config that records request latency into this tracker.
+        """
+
+        async def on_request_start(session, context: SimpleNamespace, params: aiohttp.TraceRequestStartParams):
+            context.started = time.perf_counter()
+
+        async def on_request_end(session, context: SimpleNamespace, params: aiohttp.TraceRequestEndParams):
+            host = params.url.host or "?"
+            if (histogram := self.hosts.get(host)) is None:
+                histogram = self.hosts[host] = Histogram()
+            histogram.observe(time.perf_counter() - context.started)
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(on_request_start)
+        config.on_request_end.append(on_request_end)
+        return config
+
+    def report(self) -> str:
+        """
+        Formats the per-host latencies as a table.
+        """
+        lines = [f"{'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  host"]
+        for host, h in sorted(self.hosts.items(), key=lambda i: i[1].count, reverse=True):
+            lines.append(
+                f"{h.count:>8} {h.quantile(0.5) * 1000:>8.1f} {h.quantile(0.95) * 1000:>8.1f} {h.max * 1000:>8.1f}  {host}"
+            )
+        return "\n".join(lines)
+
+
+def create_session(
+    *,
+    limit: int = 100,
+    limit_per_host: int = 20,
+    keepalive_timeout: float = 30.0,
+    ttl_dns_cache: Optional[int] = 300,
+    timeout: float = 30.0,
+    latency: Optional[HostLatency] = None,
+    **kwargs,
+) -> aiohttp.ClientSession:
+    """
+    Creates an `aiohttp.ClientSession` with a tuned connection pool.
+
+    Parameters
+    ----------
+    limit: int
+        The maximum number of open connections.
+    limit_per_host: int
+        The maximum number of open connections to a single host.
+    keepalive_timeout: float
+        The number of seconds idle connections are kept open for reuse.
+    ttl_dns_cache: Optional[int]
+        The number of seconds DNS lookups are cached for. `None` caches them forever.
+    timeout: float
+        The total timeout for a request, in seconds.
+    latency: HostLatency
+        If given, records the latency of every request per host.
+    **kwargs
+        See `aiohttp.ClientSession`.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=ttl_dns_cache,
+        use_dns_cache=True,
+    )
+    if latency is not None:
+        kwargs["trace_configs"] = [*kwargs.get("trace_configs", []), latency.trace_config()]
+    kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=timeout))
+    return aiohttp.ClientSession(connector=connector, **kwargs)
+
+
+class CachedResponse:
+    """
+    A fully read response, as stored by `HTTPCache`.
+
+    Attributes
+    ----------
+    url: yarl.URL
+        The requested URL.
+    status: int
+        The response status.
+    headers: CIMultiDictProxy[str]
+        The response headers.
+    body: bytes
+        The response body.
+    expires: float
+        When the response becomes stale, on the `time.monotonic` clock.
+    """
+
+    __slots__ = ("url", "status", "headers", "body", "expires")
+
+    def __init__(self, url: URL, status: int, headers: CIMultiDictProxy, body: bytes, expires: float):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+
+    @property
+    def ok(self) -> bool:
+        """
+        Whether the status is below 400.
+        """
+        return self.status < 400
+
+    def text(self, encoding: str = "utf-8") -> str:
+        """
+        Decodes the body as text.
+        """
+        return self.body.decode(encoding)
+
+    def json(self) -> Any:
+        """
+        Decodes the body as JSON.
+        """
+        return json.loads(self.body)
+
+
+def _max_age(headers: CIMultiDictProxy) -> Optional[float]:
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return 0.0
+    if "no-cache" in cache_control:
+        return 0.0
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name == "max-age" and value.isdigit():
+            return float(value)
+    if expires := headers.get("Expires"):
+        try:
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+    return None
+
+
+class HTTPCache:
+    """
+    An in-memory cache for GET requests made through a session.
+
+    Responses are cached for their `Cache-Control: max-age` (or `Expires`), falling back to `default_ttl`.
+    Stale responses with an `ETag` or `Last-Modified` header are revalidated with a conditional request.
+    Identical requests made while one is already in flight share its response.
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+        The session to make requests with.
+    default_ttl: float
+        The number of seconds to cache responses without caching headers.
+    max_entries: int
+        The maximum number of cached responses. The least recently used are evicted first.
+
+    Attributes
+    ----------
+    hits: int
+        Requests served from the cache.
+    misses: int
+        Requests sent upstream.
+    revalidated: int
+        Stale responses confirmed unchanged with a 304.
+    collapsed: int
+        Requests that shared an identical in-flight request.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, *, default_ttl: float = 60.0, max_entries: int = 1024):
+        self.session = session
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.collapsed = 0
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(url: URL, headers: Optional[dict]) -> tuple:
+        return (str(url), tuple(sorted((k.lower(), v) for k, v in (headers or {}).items())))
+
+    async def get(
+        self, url: str, *, params: Optional[dict] = None, headers: Optional[dict] = None, ttl: Optional[float] = None
+    ) -> CachedResponse:
+        """
+        Makes a cached GET request.
+
+        Parameters
+        ----------
+        url: str
+            The URL to request.
+        params: dict
+            The query parameters.
+        headers: dict
+            The request headers. Requests with different headers are cached separately.
+        ttl: float
+            Overrides the number of seconds to cache the response for, ignoring caching headers.
+        """
+        url = URL(url).update_query(params) if params else URL(url)
+        key = self._key(url, headers)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        if (task := self._in_flight.get(key)) is not None:
+            self.collapsed += 1
+        else:
+            # The request runs in its own task, so it carries on for the other requests if this one is cancelled.
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(url, key, headers, entry, ttl))
+            task.add_done_callback(lambda t: self._fetched(key, t))
+        return await asyncio.shield(task)
+
+    def _fetched(self, key: tuple, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every request was cancelled meanwhile.
+            task.exception()
+
+    async def _fetch(
+        self, url: URL, key: tuple, headers: Optional[dict], stale: Optional[CachedResponse], ttl: Optional[float]
+    ) -> CachedResponse:
+        request_headers = CIMultiDict(headers or {})
+        if stale is not None:
+            if etag := stale.headers.get("ETag"):
+                request_headers["If-None-Match"] = etag
+            if last_modified := stale.headers.get("Last-Modified"):
+                request_headers["If-Modified-Since"] = last_modified
+        self.misses += 1
+        async with self.session.get(url, headers=request_headers) as resp:
+            if resp.status == 304 and stale is not None:
+                self.revalidated += 1
+                max_age = ttl if ttl is not None else _max_age(resp.headers)
+                stale.expires = time.monotonic() + (self.default_ttl if max_age is None else max_age)
+                self._entries[key] = stale
+                self._entries.move_to_end(key)
+                return stale
+            body = await resp.read()
+            max_age = ttl if ttl is not None else _max_age(resp.headers)
+            response = CachedResponse(
+                url,
+                resp.status,
+                resp.headers,
+                body,
+                time.monotonic() + (self.default_ttl if max_age is None else max_age),
+            )
+        cacheable = resp.status == 200 and (
+            response.expires > time.monotonic() or "ETag" in resp.headers or "Last-Modified" in resp.headers
+        )
+        if cacheable and "no-store" not in resp.headers.get("Cache-Control", "").lower():
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        """
+        Makes a cached GET request and decodes the response as JSON.
+        Raises `aiohttp.ClientResponseError` for error statuses.
+
+        Parameters
+        ----------
+        url: str
+            The URL to request.
+        **kwargs
+            See `get`.
+        """
+        response = await self.get(url, **kwargs)
+        if not response.ok:
+            raise aiohttp.ClientResponseError(
+                None, (), status=response.status, message=response.text()[:200], headers=response.headers
+            )
+        return response.json()
+
+    def invalidate(self, url: Optional[str] = None):
+        """
+        Removes cached responses.
+
+        Parameters
+        ----------
+        url: str
+            The URL to remove, including its query string. Removes everything if not given.
+        """
+        if url is None:
+            self._entries.clear()
+        else:
+            url = str(URL(url))
+            for key in [key for key in self._entries if key[0] == url]:
+                del self._entries[key]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the cache's counters.
+        """
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "collapsed": self.collapsed,
+        }
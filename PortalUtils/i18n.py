@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from logging import getLogger
+from string import Formatter
+from typing import Any, Optional
+
+log = getLogger(__name__)
+
+_formatter = Formatter()
+
+
+class Template:
+    """
+    A translation string, parsed once when its bundle is loaded.
+    Strings without replacement fields are returned as-is without formatting.
+
+    Parameters
+    ----------
+    text: str
+        The translation string, using `str.format` replacement fields.
+
+    Attributes
+    ----------
+    fields: tuple[str, ...]
+        The names of the replacement fields in the string.
+    """
+
+    __slots__ = ("text", "fields")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.fields = tuple(field for _, field, _, _ in _formatter.parse(text) if field is not None)
+
+    def render(self, kwargs: dict[str, Any]) -> str:
+        """
+        Formats the string with the given values.
+
+        Parameters
+        ----------
+        kwargs: dict[str, Any]
+            The values for the replacement fields.
+        """
+        return self.text.format_map(kwargs) if self.fields else self.text
+
+
+def flatten(data: dict, prefix: str = "") -> dict[str, str]:
+    """
+    Flattens nested dicts into a single dict with dotted keys.
+
+    Parameters
+    ----------
+    data: dict
+        The nested dict.
+    prefix: str
+        The prefix for every key.
+    """
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = str(value)
+    return flat
+
+
+class Translator:
+    """
+    A translation provider that loads JSON locale bundles from a directory.
+
+    Each `<locale>.json` file holds a nested dict of translations, such as `{"info": {"ping": {"title": "Pong!"}}}`
+    for the key `info.ping.title`. Bundles are flattened once on load, with every locale's fallback chain already
+    merged in, so translating a key is a single dict lookup.
+
+    A locale falls back to its language (`es-ES` to `es`), then to `default_locale`, unless `fallbacks` says otherwise.
+
+    Parameters
+    ----------
+    path: str
+        The directory containing the locale bundles.
+    default_locale: str
+        The locale used when a key or locale is missing.
+    fallbacks: dict[str, list[str]]
+        Custom fallback chains, such as `{"pt-BR": ["pt-PT"]}`. `default_locale` is always tried last.
+
+    Methods
+    -------
+    t(key: str, locale: str = None, **kwargs) -> str
+        Translates a key.
+    reload(force: bool = False) -> bool
+        Reloads the bundles if any of the files changed.
+    watch(interval: float)
+        Reloads the bundles whenever they change.
+    """
+
+    def __init__(self, path: str, *, default_locale: str = "en-US", fallbacks: Optional[dict[str, list[str]]] = None):
+        self.path = path
+        self.default_locale = default_locale
+        self.fallbacks = fallbacks or {}
+        self.bundles: dict[str, dict[str, Template]] = {}
+        # Locales without their own file, mapped to the bundle they fall back to.
+        self._aliases: dict[str, dict[str, Template]] = {}
+        self._mtimes: dict[str, float] = {}
+        self.reload(force=True)
+
+    def _files(self) -> dict[str, str]:
+        return {name[:-5]: os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".json")}
+
+    def chain(self, locale: str) -> list[str]:
+        """
+        Returns the locales tried for a locale, in order.
+
+        Parameters
+        ----------
+        locale: str
+            The locale.
+        """
+        chain = [locale, *self.fallbacks.get(locale, [locale.split("-")[0]] if "-" in locale else [])]
+        chain.append(self.default_locale)
+        return list(dict.fromkeys(chain))
+
+    def reload(self, *, force: bool = False) -> bool:
+        """
+        Reloads the bundles if any of the files were added, removed or modified.
+
+        Parameters
+        ----------
+        force: bool
+            Whether to reload even if nothing changed.
+
+        Returns
+        -------
+        bool
+            Whether the bundles were reloaded.
+        """
+        files = self._files()
+        mtimes = {locale: os.path.getmtime(file) for locale, file in files.items()}
+        if not force and mtimes == self._mtimes:
+            return False
+        raw = {}
+        for locale, file in files.items():
+            with open(file, encoding="utf-8") as f:
+                raw[locale] = flatten(json.load(f))
+        bundles = {}
+        for locale in raw:
+            merged = {}
+            for fallback in reversed(self.chain(locale)):
+                merged.update(raw.get(fallback, {}))
+            bundles[locale] = {key: Template(text) for key, text in merged.items()}
+        self.bundles = bundles
+        # Reset after swapping the bundles, so an alias made meanwhile can't outlive the old bundles.
+        self._aliases = {}
+        self._mtimes = mtimes
+        log.info("Loaded %s locale bundles from %s", len(bundles), self.path)
+        return True
+
+    async def watch(self, interval: float = 5.0):
+        """
+        Reloads the bundles whenever they change. Runs until cancelled.
+
+        Parameters
+        ----------
+        interval: float
+            The number of seconds between checks.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception:
+                log.exception("Failed to reload locale bundles from %s", self.path)
+
+    def _alias(self, locale: str) -> dict[str, Template]:
+        # Locales without their own file share the bundle of the first locale in their chain that has one.
+        bundles = self.bundles
+        bundle = next((bundles[fallback] for fallback in self.chain(locale) if fallback in bundles), {})
+        self._aliases[locale] = bundle
+        return bundle
+
+    def t(self, key: str, locale: Any = None, **kwargs) -> str:
+        """
+        Translates a key. Returns the key itself if no translation exists.
+
+        Parameters
+        ----------
+        key: str
+            The full translation key.
+        locale: Union[str, discord.Locale]
+            The locale to translate to. Defaults to `default_locale`.
+        **kwargs
+            The values for the translation's replacement fields.
+        """
+        locale = self.default_locale if locale is None else str(locale)
+        if (bundle := self.bundles.get(locale)) is None and (bundle := self._aliases.get(locale)) is None:
+            bundle = self._alias(locale)
+        template = bundle.get(key)
+        if template is None:
+            return key
+        return template.render(kwargs)
@@ -1,20 +1,102 @@
-import inspect
+import asyncio
+from collections import OrderedDict, deque
+from time import monotonic
+from typing import Optional
 
-from discord import Color, DMChannel, Embed, Guild, Interaction, app_commands
+from discord import Color, DMChannel, Embed, Guild, HTTPException, Interaction, Member, User, app_commands
 from discord.ext import commands
 from discord.utils import utcnow
 from DPyUtils import Context
 
 from .bot import Bot
+from .dispatcher import LogPriority
+from .embeds import EmbedTemplate
+
+COMMAND_RAN = EmbedTemplate(Embed(title="Command Ran", color=Color.dark_green()))
 
 
 class Logging(commands.Cog):
     """
     Logs bot stuff.
+
+    Guild joins and leaves are summarized instead of logged one by one while more than
+    `BURST_THRESHOLD` of them happen within `BURST_WINDOW` seconds, such as after an outage or a reshard.
     """
 
+    BURST_WINDOW = 10.0
+    BURST_THRESHOLD = 5
+    OWNER_CACHE_SIZE = 512
+    OWNER_FETCHES_PER_MINUTE = 10
+
     def __init__(self, bot: Bot):
         self.bot = bot
+        self._guild_events: deque[float] = deque()
+        self._burst: list[tuple[bool, str, int, Optional[int]]] = []
+        self._burst_task: Optional[asyncio.Task] = None
+        self._owners: OrderedDict[int, User] = OrderedDict()
+        self._owner_fetches: deque[float] = deque()
+        self._bot_counts: dict[int, int] = {}
+
+    async def cog_unload(self):
+        if self._burst_task is not None:
+            self._burst_task.cancel()
+
+    def count_bots(self, guild: Guild) -> Optional[int]:
+        """
+        Returns the number of bots in a guild, or None if its members aren't cached.
+        Counted once per guild, then kept up to date by member join and leave events.
+        Always None under member cache policies other than `full`, whose guilds are trimmed rather than chunked.
+
+        Parameters
+        ----------
+        guild: Guild
+            The guild to count bots in.
+        """
+        if not self.bot.intents.members or not guild.chunked:
+            return None
+        if (bots := self._bot_counts.get(guild.id)) is None:
+            bots = self._bot_counts[guild.id] = sum(m.bot for m in guild.members)
+        return bots
+
+    @commands.Cog.listener("on_member_join")
+    async def _count_member_join(self, member: Member):
+        if member.bot and member.guild.id in self._bot_counts:
+            self._bot_counts[member.guild.id] += 1
+
+    @commands.Cog.listener("on_member_remove")
+    async def _count_member_remove(self, member: Member):
+        if member.bot and member.guild.id in self._bot_counts:
+            self._bot_counts[member.guild.id] -= 1
+
+    async def get_owner(self, guild: Guild) -> Optional[User]:
+        """
+        Returns a guild's owner, from the cache if possible.
+        Fetches are limited to `OWNER_FETCHES_PER_MINUTE`; returns None once the limit is hit.
+
+        Parameters
+        ----------
+        guild: Guild
+            The guild to get the owner of.
+        """
+        if guild.owner is not None or guild.owner_id is None:
+            return guild.owner
+        if (owner := self._owners.get(guild.owner_id)) is not None:
+            self._owners.move_to_end(guild.owner_id)
+            return owner
+        now = monotonic()
+        while self._owner_fetches and self._owner_fetches[0] < now - 60:
+            self._owner_fetches.popleft()
+        if len(self._owner_fetches) >= self.OWNER_FETCHES_PER_MINUTE:
+            return None
+        self._owner_fetches.append(now)
+        try:
+            owner = await self.bot.fetch_user(guild.owner_id)
+        except HTTPException:
+            return None
+        self._owners[guild.owner_id] = owner
+        if len(self._owners) > self.OWNER_CACHE_SIZE:
+            self._owners.popitem(last=False)
+        return owner
 
     @commands.Cog.listener("on_guild_join")
     @commands.Cog.listener("on_guild_remove")
@@ -27,85 +109,83 @@ class Logging(commands.Cog):
         guild: Guild
             The guild that was joined or left.
         """
-        log = self.bot.get_channel(self.bot.guild_logs)
-        if log is None:
+        # Only deregistered when no channel is set, the channel may be cached on another cluster.
+        if not (log := self.bot.guild_logs):
             self.bot.extra_events["on_guild_join"].remove(self.guild_logs)
             self.bot.extra_events["on_guild_remove"].remove(self.guild_logs)
             return
-        jl, clr = ("Joined", "green") if self.bot.get_guild(guild.id) else ("Left", "red")
-        owner = guild.owner
-        if not owner and guild.owner_id is not None:
-            owner = await self.bot.fetch_user(guild.owner_id)
-        await log.send(
-            embed=Embed(
+        joined = self.bot.get_guild(guild.id) is not None
+        bots = self.count_bots(guild)
+        if not joined:
+            self._bot_counts.pop(guild.id, None)
+        now = monotonic()
+        self._guild_events.append(now)
+        while self._guild_events[0] < now - self.BURST_WINDOW:
+            self._guild_events.popleft()
+        if self._burst_task is not None or len(self._guild_events) > self.BURST_THRESHOLD:
+            self._burst.append((joined, str(guild), guild.id, guild.member_count))
+            if self._burst_task is None:
+                self._burst_task = asyncio.create_task(self._summarize_burst(log))
+            return
+        jl, clr = ("Joined", "green") if joined else ("Left", "red")
+        owner = await self.get_owner(guild)
+        if bots is not None:
+            counts = f"\nHumans: `{guild.member_count - bots}`\nBots: `{bots}`"
+        else:
+            counts = f"\nMembers: `{guild.member_count}`"
+        self.bot.log_dispatcher.submit(
+            log,
+            Embed(
                 title=f"{jl} Server",
                 color=getattr(Color, clr)(),
                 description=f"""
 Guild Name: `{guild}`
 Guild ID: `{guild.id}`
-Owner: `{owner}` (`{guild.owner_id}`){f'''
-Humans: `{len([m for m in guild.members if not m.bot])}`
-Bots: `{len([m for m in guild.members if m.bot])}`''' if self.bot.intents.members else ''}
+Owner: `{owner or "Unknown"}` (`{guild.owner_id}`){counts}
 Total Guilds: `{len(self.bot.guilds)}`""",
-            )
+            ),
+            priority=LogPriority.GUILD,
         )
 
-    # @commands.Cog.listener("on_command")
-    # TODO: figure out what's going on with this; clean it up for only slash commands
-    async def command_logs(self, ctx: Context):
+    async def _summarize_burst(self, channel_id: int):
+        while True:
+            await asyncio.sleep(self.BURST_WINDOW)
+            events, self._burst = self._burst, []
+            if events:
+                joins = sum(e[0] for e in events)
+                lines = [
+                    f"{'+' if j else '-'} `{name}` (`{gid}`, {count if count is not None else '?'} members)"
+                    for j, name, gid, count in events
+                ]
+                description = "\n".join(lines)
+                if len(description) > 3900:
+                    description = description[:3900].rsplit("\n", 1)[0]
+                    description += f"\n... and {len(lines) - description.count(chr(10)) - 1} more"
+                self.bot.log_dispatcher.submit(
+                    channel_id,
+                    Embed(
+                        title=f"Joined {joins} and left {len(events) - joins} servers",
+                        color=Color.blurple(),
+                        description=f"{description}\n\nTotal Guilds: `{len(self.bot.guilds)}`",
+                        timestamp=utcnow(),
+                    ),
+                    priority=LogPriority.GUILD,
+                )
+            if len(events) <= self.BURST_THRESHOLD:
+                self._burst_task = None
+                return
+
+    @commands.Cog.listener("on_command")
+    async def command_audit_start(self, ctx: Context):
         """
-        Logs message commands to the `command_logs` channel.
+        Marks when a message command was dispatched, for its audit record.
 
         Parameters
         ----------
         ctx: Context
             The command context.
         """
-        log = self.bot.get_channel(self.bot.command_logs)
-        if log is None:
-            self.bot.extra_events["on_command"].remove(self.command_logs)
-            return
-        if ctx.command.qualified_name.split()[0] == "jishaku":
-            return
-        cmd = ctx.prefix + " ".join((*ctx.invoked_parents, ctx.invoked_with))
-        args = [x for x in ctx.args if not isinstance(x, (commands.Cog, commands.Context))]
-        c = ctx.message.content.replace(cmd, "").strip()
-        for a in args:
-            c = c.replace(c.split()[0], "")
-        args.append(c.strip())
-        params = {k: v for k, v in ctx.command.params.items() if k not in ("self", "ctx")}
-        argi = 0
-        sig = []
-        newargs = []
-        for name, param in params.items():
-            if argi >= len(args):
-                break
-            types = [str if param.annotation is inspect._empty else param.annotation]
-            if ags := getattr(param.annotation, "__args__", None):
-                types = [x for x in ags if x.__name__ != "NoneType"]
-            types = tuple(types)
-            if isinstance(args[argi], types) and param.kind.numerator != 2:
-                sig.append(name)
-                newargs.append(args[argi])
-                argi += 1
-                continue
-            temp = []
-            while isinstance(args[argi], types) and argi < len(args):
-                temp.append(args[argi])
-                argi += 1
-            newargs.append(" ".join(map(str, temp)))
-        await log.send(
-            embed=Embed(
-                title="Command Ran",
-                description=f"""
-User: `{ctx.author}` (`{ctx.author.id}`)
-Guild: `{ctx.guild}`{f" (`{ctx.guild.id}`)" if ctx.guild else ''}
-Channel: `{ctx.channel if not isinstance(ctx.channel, DMChannel) else "DM or Slash-Only Context"}` (`{ctx.channel.id}`)
-Message: [`{ctx.message.id}`]({ctx.message.jump_url})
-Command: `{cmd} {' '.join(':'.join(a) for a in zip(sig, map(str, newargs)))}`""",
-                color=Color.dark_green(),
-            )
-        )
+        self.bot.audit.begin(ctx)
 
     @commands.Cog.listener("on_app_command")
     async def app_command_logs(self, interaction: Interaction, command: app_commands.Command):
@@ -119,27 +199,56 @@ Command: `{cmd} {' '.join(':'.join(a) for a in zip(sig, map(str, newargs)))}`"""
         command: app_commands.Command
             The command that was triggered.
         """
-        log = self.bot.get_channel(self.bot.command_logs)
-        if log is None:
+        if not (log := self.bot.command_logs):
             self.bot.extra_events["on_app_command"].remove(self.app_command_logs)
             return
-        await log.send(
-            embed=Embed(
-                title="Command Ran",
+        self.bot.log_dispatcher.submit(
+            log,
+            COMMAND_RAN(
                 description=f"""
 User: `{interaction.user}` (`{interaction.user.id}`)
 Guild: `{interaction.guild}`{f" (`{interaction.guild.id}`)" if interaction.guild else ''}
 Channel: [`{f"#{interaction.channel}" if not isinstance(interaction.channel, DMChannel) else "DM or Slash-Only Context"}`]({interaction.channel.jump_url}) (`{interaction.channel.id}`)
 Command: `/{command.qualified_name} {' '.join(f"{k}:{v}" for k, v in interaction.namespace.__dict__.items())}`""",
-                color=Color.dark_green(),
                 timestamp=utcnow(),
-            ).set_footer(icon_url=interaction.user.display_avatar.url)
+            ).set_footer(icon_url=interaction.user.display_avatar.url),
+            priority=LogPriority.COMMAND,
         )
 
+    @commands.Cog.listener("on_app_command_completion")
+    async def app_command_metrics(self, interaction: Interaction, command: app_commands.Command):
+        """
+        Records application command latency in the bot's metrics, and the command in the audit log.
+
+        Parameters
+        ----------
+        interaction: Interaction
+            The interaction that triggered the command.
+        command: app_commands.Command
+            The command that was triggered.
+        """
+        self.bot.metrics.observe("app", command.qualified_name, (utcnow() - interaction.created_at).total_seconds())
+        self.bot.audit.record_interaction(interaction, command)
+
+    @commands.Cog.listener("on_command_completion")
+    async def command_metrics(self, ctx: Context):
+        """
+        Records message command latency in the bot's metrics, and the command in the audit log.
+
+        Parameters
+        ----------
+        ctx: Context
+            The command context.
+        """
+        self.bot.metrics.observe(
+            "prefix", ctx.command.qualified_name, (utcnow() - ctx.message.created_at).total_seconds()
+        )
+        self.bot.audit.record_command(ctx)
+
     @commands.Cog.listener("on_command_error")
     async def error_logs(self, ctx: Context, err: Exception):
         """
-        Prints command errors to the console.
+        Prints command errors to the console and records them in the bot's metrics and audit log.
 
         Parameters
         ----------
@@ -149,6 +258,11 @@ Command: `/{command.qualified_name} {' '.join(f"{k}:{v}" for k, v in interaction
             The error that occurred.
         """
         print(ctx.channel, ctx.author, err)
+        if ctx.command is not None:
+            self.bot.metrics.observe(
+                "prefix", ctx.command.qualified_name, (utcnow() - ctx.message.created_at).total_seconds(), error=True
+            )
+            self.bot.audit.record_command(ctx, err)
 
 
 async def setup(bot: Bot):
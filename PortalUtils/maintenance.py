@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import TYPE_CHECKING, Awaitable, Callable, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+log = getLogger(__name__)
+
+
+class MaintenanceRun(NamedTuple):
+    """
+    The result of one maintenance job.
+
+    Attributes
+    ----------
+    at: float
+        When the job started, as a Unix timestamp.
+    job: str
+        The job's name.
+    duration: float
+        How long the job took, in seconds.
+    blocked: float
+        How long the job held the database's write lock, in seconds, during which writes waited.
+    detail: str
+        What the job did, such as the number of pages copied.
+    error: Optional[str]
+        The error the job failed with, if any.
+    """
+
+    at: float
+    job: str
+    duration: float
+    blocked: float
+    detail: str
+    error: Optional[str]
+
+
+class _Stopped(Exception):
+    pass
+
+
+class MaintenanceScheduler:
+    """
+    Runs database maintenance in the background, so it never holds up commands.
+
+    - `backup` copies the database with SQLite's online backup API, in a worker thread, a few pages at a time
+      with a pause between steps. It copies a snapshot, so writes carry on meanwhile. Backups are written to
+      `backup_dir`, and only the newest `backups_kept` are kept. Disabled unless `backup_dir` is given.
+    - `checkpoint` runs a passive WAL checkpoint in the worker thread, which never waits for readers or writers.
+    - `optimize` runs `PRAGMA optimize` on the writer connection, with ANALYZE limited to `analysis_limit` rows.
+    - `vacuum` frees unused pages with `PRAGMA incremental_vacuum` in the worker thread, a few pages per
+      write transaction. Only databases created with `auto_vacuum = incremental` can be vacuumed this way.
+
+    Each run is recorded with its duration and how long it held the write lock, see `report`.
+    A job's interval of `0` disables it.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot whose database is maintained.
+    backup_dir: str
+        The directory to write backups to.
+    backup_interval: float
+        The number of seconds between backups.
+    backups_kept: int
+        The number of backups to keep.
+    backup_step: int
+        The number of pages copied per backup step.
+    backup_pause: float
+        The number of seconds to pause between backup steps.
+    checkpoint_interval: float
+        The number of seconds between WAL checkpoints.
+    optimize_interval: float
+        The number of seconds between runs of `PRAGMA optimize`.
+    analysis_limit: int
+        The approximate number of rows ANALYZE looks at per index, see `PRAGMA analysis_limit`.
+    vacuum_interval: float
+        The number of seconds between incremental vacuums.
+    vacuum_step: int
+        The number of pages freed per vacuum transaction. Vacuum steps are paused for `backup_pause` too.
+
+    Attributes
+    ----------
+    runs: deque[MaintenanceRun]
+        The latest runs of every job.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        backup_dir: Optional[str] = None,
+        backup_interval: float = 6 * 3600.0,
+        backups_kept: int = 7,
+        backup_step: int = 256,
+        backup_pause: float = 0.01,
+        checkpoint_interval: float = 300.0,
+        optimize_interval: float = 6 * 3600.0,
+        analysis_limit: int = 400,
+        vacuum_interval: float = 24 * 3600.0,
+        vacuum_step: int = 128,
+    ):
+        self.bot = bot
+        self.backup_dir = backup_dir
+        self.backups_kept = max(1, backups_kept)
+        self.backup_step = backup_step
+        self.backup_pause = backup_pause
+        self.analysis_limit = analysis_limit
+        self.vacuum_step = vacuum_step
+        self.intervals = {
+            "backup": backup_interval if backup_dir is not None else 0,
+            "checkpoint": checkpoint_interval,
+            "optimize": optimize_interval,
+            "vacuum": vacuum_interval,
+        }
+        self.jobs: dict[str, Callable[[], Awaitable[tuple[float, str]]]] = {
+            "backup": self.backup,
+            "checkpoint": self.checkpoint,
+            "optimize": self.optimize,
+            "vacuum": self.vacuum,
+        }
+        self.runs: deque[MaintenanceRun] = deque(maxlen=50)
+        self._lock = asyncio.Lock()
+        self._stop = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """
+        Starts the schedule. Does nothing if the bot has no database.
+        """
+        if not hasattr(self.bot, "db") or (self._task is not None and not self._task.done()):
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="PortalUtils-maintenance")
+        self._task = asyncio.create_task(self._schedule(), name="PortalUtils-maintenance")
+
+    def close(self):
+        """
+        Stops the schedule, aborting a backup in progress.
+        """
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _schedule(self):
+        # Every job first runs one interval after startup, so they don't compete with it.
+        now = time.monotonic()
+        due = {job: now + interval for job, interval in self.intervals.items() if interval}
+        while due:
+            job = min(due, key=due.get)
+            await asyncio.sleep(max(0.0, due[job] - time.monotonic()))
+            await self.run(job)
+            due[job] = time.monotonic() + self.intervals[job]
+
+    async def run(self, job: str) -> MaintenanceRun:
+        """
+        Runs a job now, after any job already running, and records the result.
+
+        Parameters
+        ----------
+        job: str
+            `backup`, `checkpoint`, `optimize` or `vacuum`.
+        """
+        if job not in self.jobs:
+            raise ValueError(f"Unknown maintenance job {job!r}, expected one of {', '.join(self.jobs)}")
+        async with self._lock:
+            at, started = time.time(), time.perf_counter()
+            try:
+                blocked, detail = await self.jobs[job]()
+            except Exception as e:
+                log.exception("Maintenance job %s failed", job)
+                run = MaintenanceRun(at, job, time.perf_counter() - started, 0.0, "", f"{type(e).__name__}: {e}")
+            else:
+                run = MaintenanceRun(at, job, time.perf_counter() - started, blocked, detail, None)
+        self.runs.append(run)
+        log.info("Maintenance job %s took %.2fs: %s", job, run.duration, run.error or run.detail)
+        return run
+
+    async def _in_thread(self, fn: Callable, *args):
+        if self._executor is None:
+            raise RuntimeError("Maintenance scheduler is not running")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A separate connection for the worker thread, so jobs don't occupy the pool's connections.
+        conn = sqlite3.connect(self.bot.db.path, timeout=5.0)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    async def backup(self) -> tuple[float, str]:
+        """
+        Writes an online backup of the database to `backup_dir` and removes the oldest backups.
+        """
+        if self.backup_dir is None:
+            raise RuntimeError("No backup directory is set")
+        return 0.0, await self._in_thread(self._backup)
+
+    def _backup(self) -> str:
+        os.makedirs(self.backup_dir, exist_ok=True)
+        name, ext = os.path.splitext(os.path.basename(self.bot.db.path))
+        # Microseconds keep backups run back to back apart, and the names still sort by age.
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}"
+        path = os.path.join(self.backup_dir, f"{name}-{stamp}{ext or '.db'}")
+        steps = 0
+
+        def progress(status: int, remaining: int, total: int):
+            nonlocal steps
+            if self._stop.is_set():
+                raise _Stopped
+            steps += 1
+            if remaining:
+                time.sleep(self.backup_pause)
+
+        source, target = self._connect(), sqlite3.connect(path + ".tmp")
+        try:
+            # Copy from a snapshot. Otherwise every write from another connection restarts the copy,
+            # and a busy bot's backup never finishes. The WAL can't be checkpointed past the snapshot meanwhile.
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            source.backup(target, pages=self.backup_step, progress=progress)
+            pages = target.execute("PRAGMA page_count").fetchone()[0]
+        except BaseException:
+            target.close()
+            for leftover in (path + ".tmp", path + ".tmp-journal"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        finally:
+            source.close()
+        target.close()
+        os.replace(path + ".tmp", path)
+        backups = sorted(
+            f for f in os.listdir(self.backup_dir) if f.startswith(f"{name}-") and f.endswith(ext or ".db")
+        )
+        for old in backups[: -self.backups_kept]:
+            os.remove(os.path.join(self.backup_dir, old))
+        return f"{pages} pages in {steps} steps, {os.path.getsize(path) / 2**20:.1f} MB to {path}"
+
+    async def checkpoint(self) -> tuple[float, str]:
+        """
+        Copies committed pages from the WAL into the database, without waiting for readers or writers.
+        """
+        return 0.0, await self._in_thread(self._checkpoint)
+
+    def _checkpoint(self) -> str:
+        conn = self._connect()
+        try:
+            busy, wal, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        finally:
+            conn.close()
+        if wal == -1:
+            return "Not in WAL mode"
+        return f"{done} of {wal} WAL frames checkpointed" + (", blocked by a reader or writer" if busy else "")
+
+    async def optimize(self) -> tuple[float, str]:
+        """
+        Runs `PRAGMA optimize` on the writer connection, which has seen the most queries of any connection.
+        """
+        db = self.bot.db
+        async with db.transaction() as conn:
+            locked = time.perf_counter()
+            limit = (await (await conn.execute("PRAGMA analysis_limit")).fetchone())[0]
+            await conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+            try:
+                await conn.execute("PRAGMA optimize")
+            finally:
+                await conn.execute(f"PRAGMA analysis_limit = {int(limit)}")
+            blocked = time.perf_counter() - locked
+        return blocked, f"analysis_limit {self.analysis_limit}"
+
+    async def vacuum(self) -> tuple[float, str]:
+        """
+        Frees unused pages a few at a time in the worker thread, releasing the write lock between steps.
+        """
+        return await self._in_thread(self._vacuum)
+
+    def _vacuum(self) -> tuple[float, str]:
+        conn = self._connect()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0.0, "Skipped, auto_vacuum isn't incremental"
+            blocked, steps = 0.0, 0
+            start = free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            while free and not self._stop.is_set():
+                locked = time.perf_counter()
+                # executescript steps the pragma to completion, execute would only free one page.
+                conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_step)})")
+                blocked += time.perf_counter() - locked
+                steps += 1
+                if (left := conn.execute("PRAGMA freelist_count").fetchone()[0]) >= free:
+                    break
+                free = left
+                time.sleep(self.backup_pause)
+        finally:
+            conn.close()
+        return blocked, f"{start - free} pages freed in {steps} steps"
+
+    def report(self) -> str:
+        """
+        Formats the job schedule and the latest runs.
+        """
+        every = [
+            f"{job} {'off' if not s else f'{s / 3600:g}h' if s >= 3600 else f'{s / 60:g}m'}"
+            for job, s in self.intervals.items()
+        ]
+        lines = ["Every: " + ", ".join(every)]
+        lines += ["", f"{'when':<8} {'job':<10} {'seconds':>8} {'lock ms':>8}  result"]
+        for run in reversed(self.runs):
+            when = time.strftime("%H:%M:%S", time.localtime(run.at))
+            lines.append(
+                f"{when:<8} {run.job:<10} {run.duration:>8.2f} {run.blocked * 1000:>8.1f}  {run.error or run.detail}"
+            )
+        return "\n".join(lines)
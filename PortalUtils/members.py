@@ -0,0 +1,462 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Collection, Iterable, Optional, Union
+
+from discord import Guild, Intents, Interaction, Member, MemberCacheFlags, Message
+
+from .runtime import _mb, _rss
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+log = getLogger(__name__)
+
+# References to objects that are shared with, or owned by, something else. Not counted in an object's size.
+SHARED = frozenset({"guild", "_guild", "_state", "_user", "_parent", "category", "_cs_guild"})
+
+
+def _object_size(obj: Any) -> int:
+    # The object and the values in its slots or __dict__, one level deep.
+    size = sys.getsizeof(obj)
+    names = [name for cls in type(obj).__mro__ for name in getattr(cls, "__slots__", ())]
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+        names += obj.__dict__
+    for name in names:
+        if name not in SHARED and (value := getattr(obj, name, None)) is not None:
+            size += sys.getsizeof(value)
+    return size
+
+
+def _estimate(objects: Iterable[Any], count: Optional[int] = None, sample: int = 32) -> int:
+    # The mean size of a sample, times the number of objects.
+    sizes = [_object_size(obj) for obj in islice(objects, sample)]
+    if not sizes:
+        return 0
+    return sum(sizes) * (len(objects) if count is None else count) // len(sizes)
+
+
+def _object_count(guild: Guild) -> int:
+    return len(guild._members) + len(guild._channels) + len(guild._threads) + len(guild._roles) + len(guild.emojis)
+
+
+class MemberCachePolicy:
+    """
+    Decides which members are kept in the member cache.
+
+    Use one of the named policies:
+
+    - `full()` keeps every member, like discord.py does by default, but chunks guilds on first need.
+    - `count_only()` keeps no members. Guilds still have `member_count`.
+    - `active(ttl, limit)` keeps members who sent a message or used an interaction recently.
+    - `roles(*role_ids)` keeps members with any of the given roles, such as staff.
+
+    The bot's own member is always kept.
+
+    Parameters
+    ----------
+    name: str
+        The policy's name, for reports.
+    joined: bool
+        Whether members are cached when they join or are updated, before the policy filters them.
+    chunk: bool
+        Whether `MemberCache.ensure_chunked` requests a guild's members.
+    role_ids: Collection[int]
+        The roles whose members are kept, if the policy filters by role.
+    ttl: float
+        The number of seconds an inactive member is kept, if the policy tracks activity.
+    limit: int
+        The maximum number of active members kept per guild.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        joined: bool,
+        chunk: bool,
+        role_ids: Optional[Collection[int]] = None,
+        ttl: Optional[float] = None,
+        limit: Optional[int] = None,
+    ):
+        self.name = name
+        self.joined = joined
+        self.chunk = chunk
+        self.role_ids = frozenset(role_ids) if role_ids is not None else None
+        self.ttl = ttl
+        self.limit = limit
+
+    def __repr__(self) -> str:
+        options = []
+        if self.role_ids is not None:
+            options.append(f"{len(self.role_ids)} roles")
+        if self.ttl is not None:
+            options.append(f"ttl {self.ttl:g}s, limit {self.limit} per guild")
+        return self.name + (f" ({', '.join(options)})" if options else "")
+
+    @classmethod
+    def full(cls) -> MemberCachePolicy:
+        """
+        Keeps every member.
+        """
+        return cls("full", joined=True, chunk=True)
+
+    @classmethod
+    def count_only(cls) -> MemberCachePolicy:
+        """
+        Keeps no members, for bots that only need member counts.
+        """
+        return cls("count", joined=False, chunk=False)
+
+    @classmethod
+    def active(cls, ttl: float = 3600.0, limit: int = 1000) -> MemberCachePolicy:
+        """
+        Keeps members who were active in the last `ttl` seconds, at most `limit` per guild.
+
+        Parameters
+        ----------
+        ttl: float
+            The number of seconds an inactive member is kept.
+        limit: int
+            The maximum number of members kept per guild. The least recently active are evicted first.
+        """
+        return cls("active", joined=False, chunk=False, ttl=ttl, limit=limit)
+
+    @classmethod
+    def roles(cls, *role_ids: int) -> MemberCachePolicy:
+        """
+        Keeps members with any of the given roles.
+
+        Parameters
+        ----------
+        *role_ids: int
+            The IDs of the roles whose members are kept.
+        """
+        return cls("roles", joined=True, chunk=True, role_ids=role_ids)
+
+    @classmethod
+    def named(cls, name: str) -> MemberCachePolicy:
+        """
+        Returns a named policy with its default settings.
+
+        Parameters
+        ----------
+        name: str
+            `full`, `count` or `active`.
+        """
+        policies = {"full": cls.full, "count": cls.count_only, "active": cls.active}
+        if name not in policies:
+            raise ValueError(f"Unknown member cache policy {name!r}, expected one of {', '.join(policies)}")
+        return policies[name]()
+
+    def flags(self, intents: Intents) -> MemberCacheFlags:
+        """
+        Returns the discord.py member cache flags for this policy.
+
+        Parameters
+        ----------
+        intents: Intents
+            The bot's intents.
+        """
+        flags = MemberCacheFlags.from_intents(intents)
+        if self.name != "full":
+            # Voice members would be cached regardless of the policy, and removed only when they leave voice.
+            flags.voice = False
+            flags.joined = self.joined and intents.members
+        return flags
+
+    def keeps(self, member: Member) -> bool:
+        """
+        Whether the policy keeps a member, regardless of activity.
+
+        Parameters
+        ----------
+        member: Member
+            The member to check.
+        """
+        if self.name == "full":
+            return True
+        if self.role_ids is not None:
+            return not self.role_ids.isdisjoint(member._roles)
+        return False
+
+
+class MemberCache:
+    """
+    Applies a `MemberCachePolicy` to the bot's member cache, and accounts for each guild's memory use.
+
+    When the bot is given a policy, guilds aren't chunked at startup. Code that needs a guild's full member list
+    calls `ensure_chunked`, which requests it once, concurrent callers included. Members the policy doesn't keep
+    are dropped as they join, and the whole cache is trimmed every `sweep_interval` seconds.
+
+    Trimmed guilds never count as `Guild.chunked`, so anything that needs every member, such as the bot counts
+    in the guild join and leave logs, isn't available under policies other than `full`.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot whose member cache is managed.
+    policy: MemberCachePolicy
+        The policy to apply.
+    sweep_interval: float
+        The number of seconds between trims of the whole cache.
+
+    Attributes
+    ----------
+    trimmed: int
+        Members removed from the cache by the policy.
+    chunked: int
+        Guilds chunked by `ensure_chunked`.
+    """
+
+    def __init__(self, bot: Bot, policy: MemberCachePolicy, *, sweep_interval: float = 300.0):
+        self.bot = bot
+        self.policy = policy
+        self.sweep_interval = sweep_interval
+        self.trimmed = 0
+        self.chunked = 0
+        # Per guild, user IDs in order of last activity, for the active policy.
+        self._seen: dict[int, OrderedDict[int, float]] = {}
+        self._chunking: dict[int, asyncio.Task] = {}
+        # Guilds chunked by `ensure_chunked`. Trimming removes members, which unsets `Guild.chunked`.
+        self._chunked_guilds: set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners = (
+            (self._on_message, "on_message"),
+            (self._on_interaction, "on_interaction"),
+            (self._on_member_join, "on_member_join"),
+            (self._on_member_update, "on_member_update"),
+            (self._on_guild_remove, "on_guild_remove"),
+        )
+
+    def start(self):
+        """
+        Starts applying the policy. Does nothing for the `full` policy.
+        """
+        if self.policy.name == "full" or (self._task is not None and not self._task.done()):
+            return
+        for listener, event in self._listeners:
+            self.bot.add_listener(listener, event)
+        self._task = asyncio.create_task(self._run(), name="PortalUtils-member-cache")
+
+    def close(self):
+        """
+        Stops applying the policy.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        for listener, event in self._listeners:
+            self.bot.remove_listener(listener, event)
+        for task in self._chunking.values():
+            task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.trim_all()
+
+    def seen(self, member: Union[Member, Any]):
+        """
+        Records a member's activity, adding it to the cache if the policy keeps active members.
+
+        Parameters
+        ----------
+        member: Member
+            The active member. Users outside guilds are ignored.
+        """
+        if self.policy.ttl is None or not isinstance(member, Member):
+            return
+        guild = member.guild
+        if (seen := self._seen.get(guild.id)) is None:
+            seen = self._seen[guild.id] = OrderedDict()
+        seen[member.id] = time.monotonic()
+        seen.move_to_end(member.id)
+        if guild.get_member(member.id) is None:
+            guild._add_member(member)
+        while len(seen) > self.policy.limit:
+            user_id, _ = seen.popitem(last=False)
+            self._remove(guild, user_id)
+
+    async def _on_message(self, message: Message):
+        self.seen(message.author)
+
+    async def _on_interaction(self, interaction: Interaction):
+        self.seen(interaction.user)
+
+    async def _on_member_join(self, member: Member):
+        if not self.policy.keeps(member):
+            self._remove(member.guild, member.id)
+
+    async def _on_member_update(self, before: Member, after: Member):
+        if not self.policy.keeps(after) and after.id not in self._seen.get(after.guild.id, ()):
+            self._remove(after.guild, after.id)
+
+    async def _on_guild_remove(self, guild: Guild):
+        self._seen.pop(guild.id, None)
+        self._chunked_guilds.discard(guild.id)
+
+    def _remove(self, guild: Guild, user_id: int):
+        if user_id == self.bot.user.id or (member := guild.get_member(user_id)) is None:
+            return
+        guild._remove_member(member)
+        self.trimmed += 1
+
+    def trim(self, guild: Guild) -> int:
+        """
+        Removes the members of a guild that the policy doesn't keep.
+
+        Parameters
+        ----------
+        guild: Guild
+            The guild to trim.
+
+        Returns
+        -------
+        int
+            The number of members removed.
+        """
+        if self.policy.name == "full":
+            return 0
+        trimmed = self.trimmed
+        seen = self._seen.get(guild.id)
+        if seen is not None:
+            expired = time.monotonic() - self.policy.ttl
+            while seen and next(iter(seen.values())) < expired:
+                seen.popitem(last=False)
+        for member in list(guild._members.values()):
+            if not self.policy.keeps(member) and (seen is None or member.id not in seen):
+                self._remove(guild, member.id)
+        return self.trimmed - trimmed
+
+    def trim_all(self) -> int:
+        """
+        Trims every guild, see `trim`.
+
+        Returns
+        -------
+        int
+            The number of members removed.
+        """
+        return sum(self.trim(guild) for guild in self.bot.guilds)
+
+    async def ensure_chunked(self, guild: Guild) -> bool:
+        """
+        Requests a guild's members if the policy chunks guilds and it hasn't been chunked yet.
+        Concurrent calls for the same guild share one request.
+
+        Parameters
+        ----------
+        guild: Guild
+            The guild to chunk.
+
+        Returns
+        -------
+        bool
+            Whether the guild's members are cached, as far as the policy keeps them.
+        """
+        if not self.policy.chunk or not self.bot.intents.members:
+            return False
+        if guild.chunked or guild.id in self._chunked_guilds:
+            return True
+        if (task := self._chunking.get(guild.id)) is None:
+            task = self._chunking[guild.id] = asyncio.create_task(self._chunk(guild))
+            task.add_done_callback(lambda _: self._chunking.pop(guild.id, None))
+        return await asyncio.shield(task)
+
+    async def _chunk(self, guild: Guild) -> bool:
+        # The same timeout discord.py uses when chunking at startup.
+        try:
+            await asyncio.wait_for(guild.chunk(), timeout=max(5.0, (guild.member_count or 0) / 10000))
+        except asyncio.TimeoutError:
+            log.warning("Timed out chunking guild %s", guild.id)
+            return False
+        self.chunked += 1
+        if self.policy.name != "full":
+            # Only non-full policies trim, and only they listen for the guild being removed.
+            self._chunked_guilds.add(guild.id)
+            self.trim(guild)
+        return True
+
+    def guild_size(self, guild: Guild) -> dict[str, int]:
+        """
+        Estimates the memory held by a guild's cached members, channels, threads, roles and emojis, in bytes.
+        Each estimate is the mean size of a sample, not following references to shared objects such as users.
+
+        Parameters
+        ----------
+        guild: Guild
+            The guild to measure.
+        """
+        return {
+            "members": _estimate(guild._members.values()),
+            "channels": _estimate(guild._channels.values()),
+            "threads": _estimate(guild._threads.values()),
+            "roles": _estimate(guild._roles.values()),
+            "emojis": _estimate(guild.emojis),
+        }
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the member cache's counters.
+        """
+        return {
+            "guilds": len(self.bot.guilds),
+            "members": sum(len(guild._members) for guild in self.bot.guilds),
+            "member_count": sum(guild.member_count or 0 for guild in self.bot.guilds),
+            "users": len(self.bot.users),
+            "trimmed": self.trimmed,
+            "chunked": self.chunked,
+        }
+
+    def report(self, n: int = 20, *, sample: int = 200) -> str:
+        """
+        Formats the policy, the cache's totals and the guilds using the most memory.
+
+        Only the `sample` guilds with the most cached objects are measured, so the report takes about as long
+        with 100,000 guilds as with a few hundred. The other guilds are estimated from their object counts.
+
+        Parameters
+        ----------
+        n: int
+            The number of guilds to show.
+        sample: int
+            The number of guilds to measure.
+        """
+        stats = self.stats()
+        guilds = self.bot.guilds
+        measured = heapq.nlargest(max(n, sample), guilds, key=_object_count)
+        sizes = [(guild, self.guild_size(guild)) for guild in measured]
+        sizes.sort(key=lambda item: sum(item[1].values()), reverse=True)
+        total = sum(sum(size.values()) for _, size in sizes)
+        if len(measured) < len(guilds):
+            measured_objects = sum(map(_object_count, measured))
+            rest = sum(map(_object_count, guilds)) - measured_objects
+            total += total * rest // max(measured_objects, 1)
+        cached_users = self.bot._connection._users
+        users = _estimate(cached_users.values(), len(cached_users))
+        total += users
+        lines = [
+            f"Policy: {self.policy!r}",
+            f"Members cached: {stats['members']} of {stats['member_count']} in {stats['guilds']} guilds",
+            f"Users cached: {stats['users']}, ~{_mb(users)}",
+            f"Estimated cache size: {_mb(total)} ({len(measured)} of {len(guilds)} guilds measured), RSS {_mb(_rss())}",
+            f"Trimmed: {stats['trimmed']}  Chunked: {stats['chunked']}",
+            "",
+            f"{'members':>9} {'of':>9} {'members':>9} {'channels':>9} {'roles':>9} {'total':>9}  guild (MB)",
+        ]
+        for guild, size in sizes[:n]:
+            lines.append(
+                f"{len(guild._members):>9} {guild.member_count or 0:>9} {size['members'] / 2**20:>9.2f} "
+                f"{(size['channels'] + size['threads']) / 2**20:>9.2f} {size['roles'] / 2**20:>9.2f} "
+                f"{sum(size.values()) / 2**20:>9.2f}  {guild.name} ({guild.id})"
+            )
+        return "\n".join(lines)
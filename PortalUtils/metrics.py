@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from bisect import bisect_left
+from logging import getLogger
+from typing import Callable, Optional
+
+log = getLogger(__name__)
+
+# Upper bounds in seconds, from 100µs to 10s.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    A fixed-bucket latency histogram.
+
+    Parameters
+    ----------
+    buckets: tuple[float, ...]
+        The sorted upper bounds of the buckets, in seconds. Values above the last bound go in an overflow bucket.
+
+    Attributes
+    ----------
+    count: int
+        The number of observations.
+    total: float
+        The sum of all observations.
+    max: float
+        The largest observation.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """
+        Records an observation.
+
+        Parameters
+        ----------
+        value: float
+            The observed value, in seconds.
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        """
+        The mean of all observations.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile from the bucket counts, interpolating linearly within the bucket.
+
+        Parameters
+        ----------
+        q: float
+            The quantile, between 0 and 1.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class CommandMetrics:
+    """
+    The collected metrics for one command.
+
+    Attributes
+    ----------
+    invocations: int
+        The number of times the command finished, successfully or not.
+    errors: int
+        The number of times the command raised an error.
+    latency: Histogram
+        The time from the interaction or message being created to the command finishing.
+    """
+
+    __slots__ = ("invocations", "errors", "latency")
+
+    def __init__(self):
+        self.invocations = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    An in-process registry of per-command metrics, exportable in the Prometheus text format.
+
+    Parameters
+    ----------
+    namespace: str
+        The prefix for every metric name.
+
+    Attributes
+    ----------
+    commands: dict[tuple[str, str], CommandMetrics]
+        The metrics for each command, keyed by kind (`app` or `prefix`) and qualified name.
+    """
+
+    def __init__(self, namespace: str = "portal"):
+        self.namespace = namespace
+        self.commands: dict[tuple[str, str], CommandMetrics] = {}
+        # Gauges and counters read at export, with their type and help text.
+        self._values: dict[str, tuple[str, str, Callable[[], float]]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._runner = None
+
+    def observe(self, kind: str, name: str, latency: float, *, error: bool = False):
+        """
+        Records one finished command.
+
+        Parameters
+        ----------
+        kind: str
+            The kind of command, `app` or `prefix`.
+        name: str
+            The command's qualified name.
+        latency: float
+            The time from the interaction or message being created to the command finishing, in seconds.
+        error: bool
+            Whether the command raised an error.
+        """
+        if (metrics := self.commands.get((kind, name))) is None:
+            metrics = self.commands[kind, name] = CommandMetrics()
+        metrics.invocations += 1
+        metrics.errors += error
+        metrics.latency.observe(latency)
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], float]):
+        """
+        Registers a gauge whose value is read when the metrics are exported.
+
+        Parameters
+        ----------
+        name: str
+            The gauge's name, without the namespace.
+        documentation: str
+            The gauge's help text.
+        func: Callable[[], float]
+            Returns the gauge's current value.
+        """
+        self._values[name] = ("gauge", documentation, func)
+
+    def counter(self, name: str, documentation: str, func: Callable[[], float]):
+        """
+        Registers a counter whose value is read when the metrics are exported.
+        The value must only ever increase, so that Prometheus' `rate` and `increase` work on it.
+
+        Parameters
+        ----------
+        name: str
+            The counter's name, without the namespace. By convention it ends with `_total`.
+        documentation: str
+            The counter's help text.
+        func: Callable[[], float]
+            Returns the counter's current value.
+        """
+        self._values[name] = ("counter", documentation, func)
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_command_invocations_total Finished command invocations.",
+            f"# TYPE {ns}_command_invocations_total counter",
+        ]
+        labels = {key: f'kind="{key[0]}",command="{_escape(key[1])}"' for key in self.commands}
+        lines.extend(f"{ns}_command_invocations_total{{{labels[k]}}} {m.invocations}" for k, m in self.commands.items())
+        lines.append(f"# HELP {ns}_command_errors_total Command invocations that raised an error.")
+        lines.append(f"# TYPE {ns}_command_errors_total counter")
+        lines.extend(f"{ns}_command_errors_total{{{labels[k]}}} {m.errors}" for k, m in self.commands.items())
+        lines.append(f"# HELP {ns}_command_latency_seconds Time from interaction or message creation to completion.")
+        lines.append(f"# TYPE {ns}_command_latency_seconds histogram")
+        for key, m in self.commands.items():
+            h, cumulative = m.latency, 0
+            for bound, n in zip((*h.buckets, "+Inf"), h.counts):
+                cumulative += n
+                lines.append(f'{ns}_command_latency_seconds_bucket{{{labels[key]},le="{bound}"}} {cumulative}')
+            lines.append(f"{ns}_command_latency_seconds_sum{{{labels[key]}}} {h.total}")
+            lines.append(f"{ns}_command_latency_seconds_count{{{labels[key]}}} {h.count}")
+        for name, (kind, documentation, func) in self._values.items():
+            lines.append(f"# HELP {ns}_{name} {documentation}")
+            lines.append(f"# TYPE {ns}_{name} {kind}")
+            lines.append(f"{ns}_{name} {func()}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, n: int = 20) -> str:
+        """
+        Formats the busiest commands, with latency percentiles, as a table.
+
+        Parameters
+        ----------
+        n: int
+            The number of commands to include.
+        """
+        lines = [f"{'calls':>7} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  command"]
+        for (kind, name), m in sorted(self.commands.items(), key=lambda i: i[1].invocations, reverse=True)[:n]:
+            h = m.latency
+            lines.append(
+                f"{m.invocations:>7} {m.errors:>6} {h.quantile(0.5) * 1000:>8.1f} {h.quantile(0.95) * 1000:>8.1f} "
+                f"{h.quantile(0.99) * 1000:>8.1f}  {'/' if kind == 'app' else ''}{name}"
+            )
+        return "\n".join(lines)
+
+    def write(self, path: str, text: Optional[str] = None):
+        """
+        Writes the metrics to a file, for example for node_exporter's textfile collector.
+        The file is replaced atomically.
+
+        Parameters
+        ----------
+        path: str
+            The file to write to.
+        text: str
+            The already rendered metrics. Rendered now if not given.
+        """
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(self.render() if text is None else text)
+        os.replace(f"{path}.tmp", path)
+
+    async def _write_periodically(self, path: str, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Render on the event loop, only the file I/O runs in a thread.
+                await asyncio.to_thread(self.write, path, self.render())
+            except OSError:
+                log.exception("Failed to write metrics to %s", path)
+
+    async def start(
+        self, *, path: Optional[str] = None, port: Optional[int] = None, host: str = "127.0.0.1", interval: float = 15.0
+    ):
+        """
+        Starts exporting the metrics.
+
+        Parameters
+        ----------
+        path: str
+            If given, the file to write the metrics to every `interval` seconds.
+        port: int
+            If given, the port for a local HTTP listener serving the metrics at `/metrics`.
+        host: str
+            The address the HTTP listener binds to.
+        interval: float
+            The number of seconds between file writes.
+        """
+        if path is not None:
+            self._tasks.append(asyncio.create_task(self._write_periodically(path, interval)))
+        if port is not None:
+            from aiohttp import web  # Only needed for the listener, and slow to import.
+
+            async def handler(request: web.Request) -> web.Response:
+                return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+            app = web.Application()
+            app.router.add_get("/metrics", handler)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, host, port).start()
+
+    async def close(self):
+        """
+        Stops exporting the metrics.
+        """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
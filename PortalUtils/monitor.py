@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Any, Awaitable, Callable, NamedTuple, Optional, Union
+
+from .metrics import Histogram
+
+STACK_DEPTH = 20
+
+
+class _StepTimer:
+    # Drives a coroutine and adds up the time spent in each step, which is the time it held the event loop.
+    __slots__ = ("coro", "busy")
+
+    def __init__(self, coro: Awaitable):
+        self.coro = coro
+        self.busy = 0.0
+
+    def __await__(self):
+        it = self.coro.__await__()
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                future = it.throw(error) if error is not None else it.send(value)
+            except StopIteration as e:
+                self.busy += time.perf_counter() - started
+                return e.value
+            except BaseException:
+                self.busy += time.perf_counter() - started
+                raise
+            self.busy += time.perf_counter() - started
+            value, error = None, None
+            try:
+                value = yield future
+            except BaseException as e:
+                error = e
+
+
+class CallbackStats:
+    """
+    The timings of one listener or app command.
+
+    Attributes
+    ----------
+    wall: Histogram
+        The time from the callback starting to finishing, including awaits.
+    busy: Histogram
+        The time the callback held the event loop.
+    slow: int
+        Calls that held the event loop longer than the monitor's threshold.
+    """
+
+    __slots__ = ("wall", "busy", "slow")
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.busy = Histogram()
+        self.slow = 0
+
+
+class Stall(NamedTuple):
+    """
+    A period where the event loop was blocked.
+
+    Attributes
+    ----------
+    at: float
+        When the stall ended, as a Unix timestamp.
+    duration: float
+        How late the lag sampler woke up, in seconds.
+    stack: str
+        The event loop thread's stack while it was blocked, if the watchdog caught it.
+    """
+
+    at: float
+    duration: float
+    stack: str
+
+
+class LoopMonitor:
+    """
+    Watches the event loop for blocking code.
+
+    A sampler task measures how late it wakes up, which is the event loop lag.
+    A watchdog thread checks that the sampler keeps running, and captures the event loop's stack
+    when it's blocked for longer than `threshold`, so the blocking code can be found.
+    Listeners and app commands can be timed with `run`, which records how long each held the event loop.
+
+    Stalls and slow callbacks are written to a rotating log file, along with a periodic `report`.
+
+    Parameters
+    ----------
+    interval: float
+        The number of seconds between lag samples.
+    threshold: float
+        The number of seconds of blocking after which a stall or slow callback is recorded.
+    path: str
+        The log file. `None` disables it.
+    max_bytes: int
+        The size at which the log file is rotated.
+    backups: int
+        The number of rotated log files to keep.
+    report_interval: float
+        The number of seconds between reports written to the log file.
+
+    Attributes
+    ----------
+    lag: Histogram
+        The event loop lag samples.
+    callbacks: dict[str, CallbackStats]
+        The timings of each listener and app command, keyed by event and callback name.
+    stalls: deque[Stall]
+        The latest stalls.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.5,
+        threshold: float = 0.25,
+        path: Optional[str] = "monitor.log",
+        max_bytes: int = 2**20,
+        backups: int = 3,
+        report_interval: float = 300.0,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.report_interval = report_interval
+        self.lag = Histogram()
+        self.callbacks: dict[str, CallbackStats] = {}
+        self.stalls: deque[Stall] = deque(maxlen=20)
+        self.file_log: Optional[logging.Logger] = None
+        self._beat = time.perf_counter()
+        self._stack: Optional[str] = None
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        """
+        Whether the monitor has been started.
+        """
+        return bool(self._tasks)
+
+    def start(self):
+        """
+        Starts the lag sampler, the watchdog thread and the periodic report. Must be called from the event loop.
+        """
+        if self.running:
+            return
+        if self.path is not None and self.file_log is None:
+            self.file_log = logging.getLogger(f"{__name__}.file")
+            self.file_log.propagate = False
+            self.file_log.setLevel(logging.INFO)
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.file_log.addHandler(handler)
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="PortalUtils-loop-watchdog", daemon=True)
+        self._watchdog.start()
+        self._tasks = [asyncio.create_task(self._sample(), name="PortalUtils-loop-lag")]
+        if self.file_log is not None:
+            self._tasks.append(asyncio.create_task(self._write_reports(), name="PortalUtils-loop-report"))
+
+    def close(self):
+        """
+        Stops the monitor and closes the log file.
+        """
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._stop.set()
+        if self.file_log is not None:
+            for handler in self.file_log.handlers[:]:
+                handler.close()
+                self.file_log.removeHandler(handler)
+            self.file_log = None
+
+    async def _sample(self):
+        while True:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - self._beat - self.interval)
+            self.lag.observe(lag)
+            if lag > self.threshold:
+                stall = Stall(time.time(), lag, self._stack or "")
+                self.stalls.append(stall)
+                if self.file_log is not None:
+                    self.file_log.warning(
+                        "Event loop blocked for %.1f ms\n%s", lag * 1000, stall.stack or "(no stack captured)"
+                    )
+            self._stack = None
+
+    def _watch(self):
+        # Runs in its own thread, so it sees the event loop while it's blocked.
+        caught = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            if beat == caught or time.perf_counter() - beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                caught = beat
+                self._stack = "".join(traceback.format_list(traceback.extract_stack(frame)[-STACK_DEPTH:]))
+
+    async def _write_reports(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.file_log.info("Report\n%s", self.report())
+
+    async def run(self, coro: Awaitable, name: Union[str, Callable[[], str]]) -> Any:
+        """
+        Awaits a coroutine and records how long it took and how long it held the event loop.
+
+        Parameters
+        ----------
+        coro: Awaitable
+            The coroutine to run.
+        name: Union[str, Callable[[], str]]
+            The name to record it under, or a function returning it once the coroutine is done.
+        """
+        timer = _StepTimer(coro)
+        started = time.perf_counter()
+        try:
+            return await timer
+        finally:
+            self.observe(name if isinstance(name, str) else name(), time.perf_counter() - started, timer.busy)
+
+    def observe(self, name: str, wall: float, busy: float):
+        """
+        Records the timings of one callback.
+
+        Parameters
+        ----------
+        name: str
+            The event and callback name.
+        wall: float
+            The time from the callback starting to finishing, in seconds.
+        busy: float
+            The time the callback held the event loop, in seconds.
+        """
+        if (stats := self.callbacks.get(name)) is None:
+            stats = self.callbacks[name] = CallbackStats()
+        stats.wall.observe(wall)
+        stats.busy.observe(busy)
+        if busy > self.threshold:
+            stats.slow += 1
+            if self.file_log is not None:
+                self.file_log.warning("%s held the event loop for %.1f ms", name, busy * 1000)
+
+    def report(self, n: int = 20) -> str:
+        """
+        Formats the event loop lag, the number of stalls, and the callbacks that held the event loop longest.
+
+        Parameters
+        ----------
+        n: int
+            The number of callbacks to show.
+        """
+        lag = self.lag
+        lines = [
+            f"Event loop lag: p50 {lag.quantile(0.5) * 1000:.1f} ms, p95 {lag.quantile(0.95) * 1000:.1f} ms, "
+            f"max {lag.max * 1000:.1f} ms over {lag.count} samples",
+            f"Stalls over {self.threshold * 1000:.0f} ms: {len(self.stalls)} recent",
+            "",
+            f"{'calls':>8} {'busy p95':>9} {'busy max':>9} {'wall p95':>9} {'slow':>5}  callback (ms)",
+        ]
+        top = sorted(self.callbacks.items(), key=lambda i: i[1].busy.max, reverse=True)[:n]
+        for name, s in top:
+            lines.append(
+                f"{s.busy.count:>8} {s.busy.quantile(0.95) * 1000:>9.2f} {s.busy.max * 1000:>9.2f} "
+                f"{s.wall.quantile(0.95) * 1000:>9.1f} {s.slow:>5}  {name}"
+            )
+        return "\n".join(lines)
+
+    def stall_report(self) -> str:
+        """
+        Formats the latest stalls with their stacks.
+        """
+        lines = []
+        for stall in reversed(self.stalls):
+            when = time.strftime("%H:%M:%S", time.localtime(stall.at))
+            lines += [f"{when} blocked for {stall.duration * 1000:.1f} ms", stall.stack or "(no stack captured)", ""]
+        return "\n".join(lines) or "No stalls recorded."
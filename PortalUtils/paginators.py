@@ -1,10 +1,28 @@
 from __future__ import annotations
 
-from typing import Literal
+import asyncio
+import json
+import secrets
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Callable, Iterable, Literal, Optional, Sequence
 
-from discord import ButtonStyle, Embed, Interaction, Message, SelectOption, abc, ui
+import aiosqlite
+from discord import ButtonStyle, Colour, Embed, Interaction, Message, SelectOption, abc, ui
+
+from .db import Database
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+log = getLogger(__name__)
 
 PAGE_RELATION = Literal["first"] | Literal["previous"] | Literal["next"] | Literal["last"]
+EMOJIS = {"first": "⏮", "previous": "◀", "next": "▶", "last": "⏭"}
 
 
 class PaginatorButton(ui.Button):
@@ -19,7 +37,7 @@ class PaginatorButton(ui.Button):
         self.f = f
 
     async def callback(self, interaction: Interaction):
-        return await getattr(self.view.paginator, f"show_{self.f}_page")()
+        return await getattr(self.view.paginator, f"show_{self.f}_page")(interaction)
 
 
 class PaginatorButtons(ui.View):
@@ -30,22 +48,35 @@ class PaginatorButtons(ui.View):
     def __init__(self, paginator: Paginator, **kwargs):
         self.paginator = paginator
         super().__init__(**kwargs)
-        mapping: list[tuple[str, PAGE_RELATION, int]] = [
-            ("⏮", "first", 1),
-            ("◀", "previous", self.paginator.current_page - 1),
-            ("▶", "next", self.current_page + 1),
-            ("⏭", "last", self.paginator.num_pages),
-        ]
-        for e, f, p in mapping:
-            self.add_item(PaginatorButton(f, label=str(p), emoji=e, style=ButtonStyle.blurple))
-        self._children.insert(
-            2,
-            ui.Button(
-                label=f"{self.paginator.current_page}/{len(self.paginator.pages)}",
-                style=ButtonStyle.blurple,
-                disabled=True,
-            ),
-        )
+        self.buttons: dict[PAGE_RELATION, PaginatorButton] = {
+            f: PaginatorButton(f, emoji=e, style=ButtonStyle.blurple) for f, e in EMOJIS.items()
+        }
+        self.indicator = ui.Button(style=ButtonStyle.blurple, disabled=True)
+        for item in (*list(self.buttons.values())[:2], self.indicator, *list(self.buttons.values())[2:]):
+            self.add_item(item)
+        self.refresh()
+
+    def refresh(self):
+        """
+        Updates the labels and disabled state of the view's items after the paginator changes page.
+        """
+        current, total = self.paginator.current_page, self.paginator.num_pages
+        for f, page, disabled in (
+            ("first", 1, current <= 1),
+            ("previous", current - 1, current <= 1),
+            ("next", current + 1, current >= total),
+            ("last", total, current >= total),
+        ):
+            self.buttons[f].label = str(page)
+            self.buttons[f].disabled = disabled
+        self.indicator.label = f"{current}/{total}"
+        for item in self.children:
+            if isinstance(item, PaginatorButtonsGoTo.GoTo):
+                item.refresh()
+
+    async def on_timeout(self):
+        if self.paginator.registry is not None:
+            self.paginator.registry.discard(self.paginator)
 
 
 class PaginatorButtonsGoTo(PaginatorButtons):
@@ -58,13 +89,268 @@ class PaginatorButtonsGoTo(PaginatorButtons):
         self.add_item(self.GoTo(self.paginator))
 
     class GoTo(ui.Select):
+        """
+        A select menu to jump to a page.
+        With more pages than a select menu can hold, it lists a window around the current page plus evenly spaced jumps.
+        """
+
+        MAX_OPTIONS = 25
+        WINDOW = 5
+
         def __init__(self, paginator, **kwargs):
             self.paginator = paginator
-            options = [SelectOption(label=str(i), value=i) for i in range(1, self.paginator.num_pages + 1)]
-            super().__init__(placeholder="Go to page...", options=options, **kwargs)
+            super().__init__(placeholder="Go to page...", options=self.build_options(), **kwargs)
+
+        def build_options(self) -> list[SelectOption]:
+            """
+            Builds the page options around the paginator's current page.
+            """
+            total, current = self.paginator.num_pages, self.paginator.current_page
+            if total <= self.MAX_OPTIONS:
+                pages = range(1, total + 1)
+            else:
+                window = set(range(max(1, current - self.WINDOW), min(total, current + self.WINDOW) + 1)) | {1, total}
+                jumps = self.MAX_OPTIONS - len(window)
+                pages = sorted(window | {round(1 + i * (total - 1) / (jumps + 1)) for i in range(1, jumps + 1)})
+                pages = pages[: self.MAX_OPTIONS]
+            return [SelectOption(label=str(i), value=str(i), default=i == current) for i in pages]
+
+        def refresh(self):
+            """
+            Rebuilds the options around the paginator's current page.
+            """
+            self.options = self.build_options()
 
         async def callback(self, interaction: Interaction):
-            await self.paginator.show_page(self.values[0])
+            await self.paginator.show_page(int(self.values[0]), interaction)
+
+
+class PersistentPaginatorButton(
+    ui.DynamicItem[ui.Button],
+    template=r"portal:page:(?P<id>[0-9a-f]+):(?P<f>first|previous|indicator|next|last):(?P<page>[0-9]+)",
+):
+    """
+    A paginator button that keeps working after a restart.
+    Its custom ID holds the paginator ID and the page it moves to, the paginator is looked up in `bot.paginators`.
+    """
+
+    def __init__(self, paginator_id: str, f: PAGE_RELATION | Literal["indicator"], page: int, **kwargs):
+        kwargs.setdefault("label", str(page))
+        super().__init__(
+            ui.Button(
+                custom_id=f"portal:page:{paginator_id}:{f}:{page}",
+                emoji=EMOJIS.get(f),
+                style=ButtonStyle.blurple,
+                **kwargs,
+            )
+        )
+        self.paginator_id = paginator_id
+        self.f = f
+        self.page = page
+
+    @classmethod
+    async def from_custom_id(cls, interaction: Interaction, item: ui.Button, match) -> PersistentPaginatorButton:
+        return cls(match["id"], match["f"], int(match["page"]))
+
+    async def callback(self, interaction: Interaction):
+        registry: Optional[PaginatorRegistry] = getattr(interaction.client, "paginators", None)
+        paginator = await registry.get(self.paginator_id) if registry is not None else None
+        if paginator is None:
+            return await interaction.response.send_message("This paginator has expired.", ephemeral=True)
+        if getattr(paginator, "message", None) is None:
+            paginator.message = interaction.message
+        await paginator.show_page(self.page, interaction)
+
+
+class PersistentPaginatorButtons(ui.View):
+    """
+    A paginator view made of `PersistentPaginatorButton`s, used by `Paginator.send_to` with `persistent=True`.
+    It never times out and isn't kept by discord.py, clicks are routed by custom ID instead.
+    """
+
+    def __init__(self, paginator: Paginator, **kwargs):
+        self.paginator = paginator
+        kwargs["timeout"] = None
+        super().__init__(**kwargs)
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rebuilds the buttons for the paginator's current page, since the target pages are part of their custom IDs.
+        """
+        current, total = self.paginator.current_page, self.paginator.num_pages
+        self.clear_items()
+        for f, page, disabled in (
+            ("first", 1, current <= 1),
+            ("previous", current - 1, current <= 1),
+            ("indicator", current, True),
+            ("next", current + 1, current >= total),
+            ("last", total, current >= total),
+        ):
+            label = f"{current}/{total}" if f == "indicator" else str(page)
+            self.add_item(PersistentPaginatorButton(self.paginator.id, f, page, label=label, disabled=disabled))
+
+
+class PageSource:
+    """
+    The base class for sources that fetch pages on demand, instead of building them all up front.
+
+    Methods
+    -------
+    prepare()
+        Called once before the first page is fetched.
+    get_max_pages() -> int
+        Returns the number of pages.
+    get_page(page: int) -> Any
+        Fetches the raw entries for a page.
+    format_page(paginator: Paginator, entries: Any) -> str | Embed
+        Renders the entries for a page into message content or an embed.
+    """
+
+    async def prepare(self):
+        """
+        Called once before the first page is fetched.
+        """
+        pass
+
+    def get_max_pages(self) -> int:
+        """
+        Returns the number of pages.
+        """
+        raise NotImplementedError
+
+    async def get_page(self, page: int) -> Any:
+        """
+        Fetches the raw entries for a page.
+
+        Parameters
+        ----------
+        page: int
+            The page number, starting at 1.
+        """
+        raise NotImplementedError
+
+    async def format_page(self, paginator: Paginator, entries: Any) -> str | Embed:
+        """
+        Renders the entries for a page. By default, renders them the same way as the paginator renders its own pages.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The paginator the page is being rendered for.
+        entries: Any
+            The entries returned by `get_page`.
+        """
+        return paginator.format_page(list(map(str, entries)))
+
+
+class StaticPageSource(PageSource):
+    """
+    A page source for pages that are already rendered, such as cached embeds.
+
+    Parameters
+    ----------
+    pages: Sequence[str | Embed]
+        The rendered pages. They're sent as they are, so they must not be changed afterwards.
+    """
+
+    def __init__(self, pages: Sequence[str | Embed]):
+        self.pages = pages
+
+    def get_max_pages(self) -> int:
+        return len(self.pages)
+
+    async def get_page(self, page: int) -> str | Embed:
+        return self.pages[page - 1]
+
+    async def format_page(self, paginator: Paginator, entries: str | Embed) -> str | Embed:
+        return entries
+
+
+class QueryPageSource(PageSource):
+    """
+    A page source that runs a keyset-paginated query against an SQLite database.
+
+    Each page is fetched with a `WHERE key > last_key` query, so deep pages cost the same as the first.
+    Jumping to a page that hasn't been seen falls back to an `OFFSET` from the nearest known page.
+
+    Parameters
+    ----------
+    db: Database | aiosqlite.Connection
+        The database to query, usually `bot.db`. Queries on a `Database` use its readers.
+    query: str
+        The `SELECT` statement to paginate. It is used as a subquery, so it must not have its own `ORDER BY` or `LIMIT`.
+    key: str | Sequence[str]
+        The column or columns to order by. Together they must be unique.
+    params: Sequence
+        The parameters for `query`.
+    per_page: int
+        The number of rows per page.
+    descending: bool
+        Whether to order by `key` descending.
+    formatter: Callable[[tuple], str]
+        Converts a row to a line. Defaults to `str`.
+    """
+
+    def __init__(
+        self,
+        db,
+        query: str,
+        *,
+        key: str | Sequence[str],
+        params: Sequence = (),
+        per_page: int = 10,
+        descending: bool = False,
+        formatter: Callable[[tuple], str] = str,
+    ):
+        self.db = db
+        self.query = query
+        self.key = (key,) if isinstance(key, str) else tuple(key)
+        self.params = tuple(params)
+        self.per_page = per_page
+        self.descending = descending
+        self.formatter = formatter
+        self.total = 0
+        self._anchors: dict[int, tuple] = {}
+        self._key_indexes: tuple[int, ...] = ()
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        # A reader from the pool, so page queries don't queue behind writes. Plain connections are used as is.
+        if isinstance(self.db, Database):
+            async with self.db.read() as conn:
+                yield conn
+        else:
+            yield self.db
+
+    async def prepare(self):
+        async with self._connection() as conn, conn.execute(f"SELECT COUNT(*) FROM ({self.query})", self.params) as cur:
+            (self.total,) = await cur.fetchone()
+
+    def get_max_pages(self) -> int:
+        return max(1, -(-self.total // self.per_page))
+
+    async def get_page(self, page: int) -> list[tuple]:
+        cols = ", ".join(self.key)
+        order = ", ".join(f"{k} {'DESC' if self.descending else 'ASC'}" for k in self.key)
+        # Nearest page at or before the target whose starting key is known.
+        start = max((p for p in self._anchors if p <= page), default=1)
+        sql, params = f"SELECT * FROM ({self.query})", self.params
+        if start > 1:
+            sql += f" WHERE ({cols}) {'<' if self.descending else '>'} ({', '.join('?' * len(self.key))})"
+            params += self._anchors[start]
+        sql += f" ORDER BY {order} LIMIT {self.per_page} OFFSET {(page - start) * self.per_page}"
+        async with self._connection() as conn, conn.execute(sql, params) as cur:
+            rows = await cur.fetchall()
+            if not self._key_indexes:
+                names = [d[0] for d in cur.description]
+                self._key_indexes = tuple(names.index(k) for k in self.key)
+        if rows:
+            self._anchors[page + 1] = tuple(rows[-1][i] for i in self._key_indexes)
+        return rows
+
+    async def format_page(self, paginator: Paginator, entries: list[tuple]) -> str | Embed:
+        return paginator.format_page(list(map(self.formatter, entries)))
 
 
 class Paginator:
@@ -81,6 +367,21 @@ class Paginator:
         The maximum length of the message content.
     timeout: float
         The timeout for the paginator.
+    source: PageSource
+        Fetches pages on demand instead of using the lines added to the paginator.
+    cache_size: int
+        The number of rendered pages to keep.
+    prefetch: bool
+        Whether to render the pages next to the current page in the background.
+
+    Attributes
+    ----------
+    id: str
+        The paginator's ID in its registry, set when it's sent.
+    registry: PaginatorRegistry
+        The registry tracking the paginator, usually `bot.paginators`.
+    persistent: bool
+        Whether the paginator was sent with `persistent=True`.
     """
 
     def __init__(
@@ -90,76 +391,398 @@ class Paginator:
         delimiter: str = "\n",
         max_len: int = 2000,
         timeout: float = 180.0,
+        source: Optional[PageSource] = None,
+        cache_size: int = 8,
+        prefetch: bool = False,
     ):
         self.current_page = 1
+        self.num_lines = num_lines
         self.max_len = max_len
         self.delimiter = delimiter
+        self.timeout = timeout
         self.message: Message
-        self.page: list[list[str]] = [[]]
         self.is_embed: bool = False
+        self.source = source
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        self.view: Optional[PaginatorButtons | PersistentPaginatorButtons] = None
+        self.id: Optional[str] = None
+        self.registry: Optional[PaginatorRegistry] = None
+        self.persistent = False
+        self.last_used = time.monotonic()
+        # The size last counted in the registry's total.
+        self._size = 0
+        # Full pages are kept as one string with the start offset of each page, instead of a list of lines per page.
+        # Each page is joined when it fills up, and appended to the string when a page is first read.
+        self._text = ""
+        self._offsets = array("I")
+        self._closed: list[str] = []
+        # The lines on the last page, which may still grow.
+        self._lines: list[str] = []
+        self._page_len = 0
+        self._cache: OrderedDict[int, str | Embed] = OrderedDict()
+        self._rendering: dict[int, asyncio.Task] = {}
+        # Strong references to prefetches, the event loop only keeps weak ones.
+        self._prefetching: set[asyncio.Task] = set()
+        # The latest requested page, and the click to answer once it's shown, for coalescing rapid clicks.
+        self._target = 1
+        self._flipping = False
+        self._latest_interaction: Optional[Interaction] = None
+
+    @property
+    def num_pages(self) -> int:
+        """
+        The number of pages in the paginator.
+        """
+        if self.source is not None:
+            return self.source.get_max_pages()
+        return len(self._offsets) + len(self._closed) + 1
+
+    @property
+    def pages(self) -> list[list[str]]:
+        """
+        The lines on each page. Built on every access, prefer `page_lines`.
+        """
+        return [self.page_lines(page) for page in range(1, len(self._offsets) + len(self._closed) + 2)]
+
+    def _compact(self):
+        if self._closed:
+            start = len(self._text)
+            for page in self._closed:
+                self._offsets.append(start)
+                start += len(page)
+            self._text += "".join(self._closed)
+            self._closed.clear()
+
+    def page_text(self, page: int) -> str:
+        """
+        Returns a page's lines joined with the delimiter.
+
+        Parameters
+        ----------
+        page: int
+            The page number, starting at 1.
+        """
+        self._compact()
+        if page > len(self._offsets):
+            return self.delimiter.join(self._lines)
+        end = self._offsets[page] if page < len(self._offsets) else len(self._text)
+        return self._text[self._offsets[page - 1] : end]
+
+    def page_lines(self, page: int) -> list[str]:
+        """
+        Returns the lines on a page. Lines that contain the delimiter come back split.
+
+        Parameters
+        ----------
+        page: int
+            The page number, starting at 1.
+        """
+        text = self.page_text(page)
+        return text.split(self.delimiter) if text else []
 
     def add_line(self, line: str):
         """
         Add a line to the paginator.
+        Starts a new page when the current one is full, either by line count or by length.
+        Lines longer than `max_len` are split across pages.
 
         Parameters
         ----------
         line: str
             The line to add.
         """
-        if sum(map(len, self.pages)) + len(line) > self.max_len:
-            self.pages.append([line])
+        if len(line) > self.max_len:
+            for i in range(0, len(line), self.max_len):
+                self.add_line(line[i : i + self.max_len])
+            return
+        lines = self._lines
+        size = len(line) + len(self.delimiter) if lines else len(line)
+        growth = sys.getsizeof(line)
+        if lines and (len(lines) >= self.num_lines or self._page_len + size > self.max_len):
+            page = self.delimiter.join(lines)
+            if self.registry is not None:
+                growth += sys.getsizeof(page) - sum(map(sys.getsizeof, lines))
+            self._closed.append(page)
+            self._lines = [line]
+            self._page_len = len(line)
+        else:
+            lines.append(line)
+            self._page_len += size
+        if self.registry is not None:
+            self.registry.resize(self, growth)
+
+    async def add_lines(self, lines: Iterable[Any] | AsyncIterable[Any], *, formatter: Callable[[Any], str] = str):
+        """
+        Add lines to the paginator from a sync or async iterable, such as an `aiosqlite` cursor.
+        Pages are cut as the lines arrive, so the results never need to be collected into a list first.
+
+        Parameters
+        ----------
+        lines: Iterable | AsyncIterable
+            The lines to add.
+        formatter: Callable[[Any], str]
+            Converts each item to a line. Defaults to `str`.
+        """
+        if hasattr(lines, "__aiter__"):
+            async for line in lines:
+                self.add_line(formatter(line))
+        else:
+            for line in lines:
+                self.add_line(formatter(line))
+
+    def format_page(self, lines: list[str]) -> str | Embed:
+        """
+        Renders a page's lines into message content.
+
+        Parameters
+        ----------
+        lines: list[str]
+            The lines on the page.
+        """
+        return self.delimiter.join(lines)
+
+    async def _render(self, page: int) -> str | Embed:
+        if self.source is None:
+            return self.format_page(self.page_lines(page))
+        return await self.source.format_page(self, await self.source.get_page(page))
+
+    async def get_page(self, page: int) -> str | Embed:
+        """
+        Returns a rendered page, rendering it only if it isn't cached.
+
+        Parameters
+        ----------
+        page: int
+            The page to get.
+        """
+        if page in self._cache:
+            self._cache.move_to_end(page)
+            return self._cache[page]
+        if page not in self._rendering:
+            self._rendering[page] = asyncio.ensure_future(self._render(page))
+        try:
+            rendered = await asyncio.shield(self._rendering[page])
+        finally:
+            self._rendering.pop(page, None)
+        self._cache[page] = rendered
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        if self.registry is not None:
+            self.registry.resize(self)
+        return rendered
+
+    def _prefetch(self):
+        for page in (self.current_page + 1, self.current_page - 1):
+            if 1 <= page <= self.num_pages and page not in self._cache and page not in self._rendering:
+                task = asyncio.create_task(self.get_page(page))
+                self._prefetching.add(task)
+                task.add_done_callback(self._prefetching.discard)
+
+    @staticmethod
+    def _message_kwargs(rendered: str | Embed) -> dict:
+        return {"embed": rendered} if isinstance(rendered, Embed) else {"content": rendered}
+
+    async def _edit(self, interaction: Optional[Interaction], **kwargs):
+        if interaction is None:
+            await self.message.edit(**kwargs)
+        elif not interaction.response.is_done():
+            # Acknowledges the click and edits the message in a single request.
+            await interaction.response.edit_message(**kwargs)
         else:
-            self.pages[-1].append(line)
+            await interaction.edit_original_response(**kwargs)
+
+    def memory_size(self) -> int:
+        """
+        Estimates the memory held by the paginator's lines and rendered pages, in bytes.
+        """
+        size = sys.getsizeof(self._text) + len(self._offsets) * self._offsets.itemsize
+        size += sum(map(sys.getsizeof, self._closed)) + sum(map(sys.getsizeof, self._lines))
+        for rendered in self._cache.values():
+            text = rendered if isinstance(rendered, str) else rendered.description or ""
+            size += sys.getsizeof(text)
+        return size
+
+    def release(self):
+        """
+        Drops the paginator's pages and stops its view, called when its registry evicts it.
+        A persistent paginator is reloaded from the database on the next click instead.
+        """
+        self._cache.clear()
+        self._text, self._offsets, self._closed, self._lines = "", array("I"), [], []
+        if self.view is not None:
+            self.view.stop()
+
+    def _options(self) -> str:
+        options = {"num_lines": self.num_lines, "delimiter": self.delimiter, "max_len": self.max_len}
+        if self.is_embed:
+            options["embed_kwargs"] = self.embed_kwargs
+        return json.dumps(options, default=_rebuildable)
+
+    def to_state(self) -> tuple[str, str, bytes, str]:
+        """
+        Returns what's needed to rebuild the paginator: its kind, text, page offsets and options as JSON.
+        Raises `TypeError` if an embed kwarg can't be stored, see `send_to`.
+        """
+        options = self._options()
+        self._compact()
+        offsets = array("I", self._offsets)
+        offsets.append(len(self._text))
+        return (
+            "embed" if self.is_embed else "text",
+            self._text + self.delimiter.join(self._lines),
+            offsets.tobytes(),
+            options,
+        )
+
+    @staticmethod
+    def from_state(kind: str, text: str, offsets: bytes, options: str, *, embed_cls: type[Embed] = Embed) -> Paginator:
+        """
+        Rebuilds a paginator from `to_state`, as a plain `Paginator` or `EmbedPaginator`.
 
-    async def show_page(self, page: int):
+        Parameters
+        ----------
+        kind: str
+            `"text"` or `"embed"`.
+        text: str
+            The joined lines.
+        offsets: bytes
+            The page start offsets.
+        options: str
+            The paginator's options as JSON.
+        embed_cls: type[Embed]
+            The embed class for embed paginators.
+        """
+        options = json.loads(options)
+        if kind == "embed":
+            paginator = EmbedPaginator(embed_cls=embed_cls, **options)
+        else:
+            paginator = Paginator(**options)
+        paginator._offsets.frombytes(offsets)
+        # The last page goes back to being a list of lines, so more lines can be added to it.
+        last = paginator._offsets.pop()
+        paginator._text, paginator._page_len = text[:last], len(text) - last
+        paginator._lines = text[last:].split(paginator.delimiter) if paginator._page_len else []
+        return paginator
+
+    async def show_page(self, page: int, interaction: Optional[Interaction] = None):
         """
         Show a specific page in the paginator.
 
+        Clicks that arrive while a page is being shown are acknowledged right away and coalesced:
+        only the latest requested page is rendered and shown once the current one is done.
+
         Parameters
         ----------
         page: int
             The page to show.
+        interaction: Interaction
+            The component interaction that requested the page, answered by editing its message.
         """
-        self.current_page = page
-        k = "embed" if self.is_embed else "content"
-        await self.message.edit(**{k: self.pages[self.current_page - 1]})
+        self._target = max(1, min(page, self.num_pages))
+        if self.registry is not None:
+            self.registry.touch(self)
+        if self._flipping:
+            if interaction is not None:
+                await interaction.response.defer()
+                self._latest_interaction = interaction
+            return
+        self._flipping = True
+        try:
+            while True:
+                target = self._target
+                rendered = await self.get_page(target)
+                if self._target != target:
+                    continue  # A newer page was requested while rendering
+                self.current_page = target
+                kwargs = self._message_kwargs(rendered)
+                if self.view is not None:
+                    self.view.refresh()
+                    kwargs["view"] = self.view
+                await self._edit(interaction, **kwargs)
+                if self._target == target:
+                    break
+                interaction, self._latest_interaction = self._latest_interaction, None
+        finally:
+            self._flipping = False
+            self._latest_interaction = None
+        if self.prefetch:
+            self._prefetch()
 
-    async def show_next_page(self):
+    async def show_next_page(self, interaction: Optional[Interaction] = None):
         """
-        Show the next page in the paginator.
+        Show the page after the last requested one.
         """
-        await self.show_page(self.current_page + 1)
+        await self.show_page(self._target + 1, interaction)
 
-    async def show_previous_page(self):
+    async def show_previous_page(self, interaction: Optional[Interaction] = None):
         """
-        Show the previous page in the paginator.
+        Show the page before the last requested one.
         """
-        await self.show_page(self.current_page - 1)
+        await self.show_page(self._target - 1, interaction)
 
-    async def show_first_page(self):
+    async def show_first_page(self, interaction: Optional[Interaction] = None):
         """
         Show the first page in the paginator.
         """
-        await self.show_page(1)
+        await self.show_page(1, interaction)
 
-    async def show_last_page(self):
+    async def show_last_page(self, interaction: Optional[Interaction] = None):
         """
         Show the last page in the paginator.
         """
-        await self.show_page(len(self.pages))
+        await self.show_page(self.num_pages, interaction)
 
-    async def send_to(self, destination: abc.Messageable):
+    async def send_to(
+        self,
+        destination: abc.Messageable,
+        *,
+        view_cls: type[PaginatorButtons] = PaginatorButtons,
+        persistent: bool = False,
+        registry: Optional[PaginatorRegistry] = None,
+    ):
         """
         Send the paginator to a messageable.
+        Only the first page is rendered, the others are rendered when they are shown.
 
         Parameters
         ----------
         destination: discord.abc.Messageable
             The channel to send the paginator to.
+        view_cls: type[PaginatorButtons]
+            The view to attach. Use `PaginatorButtonsGoTo` to add a page selector.
+        persistent: bool
+            Whether to store the paginator in the database, so its buttons keep working after a restart.
+            `view_cls` and `timeout` are ignored. Paginators with a `source` can't be persistent,
+            and subclasses are restored as a plain `Paginator` or `EmbedPaginator`.
+            Embed kwargs must be JSON values or colors, anything else raises `TypeError`.
+        registry: PaginatorRegistry
+            The registry to track the paginator in. Defaults to the bot's `paginators`, if it can be found.
         """
-        self.pages = [self.delimiter.join(page) for page in self.pages]
-        self.message = await destination.send(content=self.delimiter.join(self.pages[0]), view=PaginatorButtons(self))
+        if registry is None:
+            # Not `or`, an empty registry is falsy.
+            registry = _registry_for(destination)
+        if persistent:
+            if self.source is not None:
+                raise ValueError("Paginators with a source can't be persistent")
+            if registry is None or not registry.can_persist:
+                raise RuntimeError("Persistent paginators need a bot with an active DB connection")
+            # Fails before anything is registered or sent.
+            self._options()
+        if self.source is not None:
+            await self.source.prepare()
+        self.current_page = self._target = 1
+        if registry is not None:
+            registry.register(self)
+        if persistent:
+            self.persistent = True
+            await registry.save(self)
+            self.view = PersistentPaginatorButtons(self)
+        else:
+            self.view = view_cls(self, timeout=self.timeout)
+        self.message = await destination.send(**self._message_kwargs(await self.get_page(1)), view=self.view)
+        if self.prefetch:
+            self._prefetch()
         return self.message
 
 
@@ -177,21 +800,306 @@ class EmbedPaginator(Paginator):
         timeout: float = 180.0,
         embed_cls: Embed = Embed,
         embed_kwargs: dict = None,
+        **kwargs,
     ):
-        super().__init__(num_lines, delimiter=delimiter, max_len=max_len, timeout=timeout)
+        super().__init__(num_lines, delimiter=delimiter, max_len=max_len, timeout=timeout, **kwargs)
         self.is_embed = True
         self.embed_cls = embed_cls
         self.embed_kwargs = embed_kwargs or {}
 
-    async def send_to(self, channel: abc.Messageable):
+    def format_page(self, lines: list[str]) -> Embed:
         """
-        Send the paginator to a messageable.
+        Renders a page's lines into an embed.
 
         Parameters
         ----------
-        channel: discord.abc.Messageable
-            The channel to send the paginator to.
+        lines: list[str]
+            The lines on the page.
         """
-        self.pages = [self.embed_cls(description=self.delimiter.join(page), **self.embed_kwargs) for page in self.pages]
-        self.message = await channel.send(embed=self.pages[0])
-        return self.message
+        return self.embed_cls(description=self.delimiter.join(lines), **self.embed_kwargs)
+
+
+def _rebuildable(value: Any) -> Any:
+    # Embed kwargs are stored as JSON. Colors are rebuilt from their value, anything else would come back as a string.
+    if isinstance(value, Colour):
+        return value.value
+    raise TypeError(f"Can't store {type(value).__name__} in a persistent paginator's embed kwargs")
+
+
+def _registry_for(destination: abc.Messageable) -> Optional[PaginatorRegistry]:
+    # Contexts have the bot, channels and users only have their connection state.
+    client = getattr(destination, "bot", None)
+    if client is None and (state := getattr(destination, "_state", None)) is not None:
+        client = state._get_client()
+    return getattr(client, "paginators", None)
+
+
+class PaginatorRegistry:
+    """
+    Tracks the bot's live paginators and keeps the memory they hold within a budget.
+
+    Paginators are registered when they're sent. When their total `memory_size` goes over `budget`,
+    the least recently used are evicted, and a background sweep evicts any left unused for `idle_timeout` seconds.
+    Evicting a persistent paginator only drops it from memory, it's reloaded from the database on its next click.
+    Evicting any other paginator stops its view, like a timeout.
+
+    Persistent paginators are stored in the `portal_paginators` table of `bot.db`,
+    and deleted once they've gone unused for `retention` seconds.
+
+    Parameters
+    ----------
+    bot: Bot
+        The bot the paginators belong to.
+    budget: int
+        The memory budget for all paginators, in bytes.
+    idle_timeout: float
+        The number of seconds after which an unused paginator is evicted.
+    retention: float
+        The number of seconds an unused persistent paginator is kept in the database.
+    sweep_interval: float
+        The number of seconds between sweeps.
+
+    Attributes
+    ----------
+    evicted: int
+        Paginators evicted from memory.
+    restored: int
+        Persistent paginators loaded back from the database.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS portal_paginators ("
+        "id TEXT PRIMARY KEY, kind TEXT NOT NULL, text TEXT NOT NULL, offsets BLOB NOT NULL, "
+        "options TEXT NOT NULL, last_used REAL NOT NULL)"
+    )
+
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        budget: int = 64 * 2**20,
+        idle_timeout: float = 900.0,
+        retention: float = 30 * 86400.0,
+        sweep_interval: float = 60.0,
+    ):
+        self.bot = bot
+        self.budget = budget
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        self.restored = 0
+        self.can_persist = False
+        self._live: OrderedDict[str, Paginator] = OrderedDict()
+        # The sum of the live paginators' sizes, kept as they're registered, discarded and grow.
+        self._total = 0
+        self._loading: dict[str, asyncio.Task] = {}
+        self._last_sweep = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    async def start(self):
+        """
+        Creates the paginator table if the bot has a database, and starts the background sweep.
+        """
+        if hasattr(self.bot, "db"):
+            async with self.bot.db.transaction() as conn:
+                await conn.execute(self.SCHEMA)
+            self.bot.add_dynamic_items(PersistentPaginatorButton)
+            self.can_persist = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="PortalUtils-paginator-sweep")
+
+    def close(self):
+        """
+        Stops the background sweep.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def register(self, paginator: Paginator):
+        """
+        Starts tracking a paginator, giving it an ID, and evicts others if this goes over the budget.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The paginator to track.
+        """
+        if paginator.id is None:
+            paginator.id = secrets.token_hex(8)
+        paginator.registry = self
+        paginator.last_used = time.monotonic()
+        if (old := self._live.get(paginator.id)) is not paginator:
+            if old is not None:
+                self.discard(old)
+            self._live[paginator.id] = paginator
+        self._live.move_to_end(paginator.id)
+        self.resize(paginator)
+
+    def resize(self, paginator: Paginator, delta: Optional[int] = None):
+        """
+        Updates the total after a live paginator grew, and evicts others if this goes over the budget.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The paginator that changed.
+        delta: int
+            The change in bytes, if known. Otherwise the paginator is measured again.
+        """
+        if self._live.get(paginator.id) is not paginator:
+            return
+        size = paginator._size + delta if delta is not None else paginator.memory_size()
+        self._total += size - paginator._size
+        paginator._size = size
+        self.enforce_budget()
+
+    def touch(self, paginator: Paginator):
+        """
+        Marks a paginator as just used.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The paginator that was used.
+        """
+        paginator.last_used = time.monotonic()
+        if paginator.id in self._live:
+            self._live.move_to_end(paginator.id)
+
+    def discard(self, paginator: Paginator):
+        """
+        Stops tracking a paginator without releasing it.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The paginator to forget.
+        """
+        if self._live.get(paginator.id) is paginator:
+            del self._live[paginator.id]
+            self._total -= paginator._size
+            paginator._size = 0
+
+    def evict(self, paginator: Paginator):
+        """
+        Stops tracking a paginator and releases its pages.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The paginator to evict.
+        """
+        self.discard(paginator)
+        paginator.release()
+        self.evicted += 1
+
+    def memory_size(self) -> int:
+        """
+        The estimated memory held by all live paginators, in bytes, as of their last change.
+        """
+        return self._total
+
+    def enforce_budget(self):
+        """
+        Evicts the least recently used paginators until the total is within the budget.
+        The most recently used paginator is always kept.
+        """
+        while self._total > self.budget and len(self._live) > 1:
+            self.evict(next(iter(self._live.values())))
+
+    async def save(self, paginator: Paginator):
+        """
+        Stores a paginator in the database, so it can be reloaded after being evicted or after a restart.
+
+        Parameters
+        ----------
+        paginator: Paginator
+            The registered paginator to store.
+        """
+        if not self.can_persist:
+            raise RuntimeError("Bot has no active DB connection")
+        async with self.bot.db.transaction() as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO portal_paginators (id, kind, text, offsets, options, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (paginator.id, *paginator.to_state(), time.time()),
+            )
+
+    async def get(self, paginator_id: str) -> Optional[Paginator]:
+        """
+        Returns a live paginator, or loads a persistent one from the database.
+        Concurrent clicks on an unloaded paginator share a single load.
+
+        Parameters
+        ----------
+        paginator_id: str
+            The paginator's ID.
+        """
+        if (paginator := self._live.get(paginator_id)) is not None:
+            return paginator
+        if not self.can_persist:
+            return None
+        if paginator_id not in self._loading:
+            self._loading[paginator_id] = asyncio.ensure_future(self._load(paginator_id))
+        try:
+            return await asyncio.shield(self._loading[paginator_id])
+        finally:
+            self._loading.pop(paginator_id, None)
+
+    async def _load(self, paginator_id: str) -> Optional[Paginator]:
+        row = await self.bot.db.fetchone(
+            "SELECT kind, text, offsets, options FROM portal_paginators WHERE id = ?", (paginator_id,)
+        )
+        if row is None:
+            return None
+        paginator = Paginator.from_state(*row, embed_cls=getattr(self.bot, "Embed", Embed))
+        paginator.id = paginator_id
+        paginator.persistent = True
+        paginator.view = PersistentPaginatorButtons(paginator)
+        self.register(paginator)
+        self.restored += 1
+        return paginator
+
+    async def sweep(self):
+        """
+        Evicts idle paginators, records when persistent ones were last used, and deletes expired ones.
+        """
+        now, wall = time.monotonic(), time.time()
+        used = []
+        for paginator in list(self._live.values()):
+            if now - paginator.last_used > self.idle_timeout:
+                self.evict(paginator)
+            elif paginator.persistent and paginator.last_used > self._last_sweep:
+                used.append(paginator.id)
+        self._last_sweep = now
+        if not self.can_persist:
+            return
+        for paginator_id in used:
+            await self.bot.queue_write("UPDATE portal_paginators SET last_used = ? WHERE id = ?", (wall, paginator_id))
+        await self.bot.queue_write("DELETE FROM portal_paginators WHERE last_used < ?", (wall - self.retention,))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                log.exception("Paginator sweep failed")
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the registry's counters.
+        """
+        return {
+            "live": len(self._live),
+            "persistent": sum(p.persistent for p in self._live.values()),
+            "bytes": self.memory_size(),
+            "budget": self.budget,
+            "evicted": self.evicted,
+            "restored": self.restored,
+        }
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from logging import getLogger
+from typing import Any, AsyncIterator, Iterable, NamedTuple, Optional
+
+from aiosqlite import Cursor
+from aiosqlite.context import contextmanager
+
+from .db import Database
+from .metrics import Histogram
+
+log = getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_IN_LISTS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """
+    Normalizes a statement so that statements differing only in literals or whitespace are grouped together.
+
+    Parameters
+    ----------
+    sql: str
+        The statement to normalize.
+    """
+    sql = _WHITESPACE.sub(" ", _LITERALS.sub("?", sql)).strip()
+    return _IN_LISTS.sub("IN (?, ...)", sql)
+
+
+class StatementStats:
+    """
+    The collected statistics for one normalized statement.
+
+    Attributes
+    ----------
+    sql: str
+        The normalized statement.
+    latency: Histogram
+        The statement's latency histogram. For writes outside a transaction,
+        this includes the time spent waiting for the writer behind other transactions.
+    rows: int
+        The total number of rows read or written.
+    errors: int
+        The number of times the statement raised an error.
+    """
+
+    __slots__ = ("sql", "latency", "rows", "errors")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.latency = Histogram()
+        self.rows = 0
+        self.errors = 0
+
+
+class SlowQuery(NamedTuple):
+    """
+    A statement that ran longer than the slow query threshold.
+    """
+
+    timestamp: float
+    sql: str
+    parameters: tuple
+    duration: float
+    plan: str
+
+
+class QueryStats:
+    """
+    Collects per-statement latency and row counts, and keeps a log of slow statements.
+
+    Parameters
+    ----------
+    slow_threshold: float
+        The number of seconds after which a statement is logged as slow.
+    slow_log_size: int
+        The number of slow statements to keep.
+
+    Attributes
+    ----------
+    statements: dict[str, StatementStats]
+        The statistics for each normalized statement.
+    slow_queries: deque[SlowQuery]
+        The most recent slow statements, with their query plans where one was captured.
+    """
+
+    def __init__(self, *, slow_threshold: float = 0.1, slow_log_size: int = 100):
+        self.slow_threshold = slow_threshold
+        self.statements: dict[str, StatementStats] = {}
+        self.slow_queries: deque[SlowQuery] = deque(maxlen=slow_log_size)
+
+    def record(self, sql: str, duration: float, rows: int = 0, *, error: bool = False) -> StatementStats:
+        """
+        Records one execution of a statement.
+
+        Parameters
+        ----------
+        sql: str
+            The statement as executed.
+        duration: float
+            How long the statement took, in seconds.
+        rows: int
+            The number of rows read or written.
+        error: bool
+            Whether the statement raised an error.
+        """
+        key = normalize_sql(sql)
+        if (stats := self.statements.get(key)) is None:
+            stats = self.statements[key] = StatementStats(key)
+        stats.latency.observe(duration)
+        stats.rows += max(rows, 0)
+        stats.errors += error
+        return stats
+
+    def reset(self):
+        """
+        Clears all collected statistics.
+        """
+        self.statements.clear()
+        self.slow_queries.clear()
+
+    def top(self, n: int = 10, *, key: str = "total") -> list[StatementStats]:
+        """
+        Returns the top statements.
+
+        Parameters
+        ----------
+        n: int
+            The number of statements to return.
+        key: str
+            What to sort by: `total`, `count`, `mean`, `max` or `rows`.
+        """
+        sort = {
+            "total": lambda s: s.latency.total,
+            "count": lambda s: s.latency.count,
+            "mean": lambda s: s.latency.mean,
+            "max": lambda s: s.latency.max,
+            "rows": lambda s: s.rows,
+        }[key]
+        return sorted(self.statements.values(), key=sort, reverse=True)[:n]
+
+    def report(self, n: int = 10, *, key: str = "total") -> str:
+        """
+        Formats the top statements as a table.
+
+        Parameters
+        ----------
+        n: int
+            The number of statements to include.
+        key: str
+            What to sort by, see `top`.
+        """
+        lines = [f"{'total ms':>10} {'calls':>7} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} {'rows':>8}  statement"]
+        for s in self.top(n, key=key):
+            h = s.latency
+            lines.append(
+                f"{h.total * 1000:>10.1f} {h.count:>7} {h.mean * 1000:>8.2f} {h.quantile(0.95) * 1000:>8.2f} "
+                f"{h.max * 1000:>8.2f} {s.rows:>8}  {s.sql[:200]}" + (f" ({s.errors} errors)" if s.errors else "")
+            )
+        if self.slow_queries:
+            lines.append("")
+            lines.append(f"Slow queries (> {self.slow_threshold * 1000:g} ms, most recent first):")
+            for q in list(self.slow_queries)[: -n - 1 : -1]:
+                lines.append(f"{q.duration * 1000:.1f} ms  {q.sql[:200]}")
+                lines.extend(f"    {line}" for line in q.plan.splitlines())
+        return "\n".join(lines)
+
+
+class InstrumentedDatabase(Database):
+    """
+    A `Database` that records statement latency and row counts in a `QueryStats`.
+
+    Statements slower than the threshold are logged with their `EXPLAIN QUERY PLAN` output,
+    which is captured in the background on a reader. Each normalized statement is explained at most once
+    per `explain_interval`, later slow runs are added to the slow query log without a plan.
+
+    Write latency is measured from the call, so it includes any wait for the writer lock.
+    A write that is only slow behind a long transaction shows up as slow here too.
+
+    Parameters
+    ----------
+    *args
+        See `Database`.
+    slow_threshold: float
+        The number of seconds after which a statement is logged as slow.
+    explain_interval: float
+        The minimum number of seconds between query plans for the same normalized statement.
+    max_explains: int
+        The maximum number of query plans captured at once.
+    **kwargs
+        See `Database`.
+
+    Attributes
+    ----------
+    stats: QueryStats
+        The collected statistics.
+    """
+
+    def __init__(
+        self, *args, slow_threshold: float = 0.1, explain_interval: float = 60.0, max_explains: int = 2, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.stats = QueryStats(slow_threshold=slow_threshold)
+        self.explain_interval = explain_interval
+        self.max_explains = max_explains
+        self._explaining: set[asyncio.Task] = set()
+        # When each normalized statement was last explained.
+        self._explained: dict[str, float] = {}
+
+    def _record(self, sql: str, parameters: Any, start: float, rows: int = 0, *, error: bool = False):
+        duration = time.perf_counter() - start
+        self.stats.record(sql, duration, rows, error=error)
+        if duration < self.stats.slow_threshold or error:
+            return
+        key, now = normalize_sql(sql), time.monotonic()
+        if (
+            len(self._explaining) >= self.max_explains
+            or now - self._explained.get(key, -math.inf) < self.explain_interval
+        ):
+            params = tuple(parameters) if isinstance(parameters, (list, tuple)) else ()
+            self.stats.slow_queries.append(SlowQuery(time.time(), sql, params, duration, ""))
+        else:
+            self._explained[key] = now
+            task = asyncio.create_task(self._log_slow(sql, parameters, duration))
+            self._explaining.add(task)
+            task.add_done_callback(self._explaining.discard)
+
+    async def _log_slow(self, sql: str, parameters: Any, duration: float):
+        params = tuple(parameters) if isinstance(parameters, (list, tuple)) else ()
+        try:
+            async with self.read() as conn, conn.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cur:
+                plan = "\n".join(f"{'  ' * (row[1] > 0)}{row[3]}" for row in await cur.fetchall())
+        except Exception as e:
+            plan = f"(no plan: {e})"
+        log.warning("Slow query (%.1f ms): %s\n%s", duration * 1000, normalize_sql(sql), plan)
+        self.stats.slow_queries.append(SlowQuery(time.time(), sql, params, duration, plan))
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[InstrumentedDatabase]:
+        # Yield the pool instead of the raw writer so statements in the transaction are recorded too.
+        async with super().transaction():
+            yield self
+
+    @contextmanager
+    async def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> Cursor:
+        start = time.perf_counter()
+        try:
+            cur = await super().execute(sql, parameters)
+        except Exception:
+            self._record(sql, parameters, start, error=True)
+            raise
+        self._record(sql, parameters, start, cur.rowcount)
+        return cur
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> Cursor:
+        parameters = list(parameters)
+        start = time.perf_counter()
+        try:
+            cur = await super().executemany(sql, parameters)
+        except Exception:
+            self._record(sql, None, start, error=True)
+            raise
+        self._record(sql, parameters[0] if parameters else None, start, len(parameters))
+        return cur
+
+    async def fetchall(self, sql: str, parameters: Iterable[Any] = ()) -> list:
+        start = time.perf_counter()
+        try:
+            rows = await super().fetchall(sql, parameters)
+        except Exception:
+            self._record(sql, parameters, start, error=True)
+            raise
+        self._record(sql, parameters, start, len(rows))
+        return rows
+
+    async def fetchone(self, sql: str, parameters: Iterable[Any] = ()) -> Optional[tuple]:
+        start = time.perf_counter()
+        try:
+            row = await super().fetchone(sql, parameters)
+        except Exception:
+            self._record(sql, parameters, start, error=True)
+            raise
+        self._record(sql, parameters, start, row is not None)
+        return row
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import os
+import sys
+import time
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional
+
+from .metrics import Histogram
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+log = getLogger(__name__)
+
+# Upper bounds in seconds, from 10µs to 1s. GC pauses are much shorter than command latencies.
+PAUSE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+# Added in Python 3.12.
+EAGER_TASK_FACTORY = getattr(asyncio, "eager_task_factory", None)
+
+
+def _rss() -> Optional[int]:
+    # The resident set size in bytes, or None where it can't be read cheaply.
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _mb(size: Optional[int]) -> str:
+    return "?" if size is None else f"{size / 2**20:.1f} MB"
+
+
+class RuntimeProfile:
+    """
+    Tunes the interpreter and event loop for a long-running bot, and records the evidence.
+
+    - `uvloop` replaces the asyncio event loop with uvloop, if it's installed. This only applies when the bot
+      is started with `Bot.run`, since the loop must be chosen before it's created.
+    - `eager_tasks` installs `asyncio.eager_task_factory` on Python 3.12+, so tasks that finish without
+      awaiting never get scheduled. Tasks start running as soon as they're created, which code may not expect.
+    - `gc_freeze` runs a full collection once the bot is ready and its guilds are chunked, then moves everything
+      into the permanent generation with `gc.freeze`, so later collections skip the long-lived caches.
+      With a member cache policy, guilds are chunked on first need instead, so the freeze only covers the state
+      built at startup. Members cached afterwards are collected as usual.
+    - `gc_thresholds` replaces the collection thresholds, see `gc.set_threshold`.
+
+    GC pauses are timed per generation before and after the freeze, and memory use is recorded at each phase,
+    see `report`.
+
+    Parameters
+    ----------
+    uvloop: bool
+        Whether to use uvloop when it's installed.
+    eager_tasks: bool
+        Whether to use the eager task factory on Python 3.12+.
+    gc_freeze: bool
+        Whether to freeze the heap after startup.
+    gc_thresholds: tuple[int, int, int]
+        The GC thresholds to set, such as `(50000, 20, 100)`. Unchanged if not given.
+
+    Attributes
+    ----------
+    pauses: dict[str, list[Histogram]]
+        The GC pause times of each generation, `before` and `after` the freeze.
+    memory: dict[str, Optional[int]]
+        The resident memory at each phase, in bytes.
+    """
+
+    def __init__(
+        self,
+        *,
+        uvloop: bool = True,
+        eager_tasks: bool = True,
+        gc_freeze: bool = True,
+        gc_thresholds: Optional[tuple[int, int, int]] = None,
+    ):
+        self.uvloop = uvloop
+        self.eager_tasks = eager_tasks
+        self.gc_freeze = gc_freeze
+        self.gc_thresholds = gc_thresholds
+        self.pauses: dict[str, list[Histogram]] = {
+            phase: [Histogram(PAUSE_BUCKETS) for _ in range(3)] for phase in ("before", "after")
+        }
+        self.memory: dict[str, Optional[int]] = {}
+        self.notes: list[str] = []
+        self._phase = "before"
+        self._gc_started = 0.0
+        self._original_thresholds = gc.get_threshold()
+        # The loop whose task factory was replaced, and its previous factory.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._original_factory = None
+        self._task: Optional[asyncio.Task] = None
+
+    def install_event_loop(self):
+        """
+        Makes new event loops use uvloop, if enabled and installed. Called by `Bot.run` before the loop is created.
+        """
+        if not self.uvloop:
+            return
+        try:
+            import uvloop
+        except ImportError:
+            self.notes.append("uvloop is not installed, using the default event loop")
+            return
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    def start(self, bot: Bot):
+        """
+        Applies the task factory and GC settings, and schedules the freeze for once the bot is ready.
+
+        Parameters
+        ----------
+        bot: Bot
+            The bot being started.
+        """
+        loop = asyncio.get_running_loop()
+        self.memory["start"] = _rss()
+        if self.eager_tasks:
+            if EAGER_TASK_FACTORY is not None:
+                if self._loop is not loop:
+                    self._loop, self._original_factory = loop, loop.get_task_factory()
+                loop.set_task_factory(EAGER_TASK_FACTORY)
+            else:
+                self.notes.append(f"Eager tasks need Python 3.12+, running {sys.version.split()[0]}")
+        if self.gc_thresholds is not None:
+            gc.set_threshold(*self.gc_thresholds)
+        if self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._after_ready(bot), name="PortalUtils-gc-freeze")
+
+    def close(self):
+        """
+        Stops timing GC pauses, and restores the original task factory and thresholds.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        gc.set_threshold(*self._original_thresholds)
+        if self._loop is not None:
+            if not self._loop.is_closed():
+                self._loop.set_task_factory(self._original_factory)
+            self._loop = self._original_factory = None
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        else:
+            self.pauses[self._phase][info["generation"]].observe(time.perf_counter() - self._gc_started)
+
+    async def _after_ready(self, bot: Bot):
+        # READY is only dispatched once every guild that is chunked at startup has been chunked.
+        # Guilds chunked later by `MemberCache.ensure_chunked` aren't covered, they may never be chunked.
+        await bot.wait_until_ready()
+        self.memory["ready"] = _rss()
+        if not self.gc_freeze:
+            return
+        started = time.perf_counter()
+        gc.collect()
+        gc.freeze()
+        note = (
+            f"Froze {gc.get_freeze_count()} objects after a {(time.perf_counter() - started) * 1000:.1f} ms collection"
+        )
+        if not bot._connection._chunk_guilds:
+            note += ", guilds are chunked on first need"
+        self.notes.append(note)
+        log.info(note)
+        self._phase = "after"
+        self.memory["frozen"] = _rss()
+
+    def report(self) -> str:
+        """
+        Formats the runtime settings, GC pause times before and after the freeze, and memory use.
+        """
+        loop = asyncio.get_running_loop()
+        factory = loop.get_task_factory()
+        lines = [
+            f"Event loop: {type(loop).__module__}.{type(loop).__name__}",
+            f"Task factory: {getattr(factory, '__name__', factory) or 'default'}",
+            f"GC thresholds: {gc.get_threshold()} (was {self._original_thresholds})",
+            *self.notes,
+            "",
+            f"{'GC pauses':<12} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'total ms':>9}",
+        ]
+        for phase, generations in self.pauses.items():
+            for generation, h in enumerate(generations):
+                lines.append(
+                    f"{f'{phase} gen{generation}':<12} {h.count:>7} {h.quantile(0.5) * 1000:>8.2f} "
+                    f"{h.quantile(0.95) * 1000:>8.2f} {h.max * 1000:>8.2f} {h.total * 1000:>9.1f}"
+                )
+        lines += ["", "Memory: " + ", ".join(f"{k} {_mb(v)}" for k, v in {**self.memory, "now": _rss()}.items())]
+        return "\n".join(lines)
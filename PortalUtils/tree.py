@@ -1,21 +1,140 @@
 import traceback
 from logging import getLogger
+from typing import NamedTuple, Optional, Union
 
-from discord import AppCommandType, Interaction, InteractionType, NotFound
-from discord.app_commands import CommandTree
+from discord import AppCommandType, Interaction, InteractionType, NotFound, Object
+from discord.app_commands import Command, CommandTree, ContextMenu, Group
+from discord.app_commands.tree import _retrieve_guild_ids
 from discord.app_commands.errors import CheckFailure, CommandInvokeError
+from discord.utils import MISSING, utcnow
 
 log = getLogger(__name__)
 
 
+class DeferSettings(NamedTuple):
+    """
+    How an interaction is deferred before its command runs.
+    Set with the `defer` extra: `True` for the defaults, or a dict such as `{"ephemeral": False}`.
+    """
+
+    ephemeral: bool = True
+    thinking: bool = True
+
+
+def defer_settings(command: Union[Command, ContextMenu]) -> Optional[DeferSettings]:
+    """
+    Parses the `defer` extra of a command. Raises `TypeError` if it's a dict with unknown keys.
+
+    Parameters
+    ----------
+    command: Union[Command, ContextMenu]
+        The command to parse.
+    """
+    defer = command.extras.get("defer", False)
+    if not defer:
+        return None
+    if isinstance(defer, dict):
+        if unknown := defer.keys() - DeferSettings._fields:
+            raise TypeError(
+                f"Invalid defer extra for command {command.qualified_name!r}: "
+                f"unknown keys {', '.join(sorted(unknown))}, expected {', '.join(DeferSettings._fields)}"
+            )
+        return DeferSettings(**defer)
+    return DeferSettings()
+
+
 class CommandTree(CommandTree):
     """
     A subclass of `discord.app_commands.CommandTree` with additional error handling and interaction checks.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Keyed by (guild ID, qualified name), with None for global commands. Only commands that defer are listed.
+        self._defer_table: dict[tuple[Optional[int], str], DeferSettings] = {}
+
+    @staticmethod
+    def _defers(command) -> list[tuple[str, DeferSettings]]:
+        # Also validates the `defer` extra of the command and its subcommands.
+        leaves = (command, *getattr(command, "walk_commands", tuple)())
+        return [(c.qualified_name, s) for c in leaves if isinstance(c, Command) and (s := defer_settings(c))]
+
+    def _build_defer_table(self):
+        table = {}
+        for guild_id in (None, *self._guild_commands):
+            for command in self.get_commands(guild=None if guild_id is None else Object(id=guild_id)):
+                for name, settings in self._defers(command):
+                    table[guild_id, name] = settings
+        self._defer_table = table
+
+    def _forget_defers(self, guild_id: Optional[int], name: Optional[str] = None):
+        for key in [k for k in self._defer_table if k[0] == guild_id]:
+            if name is None or key[1] == name or key[1].startswith(f"{name} "):
+                del self._defer_table[key]
+
+    def add_command(self, command, /, *, guild=MISSING, guilds=MISSING, **kwargs):
+        # Checked first, so an invalid `defer` extra fails when the command is loaded rather than when it's used.
+        defers = self._defers(command)
+        super().add_command(command, guild=guild, guilds=guilds, **kwargs)
+        if not isinstance(command, (Command, Group)):
+            return
+        guild_ids = _retrieve_guild_ids(command, guild, guilds)
+        for guild_id in guild_ids or (None,):
+            # Replaces an overridden command's entries.
+            self._forget_defers(guild_id, command.name)
+            for name, settings in defers:
+                self._defer_table[guild_id, name] = settings
+
+    def remove_command(self, command: str, /, *, guild=None, type=AppCommandType.chat_input):
+        removed = super().remove_command(command, guild=guild, type=type)
+        if removed is not None and type is AppCommandType.chat_input:
+            self._forget_defers(None if guild is None else guild.id, command)
+        return removed
+
+    def clear_commands(self, *, guild, type=None):
+        super().clear_commands(guild=guild, type=type)
+        if type is None or type is AppCommandType.chat_input:
+            self._forget_defers(None if guild is None else guild.id)
+
+    async def sync(self, *, guild=None):
+        commands = await super().sync(guild=guild)
+        # Picks up subcommands added to a group after the group was added to the tree.
+        self._build_defer_table()
+        return commands
+
+    def get_defer_settings(self, interaction: Interaction) -> Optional[DeferSettings]:
+        """
+        Looks up how an application command interaction should be deferred, from its raw data.
+        Guild commands take precedence over global commands of the same name, like they do when invoked.
+
+        Parameters
+        ----------
+        interaction: Interaction
+            The interaction to look up.
+        """
+        data = interaction.data
+        name = data["name"]
+        options = data.get("options")
+        while options and options[0].get("type") in (1, 2):
+            name = f"{name} {options[0]['name']}"
+            options = options[0].get("options")
+        if self._guild_commands and (guild_id := data.get("guild_id")) is not None:
+            if (settings := self._defer_table.get((int(guild_id), name))) is not None:
+                return settings
+        return self._defer_table.get((None, name))
+
+    async def _call(self, interaction: Interaction):
+        if (monitor := getattr(self.client, "monitor", None)) is None:
+            return await super()._call(interaction)
+        await monitor.run(
+            super()._call(interaction),
+            lambda: f"app_command {getattr(interaction.command, 'qualified_name', interaction.data.get('name'))}",
+        )
+
     async def on_error(self, interaction: Interaction, error: Exception):
         """
-        Handles errors that occur during command invocation and sends them to the `error_logs` channel.
+        Handles errors that occur during command invocation and reports them to the `error_logs` channel.
+        Repeated errors are deduplicated by the bot's `error_reporter`, if it has one.
 
         Parameters
         ----------
@@ -31,35 +150,47 @@ class CommandTree(CommandTree):
             await interaction.channel.send(
                 "An error occured, and the original interaction could not be found.\n{error}"
             )
+        if (metrics := getattr(interaction.client, "metrics", None)) is not None and interaction.command is not None:
+            metrics.observe(
+                "app",
+                interaction.command.qualified_name,
+                (utcnow() - interaction.created_at).total_seconds(),
+                error=True,
+            )
+        if (audit := getattr(interaction.client, "audit", None)) is not None:
+            audit.record_interaction(interaction, error=error)
         if isinstance(error, CommandInvokeError):
             error = error.original
+        header = f"{interaction.user} ran {interaction.command.qualified_name} in {interaction.channel.mention} (`{interaction.guild_id}`)\n{interaction.namespace} "
+        if (reporter := getattr(interaction.client, "error_reporter", None)) is not None:
+            return await reporter.report(error, header, short=isinstance(error, (CheckFailure, ValueError)))
         tb = "".join(traceback.format_exception(type(error), error, error.__traceback__))
         if isinstance(error, (CheckFailure, ValueError)):
             tb = f"{error.__class__.__name__}: {error}"
         log.error(tb)
         if cid := getattr(interaction.client, "error_logs", 0):
-            await interaction.client.get_channel(cid).send(
-                f"{interaction.user} ran {interaction.command.qualified_name} in {interaction.channel.mention} (`{interaction.guild_id}`)\n{interaction.namespace} ```py\n{tb}```"
-            )
+            await interaction.client.get_channel(cid).send(f"{header}```py\n{tb}```")
 
     async def interaction_check(self, interaction: Interaction) -> bool:
         """
-        Optionally pre-defers the response to an interaction.
+        Optionally pre-defers the response to an interaction, based on the command's `defer` extra,
+        and marks when app commands were dispatched for the audit log.
 
         Parameters
         ----------
         interaction: Interaction
             The interaction to check.
         """
-        defer = False
+        defer = None
         if (
             interaction.type == InteractionType.application_command
-            and getattr(interaction.command, "type", AppCommandType.chat_input) == AppCommandType.chat_input
+            and interaction.data.get("type", 1) == AppCommandType.chat_input.value
         ):
-            command, _ = self._get_app_command_options(interaction.data)
-            defer = command.extras.get("defer", False)
+            defer = self.get_defer_settings(interaction)
+            if (audit := getattr(interaction.client, "audit", None)) is not None:
+                audit.begin(interaction)
         if defer:
             await interaction.response.defer(
-                thinking=True, ephemeral=True
+                thinking=defer.thinking, ephemeral=defer.ephemeral
             )  # First followup ALWAYS matches state of defer!
         return True
@@ -0,0 +1,265 @@
+"""
+The benchmarked hot paths.
+
+Each case is an async setup function, called once per size, that returns the callable to time.
+The callable may be sync or async; setup work isn't timed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from .fakes import FakeAsset, FakeBot, FakeChannel, FakeGuild, FakeInteraction
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[Optional[int]], Awaitable[Callable[[], Any]]]
+    sizes: tuple[Optional[int], ...]
+
+
+CASES: list[Case] = []
+
+
+def bench(name: str, sizes: tuple[Optional[int], ...] = (None,)):
+    """
+    Registers a benchmark case.
+
+    Parameters
+    ----------
+    name: str
+        The case name. Results are keyed by `name[size]`, or just `name` without sizes.
+    sizes: tuple[Optional[int], ...]
+        The input sizes to run the case at.
+    """
+
+    def decorator(setup):
+        CASES.append(Case(name, setup, sizes))
+        return setup
+
+    return decorator
+
+
+def _embeds():
+    from PortalUtils.bot import EEmbed, Embed
+
+    Embed._default_color = 0x5865F2  # Set by the bot's constructor
+    return Embed, EEmbed
+
+
+def _lines(n: int) -> list[str]:
+    return [f"{i:>6} | some entry with a reasonably long description #{i}" for i in range(n)]
+
+
+@bench("paginator.add_line", sizes=(100, 1_000, 10_000))
+async def paginator_add_line(size: int):
+    from PortalUtils.paginators import Paginator
+
+    lines = _lines(size)
+
+    def run():
+        paginator = Paginator(20)
+        for line in lines:
+            paginator.add_line(line)
+
+    return run
+
+
+@bench("paginator.send_to", sizes=(100, 10_000))
+async def paginator_send_to(size: int):
+    from PortalUtils.paginators import Paginator
+
+    lines = _lines(size)
+    channel = FakeChannel()
+
+    async def run():
+        paginator = Paginator(20)
+        for line in lines:
+            paginator.add_line(line)
+        await paginator.send_to(channel)
+        paginator.view.stop()
+
+    return run
+
+
+@bench("embed_paginator.pages", sizes=(100, 1_000, 10_000))
+async def embed_paginator_pages(size: int):
+    from PortalUtils.paginators import EmbedPaginator
+
+    Embed, _ = _embeds()
+    lines = _lines(size)
+
+    async def run():
+        paginator = EmbedPaginator(20, embed_cls=Embed, embed_kwargs={"title": "Entries"}, cache_size=0)
+        for line in lines:
+            paginator.add_line(line)
+        for page in range(1, paginator.num_pages + 1):
+            await paginator.get_page(page)
+
+    return run
+
+
+@bench("embed.construct")
+async def embed_construct(size: None):
+    Embed, EEmbed = _embeds()
+
+    def run():
+        Embed(title="Command Ran", description="User: `user` (`1`)")
+        EEmbed(description="Something went wrong")
+
+    return run
+
+
+@bench("embed.template")
+async def embed_template(size: None):
+    from discord import Color
+
+    from PortalUtils.embeds import EmbedTemplate
+
+    Embed, _ = _embeds()
+    template = EmbedTemplate(
+        Embed(title="Command Ran", color=Color.dark_green()).set_author(name="Portal", icon_url=FakeAsset.url)
+    )
+
+    def run():
+        template(description="User: `user` (`1`)").add_field(name="Guild", value="`guild`")
+
+    return run
+
+
+@bench("cog.t")
+async def cog_t(size: None):
+    from discord import Intents, app_commands
+
+    from PortalUtils.bot import Bot
+    from PortalUtils.cog import Cog
+
+    path = tempfile.mkdtemp()
+    with open(os.path.join(path, "en-US.json"), "w", encoding="utf-8") as f:
+        json.dump({"cases": {"ping": {"title": "Pong! {latency}ms", "description": "Hello {user}"}}}, f)
+
+    class Info(Cog):
+        @app_commands.command()
+        async def ping(self, interaction):
+            pass
+
+    bot = Bot(command_prefix="!", intents=Intents.none(), locales=path)
+    cog = Info(bot)
+    await bot.add_cog(cog)
+    interaction = FakeInteraction(bot, cog.ping)
+
+    def run():
+        cog.t("title", interaction, latency=42)
+        cog.t("description", interaction, user="user")
+
+    return run
+
+
+@bench("tree.interaction_check", sizes=(10, 100))
+async def tree_interaction_check(size: int):
+    from discord import Client, Intents, app_commands
+
+    from PortalUtils.tree import CommandTree
+
+    tree = CommandTree(Client(intents=Intents.none()))
+    commands = []
+    for i in range(size):
+
+        async def callback(interaction):
+            pass
+
+        command = app_commands.Command(
+            name=f"command{i}", description="...", callback=callback, extras={"defer": i % 2 == 0}
+        )
+        tree.add_command(command)
+        commands.append(command)
+    interactions = [FakeInteraction(tree.client, command) for command in commands]
+
+    async def run():
+        for interaction in interactions:
+            await tree.interaction_check(interaction)
+
+    return run
+
+
+def _raise() -> Exception:
+    try:
+        json.loads("{")
+    except ValueError as e:
+        try:
+            raise RuntimeError("Failed to parse the response") from e
+        except RuntimeError as error:
+            return error
+
+
+async def _on_error_case(window: float):
+    from discord import Client, Intents, app_commands
+
+    from PortalUtils.errors import ErrorReporter
+    from PortalUtils.tree import CommandTree
+
+    bot = FakeBot()
+    bot.error_reporter = ErrorReporter(bot, window=window)
+    tree = CommandTree(Client(intents=Intents.none()))
+
+    async def callback(interaction):
+        pass
+
+    command = app_commands.Command(name="fetch", description="...", callback=callback)
+    interaction = FakeInteraction(bot, command, {"url": "https://example.com"})
+    error = app_commands.CommandInvokeError(command, _raise())
+
+    async def run():
+        await tree.on_error(interaction, error)
+
+    return run
+
+
+@bench("tree.on_error.first")
+async def tree_on_error_first(size: None):
+    # A zero window formats and reports every occurrence in full.
+    return await _on_error_case(0.0)
+
+
+@bench("tree.on_error.repeat")
+async def tree_on_error_repeat(size: None):
+    return await _on_error_case(300.0)
+
+
+@bench("logging.app_command_logs")
+async def logging_app_command_logs(size: None):
+    from discord import app_commands
+
+    from PortalUtils.logging import Logging
+
+    bot = FakeBot()
+    cog = Logging(bot)
+
+    async def callback(interaction):
+        pass
+
+    command = app_commands.Command(name="fetch", description="...", callback=callback)
+    interaction = FakeInteraction(bot, command, {"url": "https://example.com", "ephemeral": True})
+
+    async def run():
+        await cog.app_command_logs(interaction, command)
+
+    return run
+
+
+@bench("logging.guild_logs")
+async def logging_guild_logs(size: None):
+    from PortalUtils.logging import Logging
+
+    bot = FakeBot()
+    cog = Logging(bot)
+    cog.BURST_THRESHOLD = float("inf")  # Always log guilds one by one
+    guild: FakeGuild = bot.guild
+
+    async def run():
+        await cog.guild_logs(guild)
+
+    return run
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from discord import AppCommandType, Intents, InteractionType, Locale
+from discord.utils import utcnow
+
+
+class FakeAsset:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class FakeUser:
+    def __init__(self, id: int = 1, name: str = "user", bot: bool = False):
+        self.id = id
+        self.name = name
+        self.bot = bot
+        self.display_avatar = FakeAsset()
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel, **kwargs):
+        self.id = 3
+        self.channel = channel
+        self.kwargs = kwargs
+
+    async def edit(self, **kwargs):
+        self.kwargs = kwargs
+        return self
+
+
+class FakeChannel:
+    def __init__(self, id: int = 2, name: str = "general"):
+        self.id = id
+        self.name = name
+        self.mention = f"<#{id}>"
+        self.jump_url = f"https://discord.com/channels/4/{id}"
+        self.sent = 0
+
+    def __str__(self) -> str:
+        return self.name
+
+    async def send(self, *args, **kwargs) -> FakeMessage:
+        self.sent += 1
+        return FakeMessage(self, **kwargs)
+
+
+class FakeGuild:
+    def __init__(self, id: int = 4, name: str = "guild", members: int = 100, bots: int = 5):
+        self.id = id
+        self.name = name
+        self.members = [FakeUser(i, bot=i < bots) for i in range(members)]
+        self.member_count = members
+        self.chunked = True
+        self.owner_id = 0
+        self.owner: Optional[FakeUser] = self.members[0]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeResponse:
+    def __init__(self):
+        self.deferred = 0
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self.deferred += 1
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+
+
+class FakeInteraction:
+    """
+    The subset of `discord.Interaction` used by PortalUtils.
+    """
+
+    def __init__(self, client: Any = None, command: Any = None, namespace: Optional[dict] = None):
+        self.client = client
+        self.command = command
+        self.type = InteractionType.application_command
+        self.data = {"name": getattr(command, "name", "command"), "type": AppCommandType.chat_input.value}
+        self.user = FakeUser()
+        self.guild = FakeGuild()
+        self.guild_id = self.guild.id
+        self.channel = FakeChannel()
+        self.locale = Locale.american_english
+        self.namespace = SimpleNamespace(**(namespace or {}))
+        self.created_at = utcnow()
+        self.response = FakeResponse()
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeDispatcher:
+    """
+    Stands in for `LogDispatcher`, only counting submitted entries.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.pending = 0
+        self.dropped = 0
+
+    def submit(self, channel_id: int, embed: Any, *, priority: Any) -> bool:
+        self.submitted += 1
+        return True
+
+
+class FakeBot:
+    """
+    The subset of `PortalBotMixin` used by the logging cog and the error reporter.
+    """
+
+    def __init__(self):
+        from PortalUtils.bot import EEmbed, Embed
+        from PortalUtils.metrics import MetricsRegistry
+
+        self.Embed, self.EEmbed = Embed, EEmbed
+        self.intents = Intents.default()
+        self.intents.members = True
+        self.error_logs = self.guild_logs = self.command_logs = 2
+        self.channel = FakeChannel(2)
+        self.guild = FakeGuild()
+        self.guilds = [self.guild]
+        self.log_dispatcher = FakeDispatcher()
+        self.metrics = MetricsRegistry()
+        self.extra_events: dict[str, list] = {}
+
+    def get_channel(self, id: int) -> Optional[FakeChannel]:
+        return self.channel if id == self.channel.id else None
+
+    def get_guild(self, id: int) -> Optional[FakeGuild]:
+        return self.guild if id == self.guild.id else None
@@ -0,0 +1,235 @@
+"""
+Runs the PortalUtils microbenchmarks and compares them against a stored baseline.
+
+Usage::
+
+    python -m benchmarks.run                  # compare against benchmarks/baseline.json
+    python -m benchmarks.run --save           # record a new baseline
+    python -m benchmarks.run -k paginator     # only cases whose name contains "paginator"
+    python -m benchmarks.run --threshold 0.1  # fail on a slowdown of more than 10%
+
+Exits with status 1 if any case is slower than its baseline by more than the threshold.
+Every run also times a fixed calibration loop, and results are scaled by how fast it ran compared to the
+baseline's, so a baseline recorded on a faster or slower machine still compares fairly.
+Baselines are only comparable on the same Python version.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Optional
+
+from .cases import CASES
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+async def _time(func: Callable[[], Any], number: int) -> float:
+    # Like timeit, keep garbage collection out of the measurement.
+    gc.collect()
+    gc.disable()
+    try:
+        if inspect.iscoroutinefunction(func):
+            started = time.perf_counter()
+            for _ in range(number):
+                await func()
+        else:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+        return time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+async def measure(func: Callable[[], Any], *, repeat: int = 5, min_time: float = 0.2) -> float:
+    """
+    Returns the best time per call, in seconds, like `timeit`.
+
+    Parameters
+    ----------
+    func: Callable[[], Any]
+        The sync or async callable to time.
+    repeat: int
+        The number of timed runs.
+    min_time: float
+        The minimum duration of each run, in seconds. Sets the number of calls per run.
+    """
+    number = 1
+    while (elapsed := await _time(func, number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    return min([elapsed / number] + [await _time(func, number) / number for _ in range(repeat - 1)])
+
+
+async def run_cases(
+    pattern: Optional[str] = None, *, repeat: int = 5, min_time: float = 0.2
+) -> dict[str, Optional[float]]:
+    """
+    Runs the benchmark cases, returning the time per call of each, or None if it was skipped.
+
+    Parameters
+    ----------
+    pattern: str
+        Only run cases whose name contains this.
+    repeat: int
+        See `measure`.
+    min_time: float
+        See `measure`.
+    """
+    results: dict[str, Optional[float]] = {}
+    for case in CASES:
+        if pattern and pattern not in case.name:
+            continue
+        for size in case.sizes:
+            key = case.name if size is None else f"{case.name}[{size}]"
+            try:
+                func = await case.setup(size)
+            except ImportError as e:
+                print(f"{key:<40} skipped ({e})")
+                results[key] = None
+                continue
+            results[key] = seconds = await measure(func, repeat=repeat, min_time=min_time)
+            print(f"{key:<40} {_format(seconds):>12}")
+    return results
+
+
+def _calibration_loop():
+    # Plain interpreter work: small allocations, dict access and string building.
+    values = {}
+    for i in range(200):
+        values[i] = str(i)
+    return "".join(values.values())
+
+
+async def calibrate(*, repeat: int = 5, min_time: float = 0.2) -> float:
+    """
+    Returns the time per call of a fixed pure Python loop, a measure of the host's speed.
+
+    Parameters
+    ----------
+    repeat: int
+        See `measure`.
+    min_time: float
+        See `measure`.
+    """
+    return await measure(_calibration_loop, repeat=repeat, min_time=min_time)
+
+
+def _format(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(
+    results: dict[str, Optional[float]], baseline: dict[str, float], threshold: float, scale: float = 1.0
+) -> list[str]:
+    """
+    Prints the change of each result against the baseline and returns the keys that regressed.
+
+    Parameters
+    ----------
+    results: dict[str, Optional[float]]
+        The new results.
+    baseline: dict[str, float]
+        The stored results.
+    threshold: float
+        The relative slowdown, such as `0.25` for 25%, above which a result counts as a regression.
+    scale: float
+        How much slower this host is than the baseline's, such as `2.0` for half as fast.
+        Baseline times are multiplied by it before they're compared and printed.
+    """
+    regressions = []
+    print(f"\n{'case':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, seconds in results.items():
+        if seconds is None or key not in baseline:
+            continue
+        change = seconds / (baseline[key] * scale) - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<40} {_format(baseline[key] * scale):>12} {_format(seconds):>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE, help="the baseline file (default: %(default)s)")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run (default: %(default)s)")
+    args = parser.parse_args(argv)
+    # The error paths log every report, time the code rather than the console.
+    logging.disable(logging.CRITICAL)
+
+    async def run() -> tuple[float, dict[str, Optional[float]]]:
+        # Calibrated before and after the cases, so a slow spell at either end doesn't skew every comparison.
+        calibration = await calibrate(repeat=args.repeat, min_time=args.min_time)
+        results = await run_cases(args.pattern, repeat=args.repeat, min_time=args.min_time)
+        calibration = min(calibration, await calibrate(repeat=args.repeat, min_time=args.min_time))
+        print(f"{'calibration':<40} {_format(calibration):>12}")
+        return calibration, results
+
+    calibration, results = asyncio.run(run())
+    document = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calibration": calibration,
+        "results": {k: v for k, v in results.items() if v is not None},
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    if args.save:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                stored = json.load(f)
+            # Keep the cases that weren't run or were skipped, rescaled from the stored calibration to the new one.
+            scale = calibration / stored["calibration"] if stored.get("calibration") else 1.0
+            kept = {
+                k: v * scale
+                for k, v in stored["results"].items()
+                if (args.pattern or k in results) and results.get(k) is None
+            }
+            document["results"] = {**kept, **document["results"]}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}, run with --save to record one.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        stored = json.load(f)
+    if stored.get("python") != document["python"]:
+        print(f"\nWarning: the baseline was recorded on Python {stored.get('python')}.")
+    if stored.get("calibration"):
+        scale = calibration / stored["calibration"]
+        print(f"\nCalibration took {scale:.2f}x as long as the baseline's, baseline times are scaled to match.")
+    else:
+        scale = 1.0
+        print("\nWarning: the baseline has no calibration, run with --save to record one.")
+    regressions = compare(results, stored["results"], args.threshold, scale)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
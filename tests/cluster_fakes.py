@@ -0,0 +1,71 @@
+"""
+A client-like stand-in for a bot, for running `ClusterLauncher` without a gateway connection.
+Clusters are spawned processes, so `create` is passed to the launcher as `"cluster_fakes:create"`.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from discord import Embed
+
+from PortalUtils.dispatcher import LogDispatcher
+
+# Where every fake channel appends the messages sent to it, one JSON object per line.
+SENT_PATH_ENV = "PORTAL_FAKE_SENT"
+LOG_CHANNEL_ID = 1234
+
+
+class FakeChannel:
+    def __init__(self, client: "FakeClient", channel_id: int):
+        self.client = client
+        self.id = channel_id
+
+    async def send(self, *, embeds: list[Embed]):
+        message = {"cluster": self.client.cluster.id, "channel_id": self.id, "embeds": [e.to_dict() for e in embeds]}
+        with open(os.environ[SENT_PATH_ENV], "a") as f:
+            f.write(json.dumps(message) + "\n")
+
+
+class FakeClient:
+    def __init__(self, *, shard_ids: list[int], shard_count: int):
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.latency = 0.01
+        self.guilds = []
+        self.log_dispatcher = LogDispatcher(self, flush_interval=0.1)
+        self._ready = False
+        self._closed = asyncio.Event()
+
+    def get_channel(self, channel_id: int):
+        # Like a cluster whose shards don't include the log channel's guild.
+        return None
+
+    def get_partial_messageable(self, channel_id: int) -> FakeChannel:
+        return FakeChannel(self, channel_id)
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def is_closed(self) -> bool:
+        return self._closed.is_set()
+
+    async def start(self, token: str):
+        self.log_dispatcher.start()
+        self._ready = True
+        self.log_dispatcher.submit(LOG_CHANNEL_ID, Embed(description=f"from cluster {self.cluster.id}"), priority=0)
+        await self._closed.wait()
+
+    async def close(self):
+        await self.log_dispatcher.close()
+        self._closed.set()
+
+
+def create(**kwargs) -> FakeClient:
+    return FakeClient(**kwargs)
+
+
+def hang(**kwargs):
+    # A worker stuck before it connects to the launcher.
+    time.sleep(3600)
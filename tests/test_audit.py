@@ -0,0 +1,56 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from discord.ext import commands
+from discord.utils import utcnow
+
+from PortalUtils.audit import AuditLog
+from PortalUtils.db import Database, WriteBehindQueue
+
+
+@commands.command()
+async def ban(ctx, member: int, *, reason: str):
+    pass
+
+
+def _ctx(user_id: int, guild_id: int, *args, error: bool = False, **kwargs) -> SimpleNamespace:
+    return SimpleNamespace(
+        command=ban,
+        args=[None, *args],
+        kwargs=kwargs,
+        message=SimpleNamespace(created_at=utcnow()),
+        author=SimpleNamespace(id=user_id),
+        guild=SimpleNamespace(id=guild_id),
+        channel=SimpleNamespace(id=guild_id * 10),
+    )
+
+
+def test_invocations_are_written_in_batches_and_queried(tmp_path):
+    async def main():
+        async with Database(str(tmp_path / "test.db"), readers=1) as db:
+            queue = WriteBehindQueue(db, flush_interval=0.01)
+            bot = SimpleNamespace(db=db, write_queue=queue, queue_write=queue.put)
+            audit = AuditLog(bot, retention=0)
+            await audit.start()
+            queue.start()
+            for user_id in (1, 1, 2):
+                audit.begin(ctx := _ctx(user_id, 5, SimpleNamespace(id=99), reason="spam"))
+                audit.record_command(ctx)
+            audit.record_command(_ctx(3, 6, 42, reason="raid"), commands.CheckFailure())
+            await queue.close()
+            return (
+                await audit.top_commands(5),
+                await audit.top_users(5, command="ban"),
+                await audit.recent(outcome="check_failed"),
+                await audit.recent(5, user_id=2),
+                audit.stats(),
+            )
+
+    commands_, users, [failed], [ok], stats = asyncio.run(main())
+    assert commands_ == [("ban", 3)] and users == [(1, 2), (2, 1)]
+    assert (failed.user_id, failed.guild_id, failed.channel_id, failed.error) == (3, 6, 60, "CheckFailure")
+    assert json.loads(failed.params) == {"member": 42, "reason": "raid"} and failed.duration is None
+    # Models are recorded by ID.
+    assert (json.loads(ok.params), ok.outcome) == ({"member": 99, "reason": "spam"}, "ok") and ok.duration >= 0
+    assert stats == {"recorded": 4, "dropped": 0}
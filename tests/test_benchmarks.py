@@ -0,0 +1,22 @@
+import json
+
+from benchmarks import run
+
+
+def _baseline(tmp_path, calibration: float, seconds: float) -> str:
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"python": "3", "calibration": calibration, "results": {"embed.construct": seconds}}))
+    return str(path)
+
+
+def test_compare_scales_the_baseline_by_host_speed():
+    # Twice as slow as the baseline's host, so twice the time isn't a regression.
+    assert run.compare({"case": 2.0}, {"case": 1.0}, 0.25, scale=2.0) == []
+    assert run.compare({"case": 2.0}, {"case": 1.0}, 0.25) == ["case"]
+
+
+def test_regressions_exit_non_zero(tmp_path):
+    options = ["-k", "embed.construct", "--repeat", "1", "--min-time", "0.01"]
+    # Baselines far faster, then far slower, than this host can run the case, even after scaling.
+    assert run.main([*options, "--baseline", _baseline(tmp_path, 1e-6, 1e-12), "--threshold", "0.5"]) == 1
+    assert run.main([*options, "--baseline", _baseline(tmp_path, 1e-6, 1.0)]) == 0
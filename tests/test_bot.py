@@ -0,0 +1,27 @@
+import asyncio
+
+import discord
+import pytest
+from discord.ext import commands
+
+from PortalUtils.bot import Bot
+
+
+def test_extension_failures_are_raised_after_their_stage():
+    loaded = []
+
+    async def load_extension(name: str):
+        if name == "PortalUtils.logging":
+            raise commands.ExtensionFailed(name, RuntimeError("broken"))
+        await asyncio.sleep(0.01)
+        loaded.append(name)
+
+    async def main():
+        bot = Bot(command_prefix="!", intents=discord.Intents.none(), disabled_extensions={"DPyUtils.ContextEditor2"})
+        bot.load_extension = load_extension
+        await bot.load_default_extensions()
+
+    with pytest.raises(commands.ExtensionFailed, match="broken"):
+        asyncio.run(main())
+    # The rest of the failed stage loaded, the next stage didn't.
+    assert sorted(loaded) == ["PortalUtils.helpc", "jishaku"]
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+from PortalUtils.cache import CacheManager
+from PortalUtils.db import Database, WriteBehindQueue
+
+
+def test_cancelled_lookup_does_not_cancel_shared_load():
+    async def main():
+        manager = CacheManager(SimpleNamespace())
+        calls = 0
+
+        async def loader(key):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return key * 2
+
+        cache = manager.create("test", loader=loader)
+        first = asyncio.create_task(cache.get(21))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get(21))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled(), calls, cache.collapsed, await cache.get(21)
+
+    assert asyncio.run(main()) == (42, True, 1, 1, 42)
+
+
+def test_unserializable_values_stay_in_memory(tmp_path):
+    async def main():
+        async with Database(str(tmp_path / "test.db"), readers=1) as db:
+            bot = SimpleNamespace(db=db, write_queue=WriteBehindQueue(db))
+            manager = CacheManager(bot)
+            await manager.start()
+            try:
+                cache = manager.create("test", loader=lambda key: asyncio.sleep(0, {key}))
+                value = await cache.get("key")
+                return value, "key" in cache, bot.write_queue.stats()["pending"]
+            finally:
+                manager.close()
+
+    assert asyncio.run(main()) == ({"key"}, True, 0)
+
+
+def test_values_changed_by_json_stay_in_memory(tmp_path):
+    async def main():
+        async with Database(str(tmp_path / "test.db"), readers=1) as db:
+            bot = SimpleNamespace(db=db, write_queue=WriteBehindQueue(db))
+            manager = CacheManager(bot)
+            await manager.start()
+            try:
+                cache = manager.create("test")
+                cache.set("counts", {1: "a", 2: "b"})
+                cache.set("pair", (1, 2))
+                cache.set("names", {"1": ["a"]})
+                return await cache.get("counts"), bot.write_queue.stats()["pending"]
+            finally:
+                manager.close()
+
+    # Int keys would come back from the database as strings, only the last value is persisted.
+    assert asyncio.run(main()) == ({1: "a", 2: "b"}, 1)
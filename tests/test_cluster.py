@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+
+from cluster_fakes import LOG_CHANNEL_ID, SENT_PATH_ENV
+
+from PortalUtils.cluster import ClusterLauncher
+
+
+def test_log_entries_are_forwarded_to_cluster_0(tmp_path, monkeypatch):
+    sent = tmp_path / "sent.jsonl"
+    monkeypatch.setenv(SENT_PATH_ENV, str(sent))
+
+    def messages() -> list[dict]:
+        return [json.loads(line) for line in sent.read_text().splitlines()] if sent.exists() else []
+
+    def descriptions() -> list[str]:
+        return sorted(e["description"] for m in messages() for e in m["embeds"])
+
+    async def main():
+        launcher = ClusterLauncher(
+            "cluster_fakes:create",
+            "token",
+            shard_count=2,
+            clusters=2,
+            socket_path=str(tmp_path / "launcher.sock"),
+            heartbeat_interval=0.2,
+            restart=False,
+        )
+        await launcher.start()
+        try:
+            deadline = time.monotonic() + 30
+            while len(descriptions()) < 2 and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+        finally:
+            await launcher.close(timeout=10)
+
+    asyncio.run(main())
+    assert descriptions() == ["from cluster 0", "from cluster 1"]
+    # Cluster 1 has no cached log channel either, cluster 0 sends everything by the channel's ID.
+    assert {(m["cluster"], m["channel_id"]) for m in messages()} == {(0, LOG_CHANNEL_ID)}
+
+
+def test_clusters_that_never_send_a_heartbeat_are_restarted(tmp_path):
+    async def main():
+        launcher = ClusterLauncher(
+            "cluster_fakes:hang",
+            "token",
+            shard_count=1,
+            clusters=1,
+            socket_path=str(tmp_path / "launcher.sock"),
+            heartbeat_interval=0.2,
+            startup_timeout=1,
+        )
+        await launcher.start()
+        [cluster] = launcher.clusters
+        first = cluster.process
+        try:
+            deadline = time.monotonic() + 30
+            while cluster.restarts == 0 and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+        finally:
+            await launcher.close(timeout=1)
+        return first, cluster
+
+    first, cluster = asyncio.run(main())
+    assert cluster.restarts >= 1 and cluster.process is not first and first.exitcode is not None
@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from PortalUtils.cog import Cog
+from PortalUtils.i18n import Translator
+
+
+class Settings(Cog):
+    group = app_commands.Group(name="settings", description="Settings")
+
+    @group.command(name="show")
+    async def settings_show(self, interaction: discord.Interaction):
+        pass
+
+    @app_commands.command(name="ping")
+    async def ping(self, interaction: discord.Interaction):
+        pass
+
+
+def test_cog_with_group_loads():
+    async def main():
+        bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        cog = Settings(bot)
+        await bot.add_cog(cog)
+        return cog
+
+    cog = asyncio.run(main())
+    prefixes = {command.qualified_name: prefix for command, prefix in cog._i18n_prefixes.items()}
+    assert prefixes == {"settings show": "test_cog.settings.show.", "ping": "test_cog.ping."}
+
+
+def test_translator_aliases_do_not_change_bundles(tmp_path):
+    (tmp_path / "en-US.json").write_text(json.dumps({"greeting": "Hello {name}"}), encoding="utf-8")
+    (tmp_path / "es.json").write_text(json.dumps({"greeting": "Hola {name}"}), encoding="utf-8")
+    translator = Translator(str(tmp_path))
+    assert translator.t("greeting", "es-ES", name="Ana") == "Hola Ana"
+    assert translator.t("greeting", "fr", name="Ana") == "Hello Ana"
+    assert set(translator.bundles) == {"en-US", "es"}
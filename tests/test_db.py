@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from PortalUtils.db import Database, WriteBehindQueue
+from PortalUtils.querystats import InstrumentedDatabase
+
+
+async def _rows(db: Database) -> list[tuple]:
+    return await db.fetchall("SELECT value FROM t ORDER BY value")
+
+
+@pytest.mark.parametrize("cls", [Database, InstrumentedDatabase])
+def test_plain_writes_wait_for_transactions(tmp_path, cls):
+    async def main():
+        async with cls(str(tmp_path / "test.db"), readers=1) as db:
+            await db.execute("CREATE TABLE t (value INTEGER)")
+            entered = asyncio.Event()
+
+            async def failing_transaction():
+                async with db.transaction() as conn:
+                    await conn.execute("INSERT INTO t VALUES (1)")
+                    entered.set()
+                    await asyncio.sleep(0.05)
+                    raise ValueError
+
+            task = asyncio.create_task(failing_transaction())
+            await entered.wait()
+            # Neither joins the transaction being rolled back, nor gets committed by the next one.
+            await db.execute("INSERT INTO t VALUES (2)")
+            with pytest.raises(ValueError):
+                await task
+            async with db.transaction() as conn:
+                await conn.execute("INSERT INTO t VALUES (3)")
+            return await _rows(db)
+
+    assert asyncio.run(main()) == [(2,), (3,)]
+
+
+def test_write_behind_only_drops_failing_writes(tmp_path):
+    async def main():
+        async with Database(str(tmp_path / "test.db"), readers=1) as db:
+            await db.execute("CREATE TABLE t (value INTEGER PRIMARY KEY)")
+            queue = WriteBehindQueue(db, flush_interval=0.05)
+            for value in (1, 2, 2, 3, 4):
+                queue.put_nowait("INSERT INTO t VALUES (?)", (value,))
+            queue.start()
+            await queue.close()
+            return await _rows(db), queue.stats()
+
+    rows, stats = asyncio.run(main())
+    assert rows == [(1,), (2,), (3,), (4,)]
+    assert stats["written"] == 4 and stats["failed"] == 1
+
+
+def test_reads_use_read_only_wal_connections(tmp_path):
+    async def main():
+        async with Database(str(tmp_path / "test.db"), readers=2) as db:
+            await db.execute("CREATE TABLE t (value INTEGER)")
+            await db.execute("INSERT INTO t VALUES (1)")
+            async with db._write_lock:
+                # Reads don't queue behind the writer.
+                rows = await asyncio.wait_for(_rows(db), 1)
+            async with db.read() as conn:
+                assert conn in db.readers
+                with pytest.raises(sqlite3.OperationalError, match="readonly"):
+                    await conn.execute("INSERT INTO t VALUES (2)")
+            return rows, await db.fetchval("PRAGMA journal_mode"), db._idle.qsize()
+
+    assert asyncio.run(main()) == ([(1,)], "wal", 2)
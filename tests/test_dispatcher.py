@@ -0,0 +1,106 @@
+import asyncio
+
+from discord import Embed
+
+from PortalUtils.dispatcher import LogDispatcher, LogPriority
+
+
+class FakeChannel:
+    def __init__(self, bot: "FakeBot", channel_id: int):
+        self.bot = bot
+        self.id = channel_id
+
+    async def send(self, *, embeds: list[Embed]):
+        if self.bot.fail:
+            raise self.bot.fail
+        self.bot.sent.append((self.id, [e.description for e in embeds]))
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent: list[tuple[int, list[str]]] = []
+        self.fail = None
+
+    def get_partial_messageable(self, channel_id: int) -> FakeChannel:
+        return FakeChannel(self, channel_id)
+
+
+def test_entries_are_batched_per_channel():
+    async def main():
+        bot = FakeBot()
+        dispatcher = LogDispatcher(bot, flush_interval=0.05)
+        dispatcher.start()
+        for i in range(12):
+            dispatcher.submit(1, Embed(description=f"a{i}"))
+        dispatcher.submit(2, Embed(description="b"))
+        await dispatcher.close()
+        return bot.sent, dispatcher.stats()
+
+    sent, stats = asyncio.run(main())
+    # A full batch of 10 goes at once, the rest when the buffers are flushed.
+    assert sent[0] == (1, [f"a{i}" for i in range(10)])
+    assert sorted(sent[1:]) == [(1, ["a10", "a11"]), (2, ["b"])]
+    assert (stats["sent"], stats["batches"], stats["dropped"]) == (13, 3, 0)
+
+
+def test_errors_are_flushed_first():
+    async def main():
+        bot = FakeBot()
+        dispatcher = LogDispatcher(bot, flush_interval=10)
+        dispatcher.submit(1, Embed(description="guild"), priority=LogPriority.GUILD)
+        dispatcher.submit(2, Embed(description="command"), priority=LogPriority.COMMAND)
+        dispatcher.submit(3, Embed(description="error"), priority=LogPriority.ERROR)
+        dispatcher.start()
+        await dispatcher.close()
+        return [channel for channel, _ in bot.sent]
+
+    assert asyncio.run(main()) == [3, 2, 1]
+
+
+def test_full_queue_drops_whole_entries():
+    async def main():
+        dispatcher = LogDispatcher(FakeBot(), max_size=3)
+        # Splits into 3 embeds, which don't fit after the first entry.
+        long = Embed(description="\n".join("x" * 100 for _ in range(100)))
+        results = [dispatcher.submit(1, Embed(description="a")), dispatcher.submit(1, long)]
+        return results, dispatcher.pending, dispatcher.dropped
+
+    assert asyncio.run(main()) == ([True, False], 1, 3)
+
+
+def test_failed_sends_are_dropped_and_later_entries_sent():
+    async def main():
+        bot = FakeBot()
+        dispatcher = LogDispatcher(bot, flush_interval=0.01)
+        dispatcher.start()
+        bot.fail = OSError("connection reset")
+        dispatcher.submit(1, Embed(description="lost"))
+        await asyncio.sleep(0.05)
+        bot.fail = None
+        dispatcher.submit(1, Embed(description="kept"))
+        await dispatcher.close()
+        return bot.sent, dispatcher.dropped
+
+    assert asyncio.run(main()) == ([(1, ["kept"])], 1)
+
+
+def test_dispatcher_restarts_after_an_unexpected_error():
+    async def main():
+        bot = FakeBot()
+        dispatcher = LogDispatcher(bot, flush_interval=0.01)
+        flush = dispatcher._flush
+
+        async def broken_flush(**kwargs):
+            dispatcher._flush = flush
+            raise RuntimeError("bug")
+
+        dispatcher._flush = broken_flush
+        dispatcher.start()
+        dispatcher.submit(1, Embed(description="first"))
+        await asyncio.sleep(0.05)
+        dispatcher.submit(1, Embed(description="second"))
+        await dispatcher.close()
+        return bot.sent, dispatcher.dropped
+
+    # The buffered entry is counted as lost, and a new sender task takes over.
+    assert asyncio.run(main()) == ([(1, ["second"])], 1)
@@ -0,0 +1,40 @@
+import pytest
+from discord import Color, Embed
+
+from PortalUtils.embeds import EmbedTemplate, embed_size, fits, split_embed, truncate_embed
+
+
+def _big() -> Embed:
+    embed = Embed(title="Title", color=Color.red(), description="\n".join(f"line {i} " + "x" * 90 for i in range(100)))
+    embed.set_footer(text="footer")
+    for i in range(30):
+        embed.add_field(name=f"field {i}", value="v" * 2000)
+    return embed
+
+
+def test_truncated_embeds_are_within_every_limit():
+    embed = truncate_embed(_big())
+    assert fits(embed) and embed_size(embed) <= 6000
+    assert len(embed.description) <= 4096 and embed.description.endswith("…")
+    assert all(len(field.value) <= 1024 for field in embed.fields)
+
+
+def test_split_embeds_keep_every_line():
+    original = _big()
+    parts = split_embed(original)
+    assert all(fits(part) for part in parts)
+    # Nothing is cut mid-line, and the original is untouched.
+    assert "\n".join(part.description for part in parts if part.description) == original.description
+    assert sum(len(part.fields) for part in parts) == 30 and len(original.fields[0].value) == 2000
+    assert parts[0].title == "Title" and all(part.title is None for part in parts[1:])
+    assert all(part.color == Color.red() and part.footer.text == "footer" for part in parts)
+
+
+def test_templates_stamp_independent_copies():
+    template = EmbedTemplate(Embed(title="Command Ran", color=Color.green()).add_field(name="a", value="b"))
+    first = template(description="one")
+    first.add_field(name="c", value="d")
+    second = template(description="two")
+    assert (second.title, second.description, len(second.fields)) == ("Command Ran", "two", 1)
+    with pytest.raises(TypeError, match="footer"):
+        template(footer="x")
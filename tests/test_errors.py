@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+from discord import Embed
+
+from PortalUtils.errors import ErrorReporter, fingerprint
+
+
+class _Dispatcher:
+    def __init__(self):
+        self.embeds: list[Embed] = []
+
+    def submit(self, channel_id: int, embed: Embed, **kwargs) -> bool:
+        self.embeds.append(embed)
+        return True
+
+
+def _bot() -> SimpleNamespace:
+    return SimpleNamespace(error_logs=1, log_dispatcher=_Dispatcher(), EEmbed=Embed)
+
+
+def _raise(message: str) -> ValueError:
+    try:
+        raise ValueError(message)
+    except ValueError as e:
+        return e
+
+
+def test_repeated_errors_are_reported_once_then_summarized():
+    bot = _bot()
+    reporter = ErrorReporter(bot)
+
+    async def main():
+        for i in range(3):
+            # Same place, different message, so the same fingerprint.
+            await reporter.report(_raise(f"bad value {i}"), "in /ping")
+        reporter.flush_summaries()
+        reporter.flush_summaries()
+
+    asyncio.run(main())
+    fp = fingerprint(_raise("other"))
+    assert [r.occurrences for r in reporter.reports] == [3]
+    assert reporter.get(fp[:4]).summary == "ValueError: bad value 0"
+    assert [e.description for e in bot.log_dispatcher.embeds[1:]] == [f"`{fp}` ×2 more: ValueError: bad value 0"]
+
+
+def test_long_reports_fit_in_an_embed():
+    bot = _bot()
+    error = _raise("x" * 10000)
+    asyncio.run(ErrorReporter(bot).report(error, "y" * 5000))
+    [embed] = bot.log_dispatcher.embeds
+    assert len(embed.description) <= 4096
+    # The end of the traceback, with the error message, is kept.
+    assert embed.description.startswith("y" * 1024 + "```py\n") and embed.description.endswith("x\n```")
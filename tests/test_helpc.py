@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+
+from PortalUtils.bot import Bot
+from PortalUtils.helpc import CustomMinimalHelp
+
+
+class _Channel:
+    def __init__(self):
+        self.sent: list[discord.Embed] = []
+
+    async def send(self, *, embed: discord.Embed):
+        self.sent.append(embed)
+
+
+def _help(bot: Bot, channel: _Channel) -> CustomMinimalHelp:
+    help_command = CustomMinimalHelp(verify_checks=False)
+    bot.help_command = help_command
+    help_command.context = SimpleNamespace(
+        bot=bot, clean_prefix="!", invoked_with="help", command=None, channel=channel, author=None, guild=None
+    )
+    return help_command
+
+
+def test_help_is_rendered_once_until_commands_change():
+    bot = Bot(command_prefix="!", intents=discord.Intents.none())
+    channel = _Channel()
+    help_command = _help(bot, channel)
+    renders = 0
+    render = help_command.render_embeds
+
+    def counting_render():
+        nonlocal renders
+        renders += 1
+        return render()
+
+    help_command.render_embeds = counting_render
+
+    @commands.command()
+    async def ping(ctx):
+        """Pong."""
+
+    async def main():
+        await help_command.command_callback(help_command.context)
+        await help_command.command_callback(help_command.context)
+        bot.add_command(ping)
+        await help_command.command_callback(help_command.context)
+
+    asyncio.run(main())
+    assert renders == 2
+    assert channel.sent[0].description == channel.sent[1].description
+    assert "ping" in channel.sent[2].description and "ping" not in channel.sent[0].description
@@ -0,0 +1,66 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from PortalUtils.http import HTTPCache
+
+
+async def _serve(handler) -> tuple[web.AppRunner, str]:
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+def test_cancelled_request_does_not_cancel_shared_request():
+    requests = 0
+
+    async def handler(request: web.Request) -> web.Response:
+        nonlocal requests
+        requests += 1
+        await asyncio.sleep(0.05)
+        return web.Response(text="ok", headers={"Cache-Control": "max-age=60"})
+
+    async def main():
+        runner, url = await _serve(handler)
+        try:
+            async with aiohttp.ClientSession() as session:
+                cache = HTTPCache(session)
+                first = asyncio.create_task(cache.get(url))
+                await asyncio.sleep(0)
+                second = asyncio.create_task(cache.get(url))
+                await asyncio.sleep(0.01)
+                first.cancel()
+                response = await second
+                return response.text(), first.cancelled(), cache.collapsed
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(main()) == ("ok", True, 1)
+    assert requests == 1
+
+
+def test_not_modified_with_no_cache_is_revalidated_every_time():
+    async def handler(request: web.Request) -> web.Response:
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+        return web.Response(text="ok", headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+
+    async def main():
+        runner, url = await _serve(handler)
+        try:
+            async with aiohttp.ClientSession() as session:
+                cache = HTTPCache(session)
+                for _ in range(3):
+                    assert (await cache.get(url)).text() == "ok"
+                return cache.stats()
+        finally:
+            await runner.cleanup()
+
+    stats = asyncio.run(main())
+    assert (stats["hits"], stats["misses"], stats["revalidated"]) == (0, 3, 2)
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+pytest.importorskip("DPyUtils")
+
+from PortalUtils.logging import Logging  # noqa: E402
+
+
+class _Dispatcher:
+    def __init__(self):
+        self.embeds: list[discord.Embed] = []
+
+    def submit(self, channel_id: int, embed: discord.Embed, **kwargs) -> bool:
+        self.embeds.append(embed)
+        return True
+
+
+def _guild(guild_id: int, members: list[bool] = ()) -> SimpleNamespace:
+    members = [SimpleNamespace(bot=bot) for bot in members]
+    return SimpleNamespace(
+        id=guild_id,
+        owner=f"owner {guild_id}",
+        owner_id=guild_id,
+        chunked=bool(members),
+        members=members,
+        member_count=len(members) or 100,
+    )
+
+
+def _bot(guilds: list) -> SimpleNamespace:
+    return SimpleNamespace(
+        guild_logs=1,
+        guilds=guilds,
+        get_guild=lambda guild_id: next((g for g in guilds if g.id == guild_id), None),
+        intents=discord.Intents.all(),
+        log_dispatcher=_Dispatcher(),
+    )
+
+
+def test_join_bursts_are_summarized():
+    guilds = [_guild(i) for i in range(8)]
+    bot = _bot(guilds)
+    cog = Logging(bot)
+    cog.BURST_WINDOW = 0.05
+
+    async def main():
+        for guild in guilds:
+            await cog.guild_logs(guild)
+        await cog._burst_task
+
+    asyncio.run(main())
+    titles = [e.title for e in bot.log_dispatcher.embeds]
+    # The first few are logged one by one, the rest of the burst in one summary.
+    assert titles == ["Joined Server"] * cog.BURST_THRESHOLD + ["Joined 3 and left 0 servers"]
+    assert bot.log_dispatcher.embeds[-1].description.count("\n+ ") == 2
+    assert cog._burst_task is None
+
+
+def test_bot_counts_are_kept_from_member_events():
+    guild = _guild(1, [True, False, False])
+    cog = Logging(_bot([guild]))
+    assert cog.count_bots(guild) == 1
+    guild.members.clear()
+    asyncio.run(cog._count_member_join(SimpleNamespace(bot=True, guild=guild)))
+    # Not rescanned, only updated by the event.
+    assert cog.count_bots(guild) == 2
+    assert cog.count_bots(_guild(2)) is None
@@ -0,0 +1,27 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+from PortalUtils.db import Database
+from PortalUtils.maintenance import MaintenanceScheduler
+
+
+def test_back_to_back_backups_are_all_kept(tmp_path):
+    backups = tmp_path / "backups"
+
+    async def main():
+        async with Database(str(tmp_path / "data.db"), readers=1) as db:
+            await db.execute("CREATE TABLE t (value INTEGER)")
+            scheduler = MaintenanceScheduler(SimpleNamespace(db=db), backup_dir=str(backups), backups_kept=2)
+            scheduler.start()
+            try:
+                return [await scheduler.run("backup") for _ in range(3)]
+            finally:
+                scheduler.close()
+
+    runs = asyncio.run(main())
+    assert [run.error for run in runs] == [None, None, None]
+    names = sorted(os.listdir(backups))
+    # The oldest was removed, and the newest two survive under distinct names.
+    assert len(names) == 2 and all(n.startswith("data-") and n.endswith(".db") for n in names)
+    assert names[-1] in runs[-1].detail and names[0] in runs[-2].detail
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from PortalUtils.members import MemberCache, MemberCachePolicy
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.member_count = 2
+        self.requests = 0
+        self._members = {}
+
+    @property
+    def chunked(self) -> bool:
+        # Like discord.py, a guild counts as chunked while every member is cached.
+        return len(self._members) >= self.member_count
+
+    async def chunk(self):
+        self.requests += 1
+        self._members = {1: SimpleNamespace(id=1, _roles=[]), 2: SimpleNamespace(id=2, _roles=[])}
+
+    def get_member(self, user_id: int):
+        return self._members.get(user_id)
+
+    def _remove_member(self, member):
+        del self._members[member.id]
+
+
+def test_trimmed_guilds_are_only_chunked_once():
+    async def main():
+        bot = SimpleNamespace(intents=discord.Intents.all(), user=SimpleNamespace(id=1), guilds=[])
+        cache = MemberCache(bot, MemberCachePolicy.roles(10))
+        guild = FakeGuild(100)
+        assert await cache.ensure_chunked(guild)
+        assert not guild.chunked and list(guild._members) == [1]
+        assert await cache.ensure_chunked(guild)
+        requests = guild.requests
+        await cache._on_guild_remove(guild)
+        assert await cache.ensure_chunked(guild)
+        return requests, guild.requests
+
+    assert asyncio.run(main()) == (1, 2)
+
+
+def test_report_only_measures_the_largest_guilds():
+    def guild(guild_id: int, members: int) -> SimpleNamespace:
+        return SimpleNamespace(
+            id=guild_id,
+            name=f"guild {guild_id}",
+            member_count=members,
+            _members={i: SimpleNamespace(id=i) for i in range(members)},
+            _channels={},
+            _threads={},
+            _roles={},
+            emojis=(),
+        )
+
+    guilds = [guild(i, i % 7) for i in range(50)] + [guild(100, 40)]
+    bot = SimpleNamespace(
+        intents=discord.Intents.all(), guilds=guilds, users=[], _connection=SimpleNamespace(_users={})
+    )
+    cache = MemberCache(bot, MemberCachePolicy.full())
+    measured = []
+    guild_size = cache.guild_size
+    cache.guild_size = lambda g: measured.append(g) or guild_size(g)
+    report = cache.report(2, sample=3)
+    assert len(measured) == 3 and measured[0].id == 100
+    assert "(3 of 51 guilds measured)" in report
+    assert report.splitlines()[-2].endswith("guild 100 (100)")
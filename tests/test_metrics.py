@@ -0,0 +1,19 @@
+import discord
+
+from PortalUtils.bot import Bot
+from PortalUtils.metrics import MetricsRegistry
+
+
+def test_counters_and_gauges_are_typed():
+    registry = MetricsRegistry()
+    registry.gauge("queue_pending", "Pending.", lambda: 3)
+    registry.counter("dropped_total", "Dropped.", lambda: 7)
+    text = registry.render()
+    assert "# TYPE portal_queue_pending gauge\nportal_queue_pending 3\n" in text
+    assert "# TYPE portal_dropped_total counter\nportal_dropped_total 7\n" in text
+
+
+def test_bot_drop_counts_are_counters():
+    text = Bot(command_prefix="!", intents=discord.Intents.none()).metrics.render()
+    assert "# TYPE portal_log_entries_dropped_total counter" in text
+    assert "# TYPE portal_audit_records_dropped_total counter" in text
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from PortalUtils.monitor import LoopMonitor
+
+
+def _block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+def test_watchdog_captures_the_blocking_stack():
+    async def main():
+        monitor = LoopMonitor(interval=0.02, threshold=0.1, path=None)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            _block_the_loop(0.3)
+            await asyncio.sleep(0.05)
+        finally:
+            monitor.close()
+        return monitor
+
+    monitor = asyncio.run(main())
+    [stall] = monitor.stalls
+    assert stall.duration >= 0.2
+    assert "_block_the_loop" in stall.stack and "_block_the_loop" in monitor.stall_report()
+
+
+def test_callbacks_are_timed_by_time_held():
+    async def callback():
+        await asyncio.sleep(0.1)
+        _block_the_loop(0.05)
+        return "done"
+
+    async def main():
+        monitor = LoopMonitor(threshold=0.04, path=None)
+        return monitor, await monitor.run(callback(), "on_message:callback")
+
+    monitor, result = asyncio.run(main())
+    stats = monitor.callbacks["on_message:callback"]
+    assert result == "done" and stats.slow == 1
+    # The sleep counts towards the wall time only.
+    assert stats.wall.max >= 0.15 and 0.05 <= stats.busy.max < 0.1
+    assert "on_message:callback" in monitor.report()
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from discord import Color
+
+from PortalUtils.db import Database
+from PortalUtils.paginators import EmbedPaginator, Paginator, PaginatorRegistry, QueryPageSource
+
+
+def test_query_pages_are_read_during_transactions(tmp_path):
+    async def main():
+        async with Database(str(tmp_path / "test.db"), readers=1) as db:
+            await db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+            await db.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"row {i}") for i in range(1, 26)])
+            source = QueryPageSource(db, "SELECT id, name FROM t", key="id", per_page=10)
+            async with db.transaction() as conn:
+                await conn.execute("INSERT INTO t VALUES (26, 'row 26')")
+                # Readers see the last commit, without waiting for the transaction.
+                await asyncio.wait_for(source.prepare(), 1)
+                pages = [await asyncio.wait_for(source.get_page(page), 1) for page in (1, 2, 3)]
+            return source.get_max_pages(), [[row[0] for row in page] for page in pages]
+
+    max_pages, pages = asyncio.run(main())
+    assert max_pages == 3
+    assert pages == [list(range(1, 11)), list(range(11, 21)), list(range(21, 26))]
+
+
+def test_pages_are_cut_by_line_count_and_length():
+    paginator = Paginator(3, max_len=20)
+    for line in ("a", "b", "c", "d", "e" * 10, "f" * 10, "g" * 45):
+        paginator.add_line(line)
+    # Three lines, then the length limit, then a long line split at max_len.
+    assert paginator.pages == [
+        ["a", "b", "c"],
+        ["d", "e" * 10],
+        ["f" * 10],
+        ["g" * 20],
+        ["g" * 20],
+        ["g" * 5],
+    ]
+    assert paginator.num_pages == 6
+    assert all(len(paginator.page_text(page)) <= 20 for page in range(1, 7))
+
+
+def test_lines_are_added_from_async_iterables():
+    async def rows():
+        for i in range(5):
+            yield (i, f"row {i}")
+
+    paginator = Paginator(2)
+    asyncio.run(paginator.add_lines(rows(), formatter=lambda row: row[1]))
+    assert paginator.pages == [["row 0", "row 1"], ["row 2", "row 3"], ["row 4"]]
+    assert paginator.page_text(2) == "row 2\nrow 3"
+
+
+class _Response:
+    def __init__(self, interaction: "_Interaction"):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def edit_message(self, *, content: str, **kwargs):
+        self.done = True
+        await asyncio.sleep(0.05)
+        self.interaction.shown.append(("edit_message", self.interaction.name, content))
+
+    async def defer(self):
+        self.done = True
+
+
+class _Interaction:
+    def __init__(self, name: str, shown: list):
+        self.name = name
+        self.shown = shown
+        self.response = _Response(self)
+
+    async def edit_original_response(self, *, content: str, **kwargs):
+        self.shown.append(("edit_original_response", self.name, content))
+
+
+def test_rapid_page_flips_are_coalesced():
+    paginator = Paginator(1)
+    for i in range(1, 6):
+        paginator.add_line(f"page {i}")
+    shown = []
+
+    async def main():
+        first = asyncio.create_task(paginator.show_next_page(_Interaction("first", shown)))
+        await asyncio.sleep(0.01)
+        clicks = [_Interaction(name, shown) for name in ("second", "third")]
+        for click in clicks:
+            await paginator.show_next_page(click)
+        await first
+        return [click.response.done for click in clicks]
+
+    # Later clicks are acknowledged at once, and only the latest page is shown, through the latest click.
+    assert asyncio.run(main()) == [True, True]
+    assert shown == [("edit_message", "first", "page 2"), ("edit_original_response", "third", "page 4")]
+    assert paginator.current_page == 4
+
+
+def _filled(lines: int) -> Paginator:
+    paginator = Paginator(10)
+    for i in range(lines):
+        paginator.add_line(f"line {i}")
+    return paginator
+
+
+def test_registry_keeps_a_running_total_within_its_budget():
+    registry = PaginatorRegistry(SimpleNamespace())
+    first, second, third = _filled(50), _filled(50), _filled(50)
+    for paginator in (first, second, third):
+        registry.register(paginator)
+    assert registry.memory_size() == sum(p.memory_size() for p in (first, second, third))
+
+    # Growing past the budget evicts the least recently used.
+    registry.budget = registry.memory_size() + 100
+    registry.touch(first)
+    asyncio.run(third.get_page(1))
+    third.add_line("x" * 1000)
+    assert list(registry._live.values()) == [third, first] and second.page_text(1) == ""
+    assert registry.memory_size() == first.memory_size() + third.memory_size()
+
+    registry.discard(first)
+    assert registry.memory_size() == third.memory_size() and registry.evicted == 1
+
+
+def test_persistent_state_only_keeps_rebuildable_options():
+    paginator = EmbedPaginator(2, embed_kwargs={"title": "Results", "color": Color.red()})
+    for i in range(5):
+        paginator.add_line(f"row {i}")
+    restored = Paginator.from_state(*paginator.to_state())
+    assert restored.pages == paginator.pages
+    embed = asyncio.run(restored.get_page(3))
+    assert (embed.title, embed.color, embed.description) == ("Results", Color.red(), "row 4")
+
+    # A timestamp would come back as a string, so it's refused before anything is sent.
+    paginator.embed_kwargs["timestamp"] = datetime.now(timezone.utc)
+    with pytest.raises(TypeError, match="datetime"):
+        paginator.to_state()
+    registry = PaginatorRegistry(SimpleNamespace())
+    registry.can_persist = True
+    with pytest.raises(TypeError, match="datetime"):
+        asyncio.run(paginator.send_to(SimpleNamespace(), persistent=True, registry=registry))
+    assert len(registry) == 0
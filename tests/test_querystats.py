@@ -0,0 +1,44 @@
+import asyncio
+
+from PortalUtils.querystats import InstrumentedDatabase, QueryStats, normalize_sql
+
+
+def test_statements_differing_in_literals_are_grouped():
+    assert (
+        normalize_sql("SELECT * FROM t WHERE id = 5 AND name = 'a''b'") == "SELECT * FROM t WHERE id = ? AND name = ?"
+    )
+    assert normalize_sql("SELECT *\n  FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (?, ...)"
+    stats = QueryStats()
+    stats.record("SELECT 1 FROM t WHERE id = 1", 0.01, 1)
+    stats.record("SELECT 1 FROM t WHERE id = 2", 0.03, 1)
+    [top] = stats.top()
+    assert (top.sql, top.latency.count, top.rows) == ("SELECT ? FROM t WHERE id = ?", 2, 2)
+
+
+def test_slow_statements_are_explained_once_per_interval(tmp_path):
+    async def main():
+        async with InstrumentedDatabase(str(tmp_path / "test.db"), readers=1, slow_threshold=0) as db:
+            await db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+            for i in range(3):
+                await db.fetchall("SELECT name FROM t WHERE id = ?", (i,))
+            await asyncio.gather(*db._explaining)
+            return [q for q in db.stats.slow_queries if q.sql.startswith("SELECT")]
+
+    slow = asyncio.run(main())
+    assert [q.parameters for q in slow] == [(1,), (2,), (0,)]
+    # Only the first run was explained, the plan arrives after the later runs are logged.
+    assert [bool(q.plan) for q in slow] == [False, False, True]
+    assert "SEARCH t USING INTEGER PRIMARY KEY" in slow[-1].plan
+
+
+def test_concurrent_explains_are_capped(tmp_path):
+    async def main():
+        async with InstrumentedDatabase(str(tmp_path / "test.db"), readers=1, slow_threshold=0, max_explains=1) as db:
+            await db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+            await asyncio.gather(*db._explaining)
+            await db.fetchall("SELECT name FROM t")
+            await db.fetchall("SELECT id FROM t")
+            await asyncio.gather(*db._explaining)
+            return set(db._explained)
+
+    assert asyncio.run(main()) == {"CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)", "SELECT name FROM t"}
@@ -0,0 +1,28 @@
+import asyncio
+from types import SimpleNamespace
+
+from PortalUtils import runtime
+from PortalUtils.runtime import RuntimeProfile
+
+
+def _factory(loop, coro, **kwargs):
+    return asyncio.Task(coro, loop=loop, **kwargs)
+
+
+def _eager_factory(loop, coro, **kwargs):
+    return asyncio.Task(coro, loop=loop, **kwargs)
+
+
+def test_close_restores_the_previous_task_factory(monkeypatch):
+    monkeypatch.setattr(runtime, "EAGER_TASK_FACTORY", _eager_factory)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_task_factory(_factory)
+        profile = RuntimeProfile(uvloop=False, gc_freeze=False)
+        profile.start(SimpleNamespace(wait_until_ready=asyncio.Event().wait))
+        during = loop.get_task_factory()
+        profile.close()
+        return during, loop.get_task_factory()
+
+    assert asyncio.run(main()) == (_eager_factory, _factory)
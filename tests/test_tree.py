@@ -0,0 +1,64 @@
+import discord
+import pytest
+from discord import app_commands
+
+from PortalUtils.tree import CommandTree, DeferSettings, defer_settings
+
+
+def _tree() -> CommandTree:
+    return CommandTree(discord.Client(intents=discord.Intents.none()))
+
+
+def test_defer_extra_is_parsed():
+    @app_commands.command(name="ping", extras={"defer": {"ephemeral": False}})
+    async def ping(interaction: discord.Interaction):
+        pass
+
+    _tree().add_command(ping)
+    assert defer_settings(ping) == DeferSettings(ephemeral=False, thinking=True)
+
+
+def test_invalid_defer_extra_fails_when_added():
+    group = app_commands.Group(name="settings", description="Settings")
+
+    @group.command(name="show", extras={"defer": {"ephemral": False}})
+    async def show(interaction: discord.Interaction):
+        pass
+
+    tree = _tree()
+    with pytest.raises(TypeError, match="'settings show'.*ephemral"):
+        tree.add_command(group)
+    assert tree.get_command("settings") is None
+
+
+class _Interaction:
+    def __init__(self, data: dict):
+        self.data = data
+
+
+def test_defer_table_follows_the_tree():
+    group = app_commands.Group(name="settings", description="Settings")
+
+    @group.command(name="show", extras={"defer": True})
+    async def show(interaction: discord.Interaction):
+        pass
+
+    @app_commands.command(name="ping", extras={"defer": {"ephemeral": False}})
+    async def ping(interaction: discord.Interaction):
+        pass
+
+    tree = _tree()
+    tree.add_command(group)
+    tree.add_command(ping)
+    tree.add_command(ping, guild=discord.Object(id=5))
+    show_data = {"name": "settings", "options": [{"type": 1, "name": "show", "options": []}]}
+    assert tree.get_defer_settings(_Interaction(show_data)) == DeferSettings()
+    assert tree.get_defer_settings(_Interaction({"name": "ping", "guild_id": "5"})) == DeferSettings(ephemeral=False)
+
+    tree.remove_command("settings")
+    assert tree.get_defer_settings(_Interaction(show_data)) is None
+    tree.clear_commands(guild=None)
+    # The guild copy of ping is still registered.
+    assert tree.get_defer_settings(_Interaction({"name": "ping"})) is None
+    assert tree.get_defer_settings(_Interaction({"name": "ping", "guild_id": "5"})) == DeferSettings(ephemeral=False)
+    assert set(tree._defer_table) == {(5, "ping")}